@@ -3,6 +3,10 @@ ASGI config for FitnessTracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with uvicorn, e.g. ``uvicorn FitnessTracker.asgi:application`` or
+``gunicorn FitnessTracker.asgi:application -k uvicorn.workers.UvicornWorker``.
+The async summary views in activities/views_async.py benefit most from it.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
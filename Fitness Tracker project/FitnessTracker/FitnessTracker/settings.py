@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 import dj_database_url
 
@@ -28,13 +29,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'activities.middleware.ServerTimingMiddleware',
+    'activities.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'activities.middleware.CachedAuthenticationMiddleware',
+    'activities.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -43,7 +47,7 @@ ROOT_URLCONF = 'FitnessTracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'activities.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -59,6 +63,68 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'FitnessTracker.wsgi.application'
 
+# Per-request timings are sent in a Server-Timing header; requests slower than
+# SLOW_REQUEST_MS are appended as JSON lines to SLOW_REQUEST_LOG when it is set
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True') == 'True'
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_LOG = os.environ.get('SLOW_REQUEST_LOG')
+
+if SLOW_REQUEST_LOG:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'message': {'format': '%(message)s'},
+        },
+        'handlers': {
+            'slow_requests': {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': SLOW_REQUEST_LOG,
+                'maxBytes': 10 * 1024 * 1024,
+                'backupCount': 5,
+                'formatter': 'message',
+            },
+        },
+        'loggers': {
+            'activities.slow_requests': {
+                'handlers': ['slow_requests'],
+                'level': 'INFO',
+                'propagate': False,
+            },
+        },
+    }
+
+# Per-view request metrics served at /metrics in the Prometheus text format.
+# Under gunicorn, point PROMETHEUS_MULTIPROC_DIR at an empty directory so the
+# samples of all workers are aggregated (see gunicorn.conf.py)
+PROMETHEUS_METRICS = os.environ.get('PROMETHEUS_METRICS', 'True') == 'True'
+PROMETHEUS_METRICS_TOKEN = os.environ.get('PROMETHEUS_METRICS_TOKEN')
+
+# Staff users can profile a request with an X-Profile: 1 header or ?_profile=1;
+# the raw cProfile stats are also saved to PROFILE_DIR when it is set
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'True') == 'True'
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_LIMIT = 40
+
+# SQLite production mode: WAL and tuned pragmas on every connection, and
+# transactions that start with BEGIN IMMEDIATE (retried with backoff while
+# the database is locked) so concurrent writers queue instead of failing.
+# Off by default: WAL mode is stored in the database file, so it would
+# rewrite the db.sqlite3 committed with the project; turn it on for a
+# database at SQLITE_PATH
+SQLITE_PRODUCTION_MODE = os.environ.get('SQLITE_PRODUCTION_MODE', 'False') == 'True'
+SQLITE_PRODUCTION_PRAGMAS = {
+    # busy_timeout first: switching to WAL waits for other connections
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 128 * 2**20,
+    'cache_size': -32000,  # KiB
+}
+SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if SQLITE_PRODUCTION_MODE else {}
+SQLITE_BEGIN_RETRIES = 5
+SQLITE_BEGIN_BACKOFF = 0.05
+
 # Database
 if 'DATABASE_URL' in os.environ:
     DATABASES = {
@@ -67,11 +133,96 @@ if 'DATABASE_URL' in os.environ:
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'ENGINE': 'activities.backends.sqlite3' if SQLITE_PRODUCTION_MODE else 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if SQLITE_PRODUCTION_MODE else {},
         }
     }
 
+# Read replicas: a comma-separated DATABASE_REPLICA_URLS adds the aliases
+# replica1, replica2, ... Requests read activities from a random replica
+# unless they have written, or their user wrote within REPLICA_STICKY_SECONDS
+# (keep it above the replication lag); see activities.routers
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {**dj_database_url.parse(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Activity sharding: a comma-separated ACTIVITY_SHARD_URLS adds the aliases
+# shard1, shard2, ... ("default" names the primary). Each user's activities and
+# rollups live on the shard their id hashes to, users stay on the primary; run
+# rebalance_shards after changing the list. See activities.sharding
+ACTIVITY_SHARDS = []
+for index, url in enumerate(filter(None, os.environ.get('ACTIVITY_SHARD_URLS', '').split(',')), 1):
+    url = url.strip()
+    if url == 'default':
+        ACTIVITY_SHARDS.append('default')
+        continue
+    DATABASES[f'shard{index}'] = dj_database_url.parse(url)
+    if SQLITE_PRODUCTION_MODE and DATABASES[f'shard{index}']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[f'shard{index}'].update(
+            ENGINE='activities.backends.sqlite3', OPTIONS={'transaction_mode': 'IMMEDIATE'}
+        )
+    ACTIVITY_SHARDS.append(f'shard{index}')
+ACTIVITY_ID_BLOCK_SIZE = 100
+
+# Connection reuse: each thread keeps its connections for CONN_MAX_AGE seconds
+# (0, the default, closes them after every request) and, with
+# CONN_HEALTH_CHECKS, pings a reused one before its first query. Under ASGI
+# the threads of sync_to_async(thread_sensitive=False) keep theirs past the
+# request, so leave CONN_MAX_AGE at 0 there. DB_POOL_SIZE > 0 instead shares
+# a pool of that many connections per alias between the threads of each
+# worker process, waiting up to DB_POOL_TIMEOUT seconds for a free one;
+# CONN_MAX_AGE then limits how long a pooled connection lives. See
+# activities.pooling
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 0))
+CONN_HEALTH_CHECKS = os.environ.get('CONN_HEALTH_CHECKS', 'False') == 'True'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+for database in DATABASES.values():
+    database.update(CONN_MAX_AGE=CONN_MAX_AGE, CONN_HEALTH_CHECKS=CONN_HEALTH_CHECKS)
+    if DB_POOL_SIZE:
+        # Same backends with connect timing and the pool
+        database['ENGINE'] = {
+            'django.db.backends.postgresql': 'activities.backends.postgresql',
+            'django.db.backends.sqlite3': 'activities.backends.sqlite3',
+        }.get(database['ENGINE'], database['ENGINE'])
+        database.setdefault('OPTIONS', {})['pool'] = {'max_size': DB_POOL_SIZE, 'timeout': DB_POOL_TIMEOUT}
+
+DATABASE_ROUTERS = ['activities.sharding.ShardRouter', 'activities.routers.PrimaryReplicaRouter']
+
+# Cache: local memory by default, Redis when REDIS_URL is set, or files under CACHE_DIR.
+# Only the last two are shared by the workers of a server
+SHARED_CACHE = 'REDIS_URL' in os.environ or 'CACHE_DIR' in os.environ
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+elif 'CACHE_DIR' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Metrics and trends results are cached per user data version
+ACTIVITY_RESULT_CACHE_ALIAS = 'default'
+ACTIVITY_RESULT_CACHE_TIMEOUT = int(os.environ.get('ACTIVITY_RESULT_CACHE_TIMEOUT', 3600))
+
+# Async summary views run their independent queries in parallel worker threads
+ASYNC_PARALLEL_QUERIES = os.environ.get('ASYNC_PARALLEL_QUERIES', 'True') == 'True'
+
 # Custom user model
 AUTH_USER_MODEL = 'activities.User'
 
@@ -94,7 +245,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'activities.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -109,6 +260,24 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Web UI sessions: 'cached_db' (reads from the cache, writes through to the
+# database), 'cache', 'signed_cookies' or 'db'. The cached modes default to on
+# only with a shared cache: in a per-process cache a session logged out on one
+# worker would stay valid on the others
+WEB_SESSION_MODE = os.environ.get('WEB_SESSION_MODE', 'cached_db' if SHARED_CACHE else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{WEB_SESSION_MODE}'
+# Serve request.user for the web UI from the cache instead of the database
+WEB_CACHED_USER = os.environ.get('WEB_CACHED_USER', str(SHARED_CACHE)) == 'True'
+
+# API tokens expire after AUTH_TOKEN_TTL_HOURS; logging in again issues a new one
+AUTH_TOKEN_TTL = timedelta(hours=int(os.environ.get('AUTH_TOKEN_TTL_HOURS', 24 * 30)))
+# Authenticated API users are cached for this many seconds between changes.
+# Invalidation only reaches other workers through a shared cache, so this is
+# off by default with the per-process local memory cache
+AUTH_CACHED_USER = os.environ.get('AUTH_CACHED_USER', str(SHARED_CACHE)) == 'True'
+AUTH_USER_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LRU_SIZE = 10000
+
 # CORS settings (for frontend integration)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React development server
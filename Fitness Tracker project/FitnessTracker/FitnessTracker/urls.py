@@ -3,10 +3,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from activities.views import prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('activities.urls')),
+    path('metrics', prometheus_metrics, name='prometheus-metrics'),
     path('', include('activities.urls_web')),
 ]
 
@@ -1,6 +1,92 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Activity
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from .models import User, Activity, ActivityDailyRollup
+from .sharding import shard_aliases
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Pick the shard whose rows the change list shows: the selected user's
+    shard when filtering by user, otherwise the first one by default
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def choices(self, changelist):
+        selected = self.value() or shard_aliases()[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == selected,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # Filtering by user already picked that user's shard
+        if not shard_aliases() or (queryset._db is not None and not self.value()):
+            return queryset
+        alias = self.value() if self.value() in shard_aliases() else shard_aliases()[0]
+        # For ShardedModelAdmin.changelist_view to say which shard is listed
+        request.listed_shard = alias
+        return queryset.using(alias)
+
+
+class ShardedModelAdmin(admin.ModelAdmin):
+    """
+    Admin for models stored on the user's shard when ACTIVITY_SHARDS is set.
+
+    The change list shows one shard at a time (see ShardListFilter) and
+    says so, the change and delete pages find an object on whichever shard
+    holds it, and users are looked up on the primary instead of joined.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        shard = getattr(request, 'listed_shard', None)
+        if shard is not None and len(shard_aliases()) > 1:
+            self.message_user(
+                request,
+                f'Only the rows on {shard} are listed, one of {len(shard_aliases())} shards. '
+                'Pick another in the shard filter, or filter by user to list theirs.',
+                messages.INFO,
+            )
+        return response
+
+    def get_list_filter(self, request):
+        # Last, so it sees whether the other filters have chosen a shard
+        return (*super().get_list_filter(request), ShardListFilter)
+
+    def get_list_select_related(self, request):
+        # The users table on a shard is empty, so there is nothing to join
+        return () if shard_aliases() else super().get_list_select_related(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not shard_aliases() or not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        user_ids = User.objects.filter(username__icontains=search_term).values_list('pk', flat=True)
+        lookups = Q(user_id__in=list(user_ids)) | Q(activity_type__icontains=search_term)
+        return queryset.filter(lookups), False
+
+    def get_object(self, request, object_id, from_field=None):
+        if not shard_aliases():
+            return super().get_object(request, object_id, from_field)
+        queryset = self.get_queryset(request)
+        field = self.model._meta.pk if from_field is None else self.model._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except ValidationError:
+            return None
+        for alias in shard_aliases():
+            obj = queryset.using(alias).filter(**{field.name: object_id}).first()
+            if obj is not None:
+                return obj
+        return None
+
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -10,7 +96,7 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('-date_joined',)
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(ShardedModelAdmin):
     list_display = ('user', 'activity_type', 'duration', 'distance', 'calories_burned', 'date')
     list_filter = ('activity_type', 'date', 'user')
     search_fields = ('user__username', 'activity_type')
@@ -21,3 +107,14 @@ class ActivityAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
+
+@admin.register(ActivityDailyRollup)
+class ActivityDailyRollupAdmin(ShardedModelAdmin):
+    list_display = ('user', 'day', 'activity_type', 'activity_count', 'total_duration', 'total_distance', 'total_calories_burned')
+    list_filter = ('activity_type', 'day')
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'day', 'activity_type', 'activity_count', 'total_duration', 'total_distance', 'total_calories_burned')
+
+    def has_add_permission(self, request):
+        # Rollups are derived from activities (see ActivityDailyRollupQuerySet)
+        return False
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ActivitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'activities'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete
+        from rest_framework.authtoken.models import Token
+        from .models import User
+        from . import authentication, sharding, sqlite, timing
+
+        post_delete.connect(authentication.token_deleted, sender=Token, dispatch_uid='activities.token_deleted')
+        user_logged_out.connect(authentication.user_logged_out, dispatch_uid='activities.user_logged_out')
+        connection_created.connect(timing.install_query_timer, dispatch_uid='activities.install_query_timer')
+        connection_created.connect(sqlite.configure_connection, dispatch_uid='activities.configure_sqlite')
+        post_delete.connect(sharding.delete_user_rows, sender=User, dispatch_uid='activities.delete_user_rows')
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+USER_KEY_PREFIX = 'auth-user'
+WEB_USER_KEY_PREFIX = 'web-user'
+
+
+class TokenUserIds:
+    """
+    Bounded, thread-safe LRU of token key -> user id for this process.
+
+    Entries expire after ``ttl`` seconds. A stale entry is harmless: the
+    cached user entry records the user's current token, so a rotated or
+    deleted key stops matching even before it leaves the LRU.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user_id, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user_id
+
+    def set(self, key, user_id):
+        with self.lock:
+            self.entries[key] = (user_id, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_user_ids = TokenUserIds(
+    maxsize=getattr(settings, 'AUTH_TOKEN_LRU_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300),
+)
+
+
+def auth_cache():
+    return caches[getattr(settings, 'AUTH_CACHE_ALIAS', 'default')]
+
+
+def user_cache_key(user_id):
+    return f'{USER_KEY_PREFIX}:{user_id}'
+
+
+def web_user_cache_key(user_id):
+    return f'{WEB_USER_KEY_PREFIX}:{user_id}'
+
+
+def invalidate_cached_user(user_id, using=None):
+    """
+    Drop the cached user entry so the next request reloads the user row.
+
+    Runs now and again after the surrounding transaction commits, so a
+    request that read the old row mid-transaction cannot leave it cached.
+    """
+    keys = [user_cache_key(user_id), web_user_cache_key(user_id)]
+    auth_cache().delete_many(keys)
+    transaction.on_commit(lambda: auth_cache().delete_many(keys), using=using)
+
+
+def token_deleted(sender, instance, using, **kwargs):
+    """post_delete handler for Token: a deleted token must stop authenticating at once"""
+    token_user_ids.discard(instance.key)
+    invalidate_cached_user(instance.user_id, using)
+
+
+def user_logged_out(sender, request, user, **kwargs):
+    """user_logged_out handler: forget the user cached for the web UI"""
+    if user is not None:
+        invalidate_cached_user(user.pk)
+
+
+def token_expiry(token):
+    """When ``token`` stops being accepted, or None if tokens never expire"""
+    ttl = getattr(settings, 'AUTH_TOKEN_TTL', None)
+    return token.created + ttl if ttl is not None else None
+
+
+def token_expired(token):
+    expires = token_expiry(token)
+    return expires is not None and expires <= timezone.now()
+
+
+def rotate_token(user):
+    """Replace the user's token with a new one and return it"""
+    with transaction.atomic():
+        Token.objects.filter(user=user).delete()
+        token = Token.objects.create(user=user)
+    invalidate_cached_user(user.pk)
+    return token
+
+
+def get_valid_token(user):
+    """The user's token, replaced by a fresh one if it is missing or expired"""
+    token = Token.objects.filter(user=user).first()
+    if token is None or token_expired(token):
+        token = rotate_token(user)
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that skips the database on warm requests.
+
+    With AUTH_CACHED_USER, the token key is mapped to a user id by a
+    per-process LRU, and the user object is read from the shared cache
+    together with the user's current token key and creation time. The entry
+    is dropped whenever the user row changes (including activity writes,
+    which bump ``activity_version``) or the token is rotated, and expires
+    after AUTH_USER_CACHE_TIMEOUT seconds in any case. Without it, the token
+    and user are loaded on every request. Tokens older than AUTH_TOKEN_TTL
+    are rejected.
+    """
+
+    def authenticate_credentials(self, key):
+        if getattr(settings, 'AUTH_CACHED_USER', False):
+            user_id = token_user_ids.get(key)
+            entry = auth_cache().get(user_cache_key(user_id)) if user_id is not None else None
+            if entry is None or entry['token'] != key:
+                entry = self.load_entry(key)
+                auth_cache().set(
+                    user_cache_key(entry['user'].pk), entry, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+                )
+                token_user_ids.set(key, entry['user'].pk)
+        else:
+            entry = self.load_entry(key)
+
+        if entry['expires'] is not None and entry['expires'] <= timezone.now():
+            token_user_ids.discard(key)
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        if not entry['user'].is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (entry['user'], key)
+
+    def load_entry(self, key):
+        try:
+            token = self.get_model().objects.select_related('user').get(key=key)
+        except self.get_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return {'user': token.user, 'token': token.key, 'expires': token_expiry(token)}
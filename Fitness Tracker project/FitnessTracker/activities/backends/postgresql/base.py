@@ -0,0 +1,16 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from activities.pooling import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    """The PostgreSQL backend with the optional connection pool of activities.pooling"""
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if not hasattr(self, 'isolation_level'):
+            # The stock backend only sets it when it opens a connection itself
+            self.isolation_level = IsolationLevel(
+                self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+            )
+        return connection
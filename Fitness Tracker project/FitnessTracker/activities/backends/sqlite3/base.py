@@ -0,0 +1,161 @@
+import time
+from functools import cached_property
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+from activities.pooling import PooledConnectionMixin
+from activities.sqlite import TRANSACTION_MODES, WriteLock, begin, is_read
+from activities.timing import current_timing
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    """
+    The SQLite backend with a ``transaction_mode`` option, as in Django 5.1,
+    and the optional connection pool of activities.pooling.
+
+    With ``'OPTIONS': {'transaction_mode': 'IMMEDIATE'}`` an atomic block
+    starts its transaction at its first write: wait for the database's
+    WriteLock (up to busy_timeout), then BEGIN IMMEDIATE, retried with
+    backoff while another process outside this app holds the database.
+    Reads before the first write run in autocommit mode, so they see the
+    latest commit as on a read committed database, and a block that only
+    reads never takes the lock. Queries outside atomic blocks run in
+    autocommit mode as before.
+    """
+
+    # Inside an atomic block that has not written yet: its transaction
+    # starts at the first write, and its savepoints are created then
+    transaction_pending = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_savepoints = []
+        # First, so the BEGIN is timed as a query of its own
+        self.execute_wrappers.insert(0, self.begin_before_write)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not an argument of sqlite3.connect()
+        params.pop('transaction_mode', None)
+        return params
+
+    @property
+    def pool(self):
+        # Every connection to an in-memory database is a database of its own
+        if self.is_in_memory_db():
+            return None
+        return super().pool
+
+    @cached_property
+    def transaction_mode(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}, not {mode!r}'
+            )
+        return mode
+
+    @cached_property
+    def write_lock(self):
+        if self.transaction_mode == 'DEFERRED':
+            return None
+        return WriteLock.for_database(self.settings_dict['NAME'], self.is_in_memory_db())
+
+    @property
+    def lock_timeout(self):
+        """Seconds to wait for the write lock: as long as SQLite waits for its own"""
+        busy_timeout = getattr(settings, 'SQLITE_PRAGMAS', {}).get('busy_timeout')
+        if busy_timeout is not None:
+            return busy_timeout / 1000
+        return self.settings_dict['OPTIONS'].get('timeout', 5)
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode == 'DEFERRED':
+            return begin(self, self.transaction_mode)
+        self.transaction_pending = True
+
+    def begin_before_write(self, execute, sql, params, many, context):
+        """Execute wrapper: start a pending transaction before its first write"""
+        if self.transaction_pending and not is_read(sql):
+            self.begin_write()
+        return execute(sql, params, many, context)
+
+    def begin_write(self):
+        # Cleared first: BEGIN goes through begin_before_write too
+        self.transaction_pending = False
+        try:
+            if self.write_lock is not None:
+                self.acquire_write_lock()
+            try:
+                begin(self, self.transaction_mode)
+            except BaseException:
+                if self.write_lock is not None:
+                    self.write_lock.release()
+                raise
+        except BaseException:
+            self.transaction_pending = True
+            raise
+        savepoints, self.pending_savepoints = self.pending_savepoints, []
+        for sid in savepoints:
+            super()._savepoint(sid)
+
+    def acquire_write_lock(self):
+        """Take the write lock, recording the wait in the current request's timing"""
+        timing = current_timing.get()
+        started = time.perf_counter()
+        try:
+            self.write_lock.acquire(self.lock_timeout)
+        except OperationalError as e:
+            if timing is not None:
+                timing.lock_errors.append(str(e))
+            raise
+        finally:
+            if timing is not None:
+                timing.lock_waits.append(time.perf_counter() - started)
+
+    def end_transaction(self):
+        self.transaction_pending = False
+        self.pending_savepoints = []
+        if self.write_lock is not None:
+            self.write_lock.release()
+
+    def _savepoint(self, sid):
+        if self.transaction_pending:
+            self.pending_savepoints.append(sid)
+        else:
+            super()._savepoint(sid)
+
+    def _savepoint_rollback(self, sid):
+        if self.transaction_pending:
+            # Nothing was written since: only the savepoints taken after it go
+            del self.pending_savepoints[self.pending_savepoints.index(sid) + 1:]
+        else:
+            super()._savepoint_rollback(sid)
+
+    def _savepoint_commit(self, sid):
+        if self.transaction_pending:
+            del self.pending_savepoints[self.pending_savepoints.index(sid):]
+        else:
+            super()._savepoint_commit(sid)
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.end_transaction()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.end_transaction()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.transaction_pending = False
+            self.pending_savepoints = []
+            if self.write_lock is not None:
+                self.write_lock.close()
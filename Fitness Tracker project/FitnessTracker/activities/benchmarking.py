@@ -0,0 +1,154 @@
+import random
+import resource
+import statistics
+import sys
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from .models import Activity, User
+
+# Result caching would hide the query cost, so benchmarks disable it by default
+NO_RESULT_CACHE = {
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'benchmark-dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    'ACTIVITY_RESULT_CACHE_ALIAS': 'benchmark-dummy',
+}
+
+SEED_USERNAME_PREFIX = 'seed-user'
+SEED_PASSWORD = 'seed-password'
+
+# activity_type: (share of activities, mean and spread of duration in minutes,
+# speed in km/h or None when there is no distance, kcal per minute)
+ACTIVITY_PROFILES = {
+    'running': (0.28, 40, 15, 10.0, 11.0),
+    'walking': (0.22, 45, 20, 5.0, 4.5),
+    'cycling': (0.16, 60, 25, 20.0, 8.5),
+    'weightlifting': (0.14, 55, 15, None, 6.0),
+    'yoga': (0.08, 50, 15, None, 3.5),
+    'swimming': (0.07, 40, 15, 2.5, 9.0),
+    'other': (0.05, 35, 20, None, 5.0),
+}
+# Workouts cluster before and after work, and weekends see more of them
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 1, 4, 6, 5, 2, 2, 2, 3, 2, 1, 1, 2, 5, 6, 5, 3, 2, 1, 0]
+WEEKDAY_WEIGHTS = [1.0, 0.9, 1.0, 0.9, 0.8, 1.4, 1.3]
+
+
+def rss_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def peak_rss_bytes():
+    """Highest resident set size this process has reached"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def latency_summary(latencies, elapsed=None):
+    """Mean and percentile latencies in milliseconds, plus throughput when ``elapsed`` is given"""
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 2)
+
+    summary = {}
+    if elapsed is not None:
+        summary['requests_per_second'] = round(len(latencies) / elapsed, 1)
+    summary.update({
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    })
+    return summary
+
+
+def seed_activities(user, rows, batch_size=5000):
+    """Insert ``rows`` varied activities for ``user``, one per minute up to now"""
+    start = timezone.now() - timedelta(minutes=rows)
+    types = [value for value, _ in Activity.ACTIVITY_TYPES]
+    for offset in range(0, rows, batch_size):
+        Activity.objects.bulk_create([
+            Activity(
+                user=user,
+                activity_type=types[index % len(types)],
+                duration=20 + index % 90,
+                distance=Decimal(index % 2000) / 100,
+                calories_burned=150 + index % 600,
+                date=start + timedelta(minutes=index),
+            )
+            for index in range(offset, min(offset + batch_size, rows))
+        ])
+
+
+def synthetic_activities(user, count, rng, days=365, now=None):
+    """
+    Yield ``count`` unsaved activities for ``user`` spread over the last ``days`` days.
+
+    Types, durations, distances, calories, weekdays and times of day follow
+    ACTIVITY_PROFILES and the weight tables above, drawn from ``rng`` so the
+    same seed always produces the same data.
+    """
+    now = now or timezone.now()
+    first_day = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_offsets = range(days)
+    day_weights = [WEEKDAY_WEIGHTS[(first_day + timedelta(days=offset)).weekday()] for offset in day_offsets]
+    types = list(ACTIVITY_PROFILES)
+    type_weights = [ACTIVITY_PROFILES[activity_type][0] for activity_type in types]
+
+    for _ in range(count):
+        activity_type = rng.choices(types, type_weights)[0]
+        _, mean, spread, speed, kcal_per_minute = ACTIVITY_PROFILES[activity_type]
+        duration = max(5, round(rng.gauss(mean, spread)))
+        distance = Decimal('0.00')
+        if speed is not None:
+            distance = Decimal(str(round(duration / 60 * speed * rng.uniform(0.8, 1.2), 2)))
+        date = first_day + timedelta(
+            days=rng.choices(day_offsets, day_weights)[0],
+            hours=rng.choices(range(24), HOUR_WEIGHTS)[0],
+            minutes=rng.randrange(60),
+        )
+        yield Activity(
+            user=user,
+            activity_type=activity_type,
+            duration=duration,
+            distance=distance,
+            calories_burned=round(duration * kcal_per_minute * rng.uniform(0.85, 1.15)),
+            date=min(date, now),
+        )
+
+
+def seed_users(users, activities_per_user, seed=0, days=365, prefix=SEED_USERNAME_PREFIX, batch_size=5000):
+    """
+    Create ``users`` users named ``{prefix}-{n}`` with ``activities_per_user`` activities each.
+
+    All users share the password SEED_PASSWORD, hashed once. Activities are
+    inserted with bulk_create, which keeps the daily rollups up to date.
+    Returns the created users.
+    """
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+    created = User.objects.bulk_create([
+        User(username=f'{prefix}-{index}', email=f'{prefix}-{index}@example.com', password=password)
+        for index in range(users)
+    ])
+    now = timezone.now()
+    for user in created:
+        batch = []
+        for activity in synthetic_activities(user, activities_per_user, rng, days, now):
+            batch.append(activity)
+            if len(batch) >= batch_size:
+                Activity.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Activity.objects.bulk_create(batch)
+    return created
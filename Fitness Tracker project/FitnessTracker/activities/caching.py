@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'activity-results'
+STATS_EVENTS = ('hits', 'misses')
+# Endpoints whose results are cached; used to list per-endpoint counters
+CACHED_ENDPOINTS = ('metrics', 'trends', 'dashboard')
+_MISSING = object()
+_FAILED = object()
+
+
+def result_cache():
+    return caches[getattr(settings, 'ACTIVITY_RESULT_CACHE_ALIAS', 'default')]
+
+
+def result_cache_key(endpoint, user, params):
+    """
+    Cache key for one endpoint result.
+
+    The key embeds the user's activity_version, which every activity write
+    bumps, so a write invalidates all of that user's cached results at once
+    without deleting or scanning keys; stale entries simply expire. The
+    user's date_joined guards against a reused primary key.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    joined = int(user.date_joined.timestamp())
+    return f'{KEY_PREFIX}:{endpoint}:{user.pk}.{joined}:v{user.activity_version}:{digest}'
+
+
+def _count(cache, event, endpoint):
+    for key in (f'{KEY_PREFIX}:stats:{event}', f'{KEY_PREFIX}:stats:{event}:{endpoint}'):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # First event of this kind; add() loses harmlessly to a concurrent writer
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+
+
+def _read(cache, endpoint, key):
+    """The cached result, _MISSING on a miss, or _FAILED when the cache could not be read"""
+    try:
+        result = cache.get(key, _MISSING)
+        _count(cache, 'misses' if result is _MISSING else 'hits', endpoint)
+        return result
+    except Exception:
+        logger.warning('Activity result cache read failed', exc_info=True)
+        return _FAILED
+
+
+def _write(cache, key, result):
+    try:
+        cache.set(key, result, getattr(settings, 'ACTIVITY_RESULT_CACHE_TIMEOUT', 3600))
+    except Exception:
+        logger.warning('Activity result cache write failed', exc_info=True)
+
+
+def cached_result(endpoint, user, params, compute):
+    """
+    Return ``compute()`` for (endpoint, user, params), cached per data version.
+
+    ``params`` must hold every input the result depends on besides the user's
+    activities, with defaults already resolved. Cache failures are logged and
+    fall back to computing the result.
+    """
+    cache = result_cache()
+    key = result_cache_key(endpoint, user, params)
+    result = _read(cache, endpoint, key)
+    if result is _FAILED:
+        return compute()
+    if result is _MISSING:
+        result = compute()
+        _write(cache, key, result)
+    return result
+
+
+async def acached_result(endpoint, user, params, compute):
+    """cached_result() for an async ``compute``, sharing the same cache entries"""
+    cache = result_cache()
+    key = result_cache_key(endpoint, user, params)
+    result = await sync_to_async(_read)(cache, endpoint, key)
+    if result is _FAILED:
+        return await compute()
+    if result is _MISSING:
+        result = await compute()
+        await sync_to_async(_write)(cache, key, result)
+    return result
+
+
+def cache_stats():
+    """Hit and miss counters, overall and per endpoint"""
+    cache = result_cache()
+    keys = [f'{KEY_PREFIX}:stats:{event}' for event in STATS_EVENTS]
+    keys += [f'{KEY_PREFIX}:stats:{event}:{endpoint}' for endpoint in CACHED_ENDPOINTS for event in STATS_EVENTS]
+    values = cache.get_many(keys)
+
+    def summary(suffix=''):
+        counts = {event: values.get(f'{KEY_PREFIX}:stats:{event}{suffix}', 0) for event in STATS_EVENTS}
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else None
+        return counts
+
+    return {
+        **summary(),
+        'endpoints': {endpoint: summary(f':{endpoint}') for endpoint in CACHED_ENDPOINTS},
+    }
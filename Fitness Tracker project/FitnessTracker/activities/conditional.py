@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+from calendar import timegm
+from functools import wraps
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from .models import day_start
+
+
+def activity_data_version(request):
+    """
+    The requesting user's (activity_version, activities_modified_at).
+
+    Authentication loads the user row at the start of every request, so the
+    values are read from ``request.user`` without another query.
+    """
+    user = request.user
+    return user.activity_version, user.activities_modified_at
+
+
+def activity_etag(request, *args, depends_on_today=False, **kwargs):
+    """Strong ETag for a response computed only from the user's activities and the URL"""
+    version, _ = activity_data_version(request)
+    parts = [
+        str(request.user.pk),
+        str(version),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ]
+    if depends_on_today:
+        parts.append(timezone.localdate().isoformat())
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def activity_last_modified(request, *args, depends_on_today=False, **kwargs):
+    _, modified_at = activity_data_version(request)
+    last_modified = modified_at or request.user.date_joined
+    if depends_on_today:
+        # Date windows relative to today shift at midnight without any write
+        last_modified = max(last_modified, day_start(timezone.localdate()))
+    return last_modified
+
+
+def conditional_activity_get(depends_on_today=False):
+    """
+    Serve ETag and Last-Modified on a GET view whose output depends only on
+    the user's activities, and answer matching conditional requests with 304
+    before the view runs.
+
+    Set ``depends_on_today`` for views that default to date windows relative
+    to the current day, such as metrics and trends. Async views are wrapped
+    the same way; Django's condition() only handles sync views before 5.0.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            return async_conditional_activity_get(view, depends_on_today)
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: activity_etag(
+                request, *args, depends_on_today=depends_on_today, **kwargs
+            ),
+            last_modified_func=lambda request, *args, **kwargs: activity_last_modified(
+                request, *args, depends_on_today=depends_on_today, **kwargs
+            ),
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            # Let clients store the response but always revalidate it
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+            return response
+        return wrapper
+    return decorator
+
+
+def async_conditional_activity_get(view, depends_on_today):
+    """conditional_activity_get() for an async view, as condition() would apply it"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return await view(request, *args, **kwargs)
+        etag = quote_etag(activity_etag(request, *args, depends_on_today=depends_on_today, **kwargs))
+        last_modified = timegm(
+            activity_last_modified(request, *args, depends_on_today=depends_on_today, **kwargs).utctimetuple()
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            if not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            response.headers.setdefault('ETag', etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+    return wrapper
@@ -0,0 +1,67 @@
+from datetime import timedelta
+from django.db.models import Sum
+from django.utils import timezone
+from .models import Activity, ActivityDailyRollup
+from .serializers import activity_value_columns, parse_activity_fields, serialize_activity_values
+from .trends import TOTAL_FIELDS, activity_trends, bucket_start, empty_totals
+
+RECENT_ACTIVITIES = 5
+
+
+def dashboard_queries(user, today=None):
+    """
+    The independent reads behind the dashboard, as zero-argument callables.
+
+    Each callable runs exactly one query, so they can be executed one after
+    another or concurrently: rollup sums per activity type (all time), the
+    most recent activities, and daily totals for the current week (Monday
+    to Sunday). Pass the results to build_dashboard().
+    """
+    today = today or timezone.localdate()
+    week_start = bucket_start(today, 'week')
+    week_end = week_start + timedelta(days=6)
+    fields = parse_activity_fields('')
+
+    return {
+        'by_type': lambda: list(
+            ActivityDailyRollup.objects.filter(user=user).order_by().values('activity_type').annotate(
+                **{field: Sum(field) for field in TOTAL_FIELDS}
+            )
+        ),
+        'recent_activities': lambda: serialize_activity_values(
+            Activity.objects.filter(user=user).values(*activity_value_columns(fields))[:RECENT_ACTIVITIES], fields
+        ),
+        'week': lambda: {
+            'start_date': str(week_start),
+            'end_date': str(week_end),
+            'trends': activity_trends(user, week_start, week_end, 'day'),
+        },
+    }
+
+
+def build_dashboard(results):
+    """
+    Assemble the dashboard from dashboard_queries() results.
+
+    The all-time totals and the per-type distribution (most frequent first)
+    both come from the per-type sums, so they cost a single query.
+    """
+    by_type = results['by_type']
+    totals = empty_totals()
+    for row in by_type:
+        for field in TOTAL_FIELDS:
+            totals[field] += row[field] or 0
+    distribution = sorted(by_type, key=lambda row: (-row['activity_count'], row['activity_type']))
+    return {
+        'totals': totals,
+        'distribution': [
+            {'activity_type': row['activity_type'], 'count': row['activity_count']} for row in distribution
+        ],
+        'recent_activities': results['recent_activities'],
+        'week': results['week'],
+    }
+
+
+def dashboard_summary(user, today=None):
+    """Everything the dashboard shows, from three queries run in sequence"""
+    return build_dashboard({name: query() for name, query in dashboard_queries(user, today).items()})
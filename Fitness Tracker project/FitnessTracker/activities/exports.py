@@ -0,0 +1,94 @@
+import csv
+import json
+from django.utils import timezone
+from rest_framework.negotiation import DefaultContentNegotiation
+
+# Exported columns, in the order they appear in CSV output
+EXPORT_FIELDS = ('id', 'activity_type', 'duration', 'distance', 'calories_burned', 'date', 'created_at', 'updated_at')
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+DATETIME_FIELDS = {'date', 'created_at', 'updated_at'}
+
+
+class FormatParamContentNegotiation(DefaultContentNegotiation):
+    """
+    Always picks the first renderer.
+
+    The export and import views read ``?format=`` themselves to choose
+    between CSV and NDJSON, so DRF must not treat it as a renderer override.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+class Echo:
+    """File-like object whose write() hands the value straight back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def format_datetime(value, tz=None):
+    """
+    ISO 8601 in the current time zone, with UTC written as ``Z`` like DRF's DateTimeField.
+
+    Callers formatting many values should look up ``tz`` once and pass it in.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(tz or timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Yield one tuple of JSON-ready values per activity.
+
+    Rows come from ``values_list(...).iterator()``, so neither model instances
+    nor serializers are built and memory use stays flat however long the
+    history is.
+    """
+    datetime_positions = [index for index, field in enumerate(EXPORT_FIELDS) if field in DATETIME_FIELDS]
+    distance_position = EXPORT_FIELDS.index('distance')
+    tz = timezone.get_current_timezone()
+    for row in queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        row = list(row)
+        for position in datetime_positions:
+            row[position] = format_datetime(row[position], tz)
+        row[distance_position] = str(row[distance_position])
+        yield row
+
+
+def join_lines(lines, lines_per_chunk=500):
+    """Group encoded lines so the response isn't written one row at a time"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= lines_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(queryset, chunk_size=2000):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def ndjson_lines(queryset, chunk_size=2000):
+    for row in export_rows(queryset, chunk_size):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')) + '\n'
+
+
+def stream_export(queryset, export_format, chunk_size=2000):
+    """Lazily encode ``queryset`` as CSV or NDJSON text chunks"""
+    lines = csv_lines if export_format == 'csv' else ndjson_lines
+    return join_lines(lines(queryset, chunk_size))
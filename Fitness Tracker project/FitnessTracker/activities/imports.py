@@ -0,0 +1,142 @@
+import csv
+import json
+import time
+from itertools import islice
+from django.utils import timezone
+from .models import Activity
+from .serializers import ActivityCreateUpdateSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+CONTENT_TYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+# Only the first rejections are reported in detail; all are counted
+MAX_REPORTED_REJECTIONS = 100
+
+
+def detect_format(content_type='', filename=''):
+    """Guess the import format from a content type or file name, or return None"""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CONTENT_TYPE_FORMATS:
+        return CONTENT_TYPE_FORMATS[media_type]
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    return None
+
+
+def iter_csv_records(lines):
+    """Yield (line number, record) pairs from CSV text lines with a header row"""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def iter_ndjson_records(lines):
+    """Yield (line number, record) pairs from NDJSON lines; bad JSON yields the error text"""
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, f'Invalid JSON: {e}'
+
+
+def iter_records(lines, import_format):
+    if import_format == 'csv':
+        return iter_csv_records(lines)
+    return iter_ndjson_records(lines)
+
+
+class ActivityImporter:
+    """
+    Imports activity records for one user in fixed-size chunks.
+
+    Each chunk is validated with one ListSerializer pass, checked for
+    duplicates of existing (user, date, activity_type, duration) rows with a
+    single query on the (user, date) index, and inserted with one
+    bulk_create. Memory use is bounded by the chunk size.
+    """
+
+    def __init__(self, user, chunk_size=1000):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.rejected_rows = []
+        self.seconds = 0.0
+
+    def run(self, records):
+        started = time.perf_counter()
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        self.seconds += time.perf_counter() - started
+        return self.report()
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.rejected_rows) < MAX_REPORTED_REJECTIONS:
+            self.rejected_rows.append({'line': line, 'errors': errors})
+
+    def import_chunk(self, chunk):
+        self.rows += len(chunk)
+        lines, data = [], []
+        for line, record in chunk:
+            if isinstance(record, dict):
+                lines.append(line)
+                data.append(record)
+            else:
+                self.reject(line, {'non_field_errors': [record if isinstance(record, str) else 'Expected an object.']})
+
+        serializer = ActivityCreateUpdateSerializer(data=data, many=True, context={'partial_success': True})
+        serializer.is_valid()
+        for index, errors in sorted(serializer.item_errors.items()):
+            self.reject(lines[index], errors)
+        valid = serializer.validated_data
+        if not valid:
+            return
+        # Rows without a date get the model default, as the create endpoint does
+        now = timezone.now()
+        for attrs in valid:
+            attrs.setdefault('date', now)
+
+        existing = set(
+            Activity.objects.filter(user=self.user, date__in={attrs['date'] for attrs in valid})
+            .values_list('date', 'activity_type', 'duration')
+        )
+        activities = []
+        for attrs in valid:
+            key = (attrs['date'], attrs['activity_type'], attrs['duration'])
+            if key in existing:
+                self.duplicates += 1
+                continue
+            existing.add(key)
+            activities.append(Activity(user=self.user, **attrs))
+
+        if activities:
+            self.created += len(Activity.objects.bulk_create(activities, batch_size=self.chunk_size))
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'rejected_rows': self.rejected_rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows / self.seconds) if self.seconds else None,
+        }
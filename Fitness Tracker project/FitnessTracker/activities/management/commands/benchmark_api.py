@@ -0,0 +1,285 @@
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from activities import urls as api_urls, urls_web
+from activities.authentication import get_valid_token, invalidate_cached_user
+from activities.benchmarking import (
+    NO_RESULT_CACHE, SEED_PASSWORD, SEED_USERNAME_PREFIX, latency_summary, peak_rss_bytes
+)
+from activities.models import Activity, User
+from activities.timing import parse_server_timing
+
+# Logging out ends the session the other web requests rely on, so it gets a fresh one
+FRESH_SESSION = 'fresh_session'
+
+
+def request_specs(user, activity):
+    """
+    The requests sent to each URL name in activities/urls.py and urls_web.py.
+
+    Each spec names the client it needs: ``token`` (API token),
+    ``anonymous_api``, ``session`` (logged-in browser), ``anonymous`` or
+    ``fresh_session``. Specs marked ``write`` run in a transaction that is
+    rolled back, so every repetition sees the same data. ``expect`` pins the
+    status code where an error would otherwise look like success, such as a
+    form page redisplayed with errors.
+    """
+    today = timezone.now().isoformat()
+    new_activity = {
+        'activity_type': 'running', 'duration': 30, 'distance': '5.00', 'calories_burned': 300, 'date': today,
+    }
+    csv_rows = 'activity_type,duration,distance,calories_burned,date\n' + ''.join(
+        f'cycling,{40 + index},12.50,400,{today}\n' for index in range(10)
+    )
+    registration = {'username': 'benchmark-new-user', 'email': 'benchmark-new-user@example.com'}
+    return {
+        'user-register': [{'method': 'post', 'client': 'anonymous_api', 'write': True, 'data': {
+            **registration, 'password': 'Quiet-harbour-27', 'password_confirm': 'Quiet-harbour-27',
+        }}],
+        'user-login': [{'method': 'post', 'client': 'anonymous_api', 'write': True, 'data': {
+            'username': user.username, 'password': SEED_PASSWORD,
+        }}],
+        'token-rotate': [{'method': 'post', 'client': 'token', 'write': True}],
+        'user-profile': [{'method': 'get', 'client': 'token'}],
+        'activity-list-create': [
+            {'method': 'get', 'client': 'token'},
+            {'method': 'post', 'client': 'token', 'write': True, 'data': new_activity},
+        ],
+        'activity-detail': [
+            {'method': 'get', 'client': 'token', 'args': [activity.pk]},
+            {'method': 'patch', 'client': 'token', 'write': True, 'args': [activity.pk], 'data': {'duration': 45}},
+            {'method': 'delete', 'client': 'token', 'write': True, 'args': [activity.pk]},
+        ],
+        'activity-bulk': [
+            {'method': 'post', 'client': 'token', 'write': True, 'data': [new_activity] * 10},
+            {'method': 'patch', 'client': 'token', 'write': True, 'data': {
+                'activities': [{'id': activity.pk, 'duration': 45}],
+            }},
+            {'method': 'delete', 'client': 'token', 'write': True, 'data': {'ids': [activity.pk]}},
+        ],
+        'activity-history': [{'method': 'get', 'client': 'token'}],
+        'activity-export': [{'method': 'get', 'client': 'token'}],
+        'activity-import': [{'method': 'post', 'client': 'token', 'write': True, 'format': 'multipart', 'data': {
+            'file': lambda: SimpleUploadedFile('activities.csv', csv_rows.encode(), content_type='text/csv'),
+        }}],
+        'activity-metrics': [{'method': 'get', 'client': 'token'}],
+        'activity-trends': [{'method': 'get', 'client': 'token'}],
+        'activity-cache-stats': [{'method': 'get', 'client': 'token'}],
+        'api-dashboard': [{'method': 'get', 'client': 'token'}],
+        'async-activity-metrics': [{'method': 'get', 'client': 'token'}],
+        'async-activity-trends': [{'method': 'get', 'client': 'token'}],
+        'async-dashboard': [{'method': 'get', 'client': 'token'}],
+        'landing': [{'method': 'get', 'client': 'anonymous'}],
+        'login': [
+            {'method': 'get', 'client': 'anonymous'},
+            {'method': 'post', 'client': 'anonymous', 'write': True, 'expect': 302, 'data': {
+                'username': user.username, 'password': SEED_PASSWORD,
+            }},
+        ],
+        'register': [
+            {'method': 'get', 'client': 'anonymous'},
+            {'method': 'post', 'client': 'anonymous', 'write': True, 'expect': 302, 'data': {
+                **registration, 'password1': 'Quiet-harbour-27', 'password2': 'Quiet-harbour-27',
+            }},
+        ],
+        'logout': [{'method': 'get', 'client': FRESH_SESSION, 'write': True}],
+        'dashboard': [{'method': 'get', 'client': 'session'}],
+        'activities': [{'method': 'get', 'client': 'session'}],
+        'add_activity': [
+            {'method': 'get', 'client': 'session'},
+            {'method': 'post', 'client': 'session', 'write': True, 'expect': 302, 'data': {
+                **new_activity, 'date': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            }},
+        ],
+        'profile': [{'method': 'get', 'client': 'session'}],
+        'debug_static': [{'method': 'get', 'client': 'anonymous'}],
+    }
+
+
+def url_names():
+    """Every named URL in activities/urls.py and urls_web.py, in declaration order"""
+    return [
+        pattern.name
+        for module in (api_urls, urls_web)
+        for pattern in module.urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    ]
+
+
+def query_count(response):
+    """SQL queries the request ran, from the Server-Timing header (counts worker threads too)"""
+    db = parse_server_timing(response.get('Server-Timing', '')).get('db')
+    return int(db['desc'].split()[0]) if db else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every endpoint in activities/urls.py and urls_web.py against '
+        'a user created by seed_activities, in process with the test client, '
+        'and report p50/p95/p99 latency, queries per request and peak memory as '
+        'JSON. Everything runs in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username', default=f'{SEED_USERNAME_PREFIX}-0',
+            help=f'Seeded user to run as (default: {SEED_USERNAME_PREFIX}-0)'
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint (default: 50)')
+        parser.add_argument(
+            '--endpoint', action='append', dest='endpoints', metavar='URL_NAME',
+            help='Only benchmark this URL name (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--result-cache', action='store_true',
+            help='Keep the metrics/trends/dashboard result cache on (it is bypassed by default)'
+        )
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["username"]} does not exist; run seed_activities first')
+        activity = Activity.objects.filter(user=user).order_by('-date', '-id').first()
+        if activity is None:
+            raise CommandError(f'User {user.username} has no activities; run seed_activities first')
+
+        names = url_names()
+        unknown = set(options['endpoints'] or ()) - set(names)
+        if unknown:
+            raise CommandError(f'Unknown URL names: {", ".join(sorted(unknown))}')
+        selected = options['endpoints'] or names
+        specs = request_specs(user, activity)
+
+        overrides = {
+            'STATICFILES_STORAGE': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            'SERVER_TIMING': True,
+            **({} if options['result_cache'] else NO_RESULT_CACHE),
+        }
+        results, skipped = {}, {}
+        with override_settings(**overrides), transaction.atomic():
+            # Rolled back with everything else: staff for the cache stats endpoint
+            user.is_staff = True
+            user.save(update_fields=['is_staff'])
+            clients = self.make_clients(user)
+            for name in selected:
+                if name not in specs:
+                    skipped[name] = 'no request spec'
+                    continue
+                for spec in specs[name]:
+                    label = f'{spec["method"].upper()} {name}'
+                    try:
+                        with transaction.atomic():
+                            results[label] = self.measure(name, spec, clients, user, options['requests'])
+                    except Exception as e:
+                        # Report a broken endpoint and carry on with the others
+                        results[label] = {'error': f'{type(e).__name__}: {e}'}
+            transaction.set_rollback(True)
+        invalidate_cached_user(user.pk)
+
+        report = json.dumps({
+            'username': user.username,
+            'activities': Activity.objects.filter(user=user).count(),
+            'requests': options['requests'],
+            'result_cache': options['result_cache'],
+            'peak_rss_mb': round(peak_rss_bytes() / 2**20, 1),
+            'failed': sorted(label for label, result in results.items() if 'error' in result),
+            'results': results,
+            'skipped': skipped,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        self.stdout.write(report)
+
+    def make_clients(self, user):
+        token_client = APIClient()
+        token_client.credentials(HTTP_AUTHORIZATION=f'Token {get_valid_token(user).key}')
+        session_client = Client()
+        session_client.force_login(user)
+        return {'token': token_client, 'session': session_client}
+
+    def client_for(self, spec, clients, user):
+        if spec['client'] == 'anonymous_api':
+            return APIClient()
+        if spec['client'] == 'anonymous':
+            return Client()
+        if spec['client'] == FRESH_SESSION:
+            client = Client()
+            client.force_login(user)
+            return client
+        return clients[spec['client']]
+
+    def send(self, name, spec, client):
+        url = reverse(name, args=spec.get('args', ()))
+        data = spec.get('data')
+        if isinstance(data, dict):
+            # Uploaded files can only be read once, so they are built per request
+            data = {key: value() if callable(value) else value for key, value in data.items()}
+        kwargs = {}
+        if data is not None:
+            kwargs['data'] = data
+        if isinstance(client, APIClient):
+            kwargs['format'] = spec.get('format', 'json')
+        response = getattr(client, spec['method'])(url, **kwargs)
+        queries = query_count(response)
+        if not response.streaming:
+            return response, queries, len(response.content)
+        # A streaming body runs its queries after the middleware has counted
+        streamed = []
+        with connection.execute_wrapper(lambda execute, *args: streamed.append(1) or execute(*args)):
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        return response, (queries or 0) + len(streamed), size
+
+    def timed_request(self, name, spec, clients, user, trace_memory=False):
+        """One request; returns (seconds, queries, status, bytes, peak traced bytes)"""
+        client = self.client_for(spec, clients, user)
+        peak = None
+        with transaction.atomic() if spec.get('write') else nullcontext():
+            if trace_memory:
+                tracemalloc.start()
+            try:
+                started = time.perf_counter()
+                response, queries, size = self.send(name, spec, client)
+                elapsed = time.perf_counter() - started
+                if trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                if trace_memory:
+                    tracemalloc.stop()
+            if spec.get('write'):
+                transaction.set_rollback(True)
+        return elapsed, queries, response.status_code, size, peak
+
+    def measure(self, name, spec, clients, user, requests):
+        # Warm up, and skip the timed runs if the request does not succeed
+        _, _, status, _, _ = self.timed_request(name, spec, clients, user)
+        if status >= 400 or status != spec.get('expect', status):
+            return {'status': status, 'error': f'unexpected status {status}'}
+
+        latencies, queries = [], []
+        for _ in range(requests):
+            elapsed, count, status, size, _ = self.timed_request(name, spec, clients, user)
+            latencies.append(elapsed)
+            queries.append(count)
+        _, _, _, _, peak = self.timed_request(name, spec, clients, user, trace_memory=True)
+
+        counted = [count for count in queries if count is not None]
+        return {
+            'status': status,
+            'bytes': size,
+            **latency_summary(latencies),
+            'queries_per_request': round(sum(counted) / len(counted), 2) if counted else None,
+            'peak_alloc_kb': round(peak / 1024, 1),
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from activities.benchmarking import NO_RESULT_CACHE, latency_summary, seed_activities
+from activities.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare latency of the synchronous (WSGI) summary endpoints with their '
+        'async variants, in process. The benchmark user and its activities are '
+        'committed (worker threads must see them) and deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and path')
+        parser.add_argument('--activities', type=int, default=5000, help='Activities in the user history')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Requests in flight for the asgi_concurrent rows (other rows send one at a time)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        user = User.objects.create_user(
+            username='benchmark-async', email='benchmark-async@example.com', password=None
+        )
+        try:
+            seed_activities(user, options['activities'])
+            auth = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+            trends_params = '?granularity=month&start_date=2000-01-01'
+            comparisons = {
+                'metrics': (
+                    ('wsgi', reverse('activity-metrics') + '?start_date=2000-01-01', {}),
+                    ('asgi', reverse('async-activity-metrics') + '?start_date=2000-01-01', {}),
+                    ('asgi_concurrent', reverse('async-activity-metrics') + '?start_date=2000-01-01', {}),
+                ),
+                'trends': (
+                    ('wsgi', reverse('activity-trends') + trends_params, {}),
+                    ('asgi', reverse('async-activity-trends') + trends_params, {}),
+                    ('asgi_concurrent', reverse('async-activity-trends') + trends_params, {}),
+                ),
+                'dashboard': (
+                    ('wsgi', reverse('api-dashboard'), {}),
+                    ('asgi', reverse('async-dashboard'), {'ASYNC_PARALLEL_QUERIES': False}),
+                    ('asgi_parallel_queries', reverse('async-dashboard'), {'ASYNC_PARALLEL_QUERIES': True}),
+                    ('asgi_concurrent', reverse('async-dashboard'), {'ASYNC_PARALLEL_QUERIES': True}),
+                ),
+            }
+            results = {}
+            with override_settings(**NO_RESULT_CACHE):
+                for endpoint, paths in comparisons.items():
+                    results[endpoint] = {}
+                    for name, url, overrides in paths:
+                        with override_settings(**overrides):
+                            if name == 'wsgi':
+                                result = self.measure_sync(url, auth, options['requests'])
+                            else:
+                                # One request at a time, unless measuring concurrent load
+                                concurrency = options['concurrency'] if name == 'asgi_concurrent' else 1
+                                result = asyncio.run(self.measure_async(url, auth, options['requests'], concurrency))
+                        results[endpoint][name] = result
+        finally:
+            user.delete()
+
+        self.stdout.write(json.dumps({
+            'requests': options['requests'],
+            'activities': options['activities'],
+            'concurrency': options['concurrency'],
+            'results': results,
+        }, indent=2))
+
+    def check_response(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+
+    def measure_sync(self, url, auth, requests):
+        client = Client()
+        client.get(url, headers=auth)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            self.check_response(client.get(url, headers=auth), url)
+            latencies.append(time.perf_counter() - request_started)
+        return latency_summary(latencies, time.perf_counter() - started)
+
+    async def measure_async(self, url, auth, requests, concurrency):
+        client = AsyncClient()
+        self.check_response(await client.get(url, headers=auth), url)
+        latencies = []
+
+        async def timed_get():
+            request_started = time.perf_counter()
+            response = await client.get(url, headers=auth)
+            latencies.append(time.perf_counter() - request_started)
+            self.check_response(response, url)
+
+        started = time.perf_counter()
+        for offset in range(0, requests, concurrency):
+            await asyncio.gather(*(timed_get() for _ in range(min(concurrency, requests - offset))))
+        return latency_summary(latencies, time.perf_counter() - started)
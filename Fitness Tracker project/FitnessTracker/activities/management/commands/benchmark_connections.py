@@ -0,0 +1,148 @@
+import copy
+import json
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from activities.benchmarking import latency_summary
+from activities.models import Activity, User
+from activities.pooling import pool_for
+from activities.timing import RequestTiming, current_timing
+
+# The backends that time connects and can pool
+BACKENDS = {
+    'django.db.backends.postgresql': 'activities.backends.postgresql',
+    'django.db.backends.sqlite3': 'activities.backends.sqlite3',
+}
+MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure what opening a database connection costs each request. '
+        'Threads run the queries of an activity list request against the '
+        'default database, wrapped in request_started/request_finished like '
+        'a real request, with a connection per request (CONN_MAX_AGE=0), '
+        'persistent per-thread connections, and a pool shared by the threads. '
+        'The report compares throughput, latency and the time each request '
+        'spent connecting.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads (default: 4)')
+        parser.add_argument('--requests', type=int, default=250, help='Requests per thread and mode (default: 250)')
+        parser.add_argument(
+            '--pool-size', type=int, help='Connections in the pool (default: one per thread)'
+        )
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=MODES,
+            help='Only run this mode (repeatable; default: all)'
+        )
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['requests'] < 1:
+            raise CommandError('--threads and --requests must be positive')
+        pool_size = options['pool_size'] or options['threads']
+        if pool_size < 1:
+            raise CommandError('--pool-size must be positive')
+        base = connections.settings[DEFAULT_DB_ALIAS]
+        if base['ENGINE'] not in BACKENDS and base['ENGINE'] not in BACKENDS.values():
+            raise CommandError(f'Cannot benchmark connections of {base["ENGINE"]}')
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True)[:100]) or [0]
+
+        results = {}
+        for mode in options['modes'] or MODES:
+            results[mode] = self.run_mode(mode, base, user_ids, pool_size, options)
+
+        report = {
+            'engine': base['ENGINE'],
+            'threads': options['threads'],
+            'requests_per_thread': options['requests'],
+            'results': results,
+        }
+        if 'per-request' in results:
+            # What every request pays today on top of a reused connection
+            reused = min(
+                (results[mode]['connect_ms_per_request'] for mode in ('persistent', 'pool') if mode in results),
+                default=None,
+            )
+            if reused is not None:
+                report['connect_overhead_ms_per_request'] = round(
+                    results['per-request']['connect_ms_per_request'] - reused, 3
+                )
+        report = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        self.stdout.write(report)
+
+    def database_settings(self, mode, base, pool_size):
+        settings_dict = copy.deepcopy(base)
+        settings_dict['ENGINE'] = BACKENDS.get(settings_dict['ENGINE'], settings_dict['ENGINE'])
+        settings_dict['OPTIONS'].pop('pool', None)
+        if mode == 'per-request':
+            settings_dict.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        else:
+            settings_dict.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        if mode == 'pool':
+            settings_dict['OPTIONS']['pool'] = {'max_size': pool_size, 'timeout': 30}
+        return settings_dict
+
+    def run_mode(self, mode, base, user_ids, pool_size, options):
+        alias = f'benchmark-connections-{mode}'
+        connections.settings[alias] = self.database_settings(mode, base, pool_size)
+        pool = pool_for(alias, connections.settings[alias])
+        samples = []
+        errors = []
+
+        def run(index):
+            latencies, connects = [], []
+            try:
+                for number in range(options['requests']):
+                    user_id = user_ids[(index + number) % len(user_ids)]
+                    timing = RequestTiming()
+                    token = current_timing.set(timing)
+                    started = time.perf_counter()
+                    try:
+                        request_started.send(sender=self.__class__)
+                        activities = Activity.objects.using(alias).filter(user_id=user_id)
+                        activities.count()
+                        list(activities.order_by('-date')[:20])
+                        request_finished.send(sender=self.__class__)
+                    finally:
+                        current_timing.reset(token)
+                    latencies.append(time.perf_counter() - started)
+                    connects.append(sum(timing.connects))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[alias].close()
+            samples.append((latencies, connects))
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        try:
+            if errors:
+                raise CommandError(f'{mode}: {errors[0]!r}')
+            latencies = [seconds for worker, _ in samples for seconds in worker]
+            connects = [seconds for _, worker in samples for seconds in worker]
+            result = {
+                'requests': len(latencies),
+                **latency_summary(latencies, elapsed),
+                'connect_ms_per_request': round(sum(connects) / len(connects) * 1000, 3),
+                'requests_that_connected': sum(1 for seconds in connects if seconds),
+            }
+            if pool is not None:
+                result['pool'] = pool.stats()
+            return result
+        finally:
+            if pool is not None:
+                pool.close()
+            del connections.settings[alias]
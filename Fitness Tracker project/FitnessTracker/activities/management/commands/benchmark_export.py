@@ -0,0 +1,63 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from activities.benchmarking import rss_bytes, peak_rss_bytes, seed_activities
+from activities.exports import EXPORT_FORMATS, stream_export
+from activities.models import Activity, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure memory use while streaming a large activity export. '
+        'Rows are inserted in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Activities to export (default: 1,000,000)')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', dest='export_format')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--samples', type=int, default=10, help='Number of RSS samples taken during the export')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if rows < 1 or options['samples'] < 1:
+            raise CommandError('--rows and --samples must be positive')
+
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='benchmark-export', email='benchmark-export@example.com', password=None
+            )
+            self.stderr.write(f'Inserting {rows} activities...')
+            seed_activities(user, rows)
+
+            queryset = Activity.objects.filter(user=user).order_by('-date', '-id')
+            sample_every = max(rows // options['samples'], 1)
+            samples = []
+            exported = -1 if options['export_format'] == 'csv' else 0  # Skip the CSV header line
+            total_bytes = 0
+            start_rss = rss_bytes()
+            started = time.perf_counter()
+            for chunk in stream_export(queryset, options['export_format'], options['chunk_size']):
+                total_bytes += len(chunk.encode('utf-8'))
+                before = exported
+                exported += chunk.count('\n')
+                if exported // sample_every != before // sample_every:
+                    samples.append({'rows': exported, 'rss_mb': round(rss_bytes() / 2**20, 1)})
+            elapsed = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        rss_values = [sample['rss_mb'] for sample in samples] or [round(start_rss / 2**20, 1)]
+        self.stdout.write(json.dumps({
+            'format': options['export_format'],
+            'rows': rows,
+            'chunk_size': options['chunk_size'],
+            'bytes': total_bytes,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(rows / elapsed) if elapsed else None,
+            'rss_start_mb': round(start_rss / 2**20, 1),
+            'rss_growth_mb': round(max(rss_values) - min(rss_values), 1),
+            'peak_rss_mb': round(peak_rss_bytes() / 2**20, 1),
+            'samples': samples,
+        }, indent=2))
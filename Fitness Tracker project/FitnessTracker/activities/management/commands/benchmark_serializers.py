@@ -0,0 +1,80 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from activities.benchmarking import seed_activities
+from activities.models import Activity, User
+from activities.serializers import (
+    ActivitySerializer,
+    activity_value_columns,
+    parse_activity_fields,
+    serialize_activity_values,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-row cost of ActivitySerializer with the values() fast path '
+        'used by the activity list and history APIs. Rows are inserted in a '
+        'transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Activities to serialize (default: 20,000)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the fastest is reported')
+        parser.add_argument('--fields', default='', help='Sparse fieldset for the fast path, as in ?fields=')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if rows < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+        try:
+            fields = parse_activity_fields(options['fields'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='benchmark-serializers', email='benchmark-serializers@example.com', password=None
+            )
+            self.stderr.write(f'Inserting {rows} activities...')
+            seed_activities(user, rows)
+            queryset = Activity.objects.filter(user=user)
+
+            results = {
+                'model_serializer': self.measure(
+                    lambda: ActivitySerializer(queryset.all(), many=True).data, options['repeat']
+                ),
+                'model_serializer_select_related': self.measure(
+                    lambda: ActivitySerializer(queryset.select_related('user'), many=True).data, options['repeat']
+                ),
+                'values_fast_path': self.measure(
+                    lambda: serialize_activity_values(queryset.values(*activity_value_columns(fields)), fields),
+                    options['repeat']
+                ),
+            }
+            transaction.set_rollback(True)
+
+        for result in results.values():
+            result['us_per_row'] = round(result['seconds'] * 1e6 / rows, 2)
+        baseline = results['model_serializer_select_related']['us_per_row']
+        for result in results.values():
+            result['speedup'] = round(baseline / result['us_per_row'], 1) if result['us_per_row'] else None
+        self.stdout.write(json.dumps({'rows': rows, 'fields': list(fields), 'results': results}, indent=2))
+
+    def measure(self, serialize, repeat):
+        best = None
+        for _ in range(repeat):
+            queries = []
+            with connection.execute_wrapper(self.count_query(queries)):
+                started = time.perf_counter()
+                serialize()
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return {'seconds': round(best, 4), 'queries': len(queries)}
+
+    def count_query(self, queries):
+        def wrapper(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+        return wrapper
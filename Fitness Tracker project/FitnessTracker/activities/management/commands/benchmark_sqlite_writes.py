@@ -0,0 +1,203 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from activities.benchmarking import latency_summary
+from activities.models import User
+from activities.timing import RequestTiming, current_timing
+from activities.views import ActivityListCreateView
+
+MODES = ('default', 'production')
+USERNAME_PREFIX = 'sqlite-bench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure SQLite write throughput under contention, with and without '
+        'SQLITE_PRODUCTION_MODE. Each mode gets a fresh copy of a migrated and '
+        'seeded database in a temporary directory; writer processes POST to '
+        'the activity list view while reader processes list activities, and '
+        'the report compares writes per second, write latency and "database '
+        'is locked" errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Writer processes (default: 8)')
+        parser.add_argument('--readers', type=int, default=2, help='Reader processes (default: 2)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per mode (default: 10)')
+        parser.add_argument(
+            '--activities', type=int, default=500, help='Activities seeded per user before the run (default: 500)'
+        )
+        parser.add_argument(
+            '--mode', action='append', dest='modes', choices=MODES,
+            help='Only run this mode (repeatable; default: both)'
+        )
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+        # Internal: run as one worker process of a benchmark
+        parser.add_argument('--worker', help='ROLE:INDEX of the worker process to run', dest='worker')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_worker(options)
+        if options['writers'] < 1 or options['readers'] < 0 or options['duration'] <= 0:
+            raise CommandError('--writers and --duration must be positive and --readers must not be negative')
+
+        modes = options['modes'] or MODES
+        results = {}
+        with tempfile.TemporaryDirectory(prefix='sqlite-bench-') as directory:
+            template = os.path.join(directory, 'template.sqlite3')
+            # Built in default mode: journal_mode=wal is stored in the file and would carry over
+            self.manage(template, 'default', 'migrate', '--verbosity', '0')
+            self.manage(
+                template, 'default', 'seed_activities', '--users', str(options['writers'] + options['readers']),
+                '--activities', str(options['activities']), '--prefix', USERNAME_PREFIX,
+            )
+            for mode in modes:
+                database = os.path.join(directory, f'{mode}.sqlite3')
+                shutil.copyfile(template, database)
+                results[mode] = self.run_mode(database, mode, options)
+
+        report = {
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'duration_s': options['duration'],
+            'results': results,
+        }
+        if len(results) == len(MODES) and results['default']['writes_per_second']:
+            report['write_throughput_ratio'] = round(
+                results['production']['writes_per_second'] / results['default']['writes_per_second'], 2
+            )
+        report = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        self.stdout.write(report)
+
+    def environment(self, database, mode):
+        env = os.environ.copy()
+        env.pop('DATABASE_URL', None)
+        env['SQLITE_PATH'] = database
+        env['SQLITE_PRODUCTION_MODE'] = str(mode == 'production')
+        return env
+
+    def manage(self, database, mode, *arguments):
+        result = subprocess.run(
+            [sys.executable, 'manage.py', *arguments], cwd=settings.BASE_DIR,
+            env=self.environment(database, mode), capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'manage.py {arguments[0]} failed:\n{result.stderr}')
+        return result.stdout
+
+    def run_mode(self, database, mode, options):
+        workers = [
+            (role, index)
+            for role, count, first in (
+                ('writer', options['writers'], 0), ('reader', options['readers'], options['writers'])
+            )
+            for index in range(first, first + count)
+        ]
+        processes = [
+            subprocess.Popen(
+                [
+                    sys.executable, 'manage.py', 'benchmark_sqlite_writes', '--worker', f'{role}:{index}',
+                    '--duration', str(options['duration']),
+                ],
+                cwd=settings.BASE_DIR, env=self.environment(database, mode),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            for role, index in workers
+        ]
+        # Start together once every worker has imported Django and connected
+        for process in processes:
+            process.stdout.readline()
+        start_at = time.time() + 0.1
+        for process in processes:
+            process.stdin.write(f'{start_at}\n')
+            process.stdin.flush()
+        samples = {'writer': [], 'reader': []}
+        for (role, _), process in zip(workers, processes):
+            stdout, stderr = process.communicate()
+            if process.returncode:
+                raise CommandError(f'{mode} {role} worker failed:\n{stderr}')
+            samples[role].append(json.loads(stdout))
+
+        writes = samples['writer']
+        latencies = [seconds for worker in writes for seconds in worker['latencies']]
+        written = sum(worker['ok'] for worker in writes)
+        reads = sum(worker['ok'] for worker in samples['reader'])
+        return {
+            'engine': 'activities.backends.sqlite3' if mode == 'production' else 'django.db.backends.sqlite3',
+            'journal_mode': writes[0]['journal_mode'],
+            'writes': written,
+            'writes_per_second': round(written / options['duration'], 1),
+            'write_errors': sum(worker['errors'] for worker in writes),
+            'lock_errors': sum(worker['lock_errors'] for worker in writes + samples['reader']),
+            'write_latency': latency_summary(latencies) if latencies else None,
+            'reads_per_second': round(reads / options['duration'], 1),
+            'read_errors': sum(worker['errors'] for worker in samples['reader']),
+        }
+
+    def run_worker(self, options):
+        role, _, index = options['worker'].partition(':')
+        if str(connection.settings_dict['NAME']) != os.environ.get('SQLITE_PATH'):
+            raise CommandError('The settings module must take the database path from SQLITE_PATH')
+        user = User.objects.get(username=f'{USERNAME_PREFIX}-{index}')
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+
+        factory = APIRequestFactory()
+        view = ActivityListCreateView.as_view()
+        rng = random.Random(index)
+        ok = errors = lock_errors = 0
+        latencies = []
+        self.stdout.write('ready')
+        self.stdout.flush()
+        start_at = float(sys.stdin.readline())
+        time.sleep(max(0, start_at - time.time()))
+        deadline = start_at + options['duration']
+        while time.time() < deadline:
+            if role == 'writer':
+                request = factory.post('/api/activities/', {
+                    'activity_type': rng.choice(['running', 'walking', 'cycling']),
+                    'duration': rng.randint(10, 90),
+                    'distance': f'{rng.uniform(1, 20):.2f}',
+                    'calories_burned': rng.randint(100, 900),
+                    'date': timezone.now().isoformat(),
+                }, format='json')
+            else:
+                request = factory.get('/api/activities/')
+            force_authenticate(request, user=user)
+
+            timing = RequestTiming()
+            token = current_timing.set(timing)
+            started = time.perf_counter()
+            try:
+                status = view(request).status_code
+            except Exception:
+                status = 500
+            finally:
+                current_timing.reset(token)
+            if 200 <= status < 300:
+                ok += 1
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            lock_errors += len(timing.lock_errors)
+
+        self.stdout.write(json.dumps({
+            'journal_mode': journal_mode,
+            'ok': ok,
+            'errors': errors,
+            'lock_errors': lock_errors,
+            'latencies': latencies if role == 'writer' else [],
+        }))
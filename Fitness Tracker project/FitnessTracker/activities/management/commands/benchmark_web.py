@@ -0,0 +1,86 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from activities.authentication import invalidate_cached_user
+from activities.benchmarking import seed_activities
+from activities.models import User
+
+# Session engine and request.user caching for each mode
+MODES = {
+    'db': {'SESSION_ENGINE': 'django.contrib.sessions.backends.db', 'WEB_CACHED_USER': False},
+    'cached_db': {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db', 'WEB_CACHED_USER': True},
+    'cache': {'SESSION_ENGINE': 'django.contrib.sessions.backends.cache', 'WEB_CACHED_USER': True},
+    'signed_cookies': {'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies', 'WEB_CACHED_USER': True},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure requests per second on the dashboard page for each web session '
+        'mode, in process with the test client. Data is inserted in a '
+        'transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode (default: 500)')
+        parser.add_argument('--activities', type=int, default=1000, help='Activities in the user history')
+        parser.add_argument(
+            '--mode', action='append', choices=list(MODES), dest='modes',
+            help='Mode to measure (repeatable; default: all). "db" is the uncached baseline.'
+        )
+        parser.add_argument('--path', default=None, help='Page to request (default: the dashboard)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive')
+        path = options['path'] or reverse('dashboard')
+        modes = options['modes'] or list(MODES)
+
+        results = {}
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='benchmark-web', email='benchmark-web@example.com', password=None
+            )
+            seed_activities(user, options['activities'])
+            for mode in modes:
+                overrides = {
+                    **MODES[mode],
+                    'STATICFILES_STORAGE': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+                }
+                with override_settings(**overrides):
+                    results[mode] = self.measure(user, path, options['requests'])
+            transaction.set_rollback(True)
+        invalidate_cached_user(user.pk)
+
+        baseline = results.get('db', {}).get('requests_per_second')
+        for result in results.values():
+            result['speedup'] = round(result['requests_per_second'] / baseline, 2) if baseline else None
+        self.stdout.write(json.dumps({
+            'path': path,
+            'requests': options['requests'],
+            'activities': options['activities'],
+            'results': results,
+        }, indent=2))
+
+    def measure(self, user, path, requests):
+        client = Client()
+        client.force_login(user)
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}')
+
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get(path)
+            elapsed = time.perf_counter() - started
+        return {
+            'requests_per_second': round(requests / elapsed, 1),
+            'ms_per_request': round(elapsed * 1000 / requests, 2),
+            'queries_per_request': round(len(queries) / requests, 2),
+            'session_queries_per_request': round(sum('django_session' in sql for sql in queries) / requests, 2),
+        }
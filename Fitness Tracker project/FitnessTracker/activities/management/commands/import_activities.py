@@ -0,0 +1,42 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from activities.imports import IMPORT_FORMATS, ActivityImporter, detect_format, iter_records
+from activities.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import activities for a user from a CSV or NDJSON file, in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the activities belong to')
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS, dest='import_format',
+            help='File format (default: detected from the file extension)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows validated and inserted per chunk')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['username']}")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive integer')
+
+        import_format = options['import_format'] or detect_format(filename=options['path'])
+        if import_format is None:
+            raise CommandError('Could not detect the file format; pass --format')
+
+        importer = ActivityImporter(user, chunk_size=options['chunk_size'])
+        if options['path'] == '-':
+            report = importer.run(iter_records(sys.stdin, import_format))
+        else:
+            try:
+                with open(options['path'], encoding='utf-8-sig', newline='') as source:
+                    report = importer.run(iter_records(source, import_format))
+            except OSError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(json.dumps(report, indent=2, default=str))
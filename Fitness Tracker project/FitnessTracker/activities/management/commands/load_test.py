@@ -0,0 +1,293 @@
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from activities.benchmarking import SEED_PASSWORD, SEED_USERNAME_PREFIX, latency_summary
+from activities.models import Activity, User
+from activities.timing import parse_server_timing
+
+OPERATIONS = ('login', 'list', 'create', 'metrics', 'dashboard')
+DEFAULT_MIX = 'login=5,list=35,create=15,metrics=25,dashboard=20'
+
+
+def parse_mix(value):
+    """Parse ``op=weight,...`` into {operation: weight}"""
+    mix = {}
+    for part in value.split(','):
+        operation, _, weight = part.partition('=')
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise CommandError(f'Unknown operation {operation!r}; choose from {", ".join(OPERATIONS)}')
+        try:
+            mix[operation] = float(weight)
+        except ValueError:
+            raise CommandError(f'Weight for {operation} must be a number')
+        if mix[operation] < 0:
+            raise CommandError(f'Weight for {operation} must not be negative')
+    if not any(mix.values()):
+        raise CommandError('--mix needs at least one positive weight')
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class VirtualUser:
+    """
+    One synthetic user replaying the mix over its own keep-alive connection.
+
+    Every response is recorded as (operation, status, seconds, write ms,
+    lock wait ms, lock errors), with status 0 for connection failures. Write
+    time, lock wait and lock errors come from the server's Server-Timing
+    header.
+    """
+
+    def __init__(self, target, username, rng):
+        self.target = target
+        self.username = username
+        self.rng = rng
+        self.token = None
+        self.connection = None
+        self.samples = []
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.target.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(self.target.hostname, self.target.port, timeout=60)
+
+    def request(self, operation, method, path, payload=None, record=True):
+        headers = {'Accept': 'application/json'}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload)
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if self.connection is None:
+            self.connect()
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            if record:
+                self.samples.append((operation, 0, time.perf_counter() - started, 0.0, 0.0, 0))
+            return 0, b''
+        elapsed = time.perf_counter() - started
+
+        timing = parse_server_timing(response.getheader('Server-Timing') or '')
+        write_ms = (timing.get('dbw') or {}).get('dur') or 0.0
+        lock_wait_ms = (timing.get('dblock') or {}).get('dur') or 0.0
+        lock_errors = int(((timing.get('dblockerr') or {}).get('desc') or '0').split()[0])
+        if record:
+            self.samples.append((operation, response.status, elapsed, write_ms, lock_wait_ms, lock_errors))
+        return response.status, content
+
+    def login(self, record=True):
+        status, content = self.request(
+            'login', 'POST', '/api/auth/login/', {'username': self.username, 'password': SEED_PASSWORD}, record
+        )
+        self.token = json.loads(content)['token'] if status == 200 else None
+
+    def run(self, mix, measure_from, deadline):
+        operations, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            record = time.perf_counter() >= measure_from
+            if self.token is None:
+                self.login(record)
+                continue
+            operation = self.rng.choices(operations, weights)[0]
+            if operation == 'login':
+                self.login(record)
+            elif operation == 'list':
+                self.request(operation, 'GET', '/api/activities/', record=record)
+            elif operation == 'create':
+                self.request(operation, 'POST', '/api/activities/', {
+                    'activity_type': self.rng.choice(['running', 'walking', 'cycling']),
+                    'duration': self.rng.randint(10, 90),
+                    'distance': f'{self.rng.uniform(1, 20):.2f}',
+                    'calories_burned': self.rng.randint(100, 900),
+                    'date': timezone.now().isoformat(),
+                }, record=record)
+            elif operation == 'metrics':
+                self.request(operation, 'GET', '/api/activities/metrics/', record=record)
+            else:
+                self.request(operation, 'GET', '/api/dashboard/', record=record)
+        if self.connection is not None:
+            self.connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the API with a mixed read/write workload. Starts the WSGI '
+        'app under gunicorn with the given workers and threads (or targets '
+        '--url), replays login, list, create, metrics and dashboard requests '
+        'from the users created by seed_activities, and reports throughput, '
+        'tail latency, error rate, database write time and write lock wait as JSON. '
+        'Activities created during the run are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes (default: 2)')
+        parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker (default: 1)')
+        parser.add_argument('--url', help='Load an already running server instead of starting gunicorn')
+        parser.add_argument(
+            '--concurrency', type=int, default=16, help='Simulated users sending requests at once (default: 16)'
+        )
+        parser.add_argument('--duration', type=float, default=30, help='Measured seconds (default: 30)')
+        parser.add_argument(
+            '--warmup', type=float, default=3, help='Seconds of load before measuring starts (default: 3)'
+        )
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX, help=f'Relative weight of each operation (default: {DEFAULT_MIX})'
+        )
+        parser.add_argument(
+            '--prefix', default=SEED_USERNAME_PREFIX,
+            help=f'Username prefix of the seeded users (default: {SEED_USERNAME_PREFIX})'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request sequence')
+        parser.add_argument('--keep-created', action='store_true', help='Keep activities created during the run')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if min(options['workers'], options['threads'], options['concurrency']) < 1 or options['duration'] <= 0:
+            raise CommandError('--workers, --threads, --concurrency and --duration must be positive')
+        mix = parse_mix(options['mix'])
+        usernames = list(
+            User.objects.filter(username__startswith=f'{options["prefix"]}-')
+            .order_by('username').values_list('username', flat=True)
+        )
+        if not usernames:
+            raise CommandError(f'No users named {options["prefix"]}-*; run seed_activities first')
+
+        server = None
+        if options['url']:
+            target = urlsplit(options['url'])
+        else:
+            target = urlsplit(f'http://127.0.0.1:{free_port()}')
+            server = self.start_server(target, options['workers'], options['threads'])
+
+        started_at = timezone.now()
+        rng = random.Random(options['seed'])
+        users = [
+            VirtualUser(target, usernames[index % len(usernames)], random.Random(rng.random()))
+            for index in range(options['concurrency'])
+        ]
+        try:
+            measure_from = time.perf_counter() + options['warmup']
+            deadline = measure_from + options['duration']
+            threads = [threading.Thread(target=user.run, args=(mix, measure_from, deadline)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if server is not None:
+                self.stop_server(server)
+
+        created = 0
+        if not options['keep_created']:
+            # One user at a time: with ACTIVITY_SHARDS their activities are on different databases
+            for user in User.objects.filter(username__in=usernames):
+                created += Activity.objects.filter(user=user, created_at__gte=started_at).delete()[0]
+
+        report = json.dumps({
+            'target': options['url'] or 'gunicorn',
+            'workers': None if options['url'] else options['workers'],
+            'threads': None if options['url'] else options['threads'],
+            'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'mix': mix,
+            'users': min(len(usernames), options['concurrency']),
+            **self.summarize([sample for user in users for sample in user.samples], options['duration']),
+            'created_activities_deleted': created,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        self.stdout.write(report)
+
+    def start_server(self, target, workers, threads):
+        command = [
+            sys.executable, '-m', 'gunicorn', 'FitnessTracker.wsgi:application',
+            '--bind', f'{target.hostname}:{target.port}',
+            '--workers', str(workers), '--threads', str(threads),
+            '--log-level', 'warning', '--timeout', '120',
+        ]
+        # Same settings module as this command, so both use the same database
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=os.environ.copy())
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}')
+            try:
+                socket.create_connection((target.hostname, target.port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        self.stop_server(server)
+        raise CommandError('gunicorn did not start listening within 30 seconds')
+
+    def stop_server(self, server):
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    def summarize(self, samples, duration):
+        if not samples:
+            raise CommandError('No requests completed during the measured window')
+        by_operation = defaultdict(list)
+        for sample in samples:
+            by_operation[sample[0]].append(sample)
+        errors = Counter(str(status) for _, status, *_ in samples if not 200 <= status < 400)
+        write_ms = [write for *_, write, _, _ in samples if write]
+        lock_wait_ms = [wait for *_, wait, _ in samples if wait]
+
+        def operation_summary(operation_samples):
+            failed = sum(1 for _, status, *_ in operation_samples if not 200 <= status < 400)
+            return {
+                'requests': len(operation_samples),
+                'error_rate': round(failed / len(operation_samples), 4),
+                **latency_summary([seconds for _, _, seconds, *_ in operation_samples]),
+            }
+
+        return {
+            'requests': len(samples),
+            'requests_per_second': round(len(samples) / duration, 1),
+            'error_rate': round(sum(errors.values()) / len(samples), 4),
+            'errors_by_status': dict(sorted(errors.items())),
+            'latency': latency_summary([seconds for _, _, seconds, *_ in samples]),
+            'operations': {
+                operation: operation_summary(by_operation[operation])
+                for operation in OPERATIONS if operation in by_operation
+            },
+            'db': {
+                'write_requests': len(write_ms),
+                'write_ms_total': round(sum(write_ms), 1),
+                'write_ms': latency_summary([ms / 1000 for ms in write_ms]) if write_ms else None,
+                'lock_wait_requests': len(lock_wait_ms),
+                'lock_wait_ms_total': round(sum(lock_wait_ms), 1),
+                'lock_wait_ms': latency_summary([ms / 1000 for ms in lock_wait_ms]) if lock_wait_ms else None,
+                'lock_errors': sum(lock_errors for *_, lock_errors in samples),
+            },
+        }
@@ -0,0 +1,79 @@
+import json
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from activities.models import Activity, ActivityDailyRollup, bump_activity_version
+from activities.sharding import shard_aliases, shard_for_user
+
+
+class Command(BaseCommand):
+    help = (
+        'Move each user\'s activities and rollups to the shard their id hashes '
+        'to. Run it once after setting ACTIVITY_SHARD_URLS to move existing '
+        'rows off the primary, and again whenever the shard list changes. '
+        'Activities keep their ids; a user\'s rows are copied in one '
+        'transaction on the target and then deleted from the source, so an '
+        'interrupted run can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read per query (default: 1000)')
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        if not shards:
+            raise CommandError('Sharding is off; set ACTIVITY_SHARD_URLS first')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        moves = []
+        for source in dict.fromkeys([DEFAULT_DB_ALIAS, *shards]):
+            user_ids = set(
+                Activity.objects.using(source).order_by().values_list('user_id', flat=True).distinct()
+            ) | set(
+                ActivityDailyRollup.objects.using(source).order_by().values_list('user_id', flat=True).distinct()
+            )
+            moves.extend(
+                (source, shard_for_user(user_id), user_id)
+                for user_id in sorted(user_ids) if shard_for_user(user_id) != source
+            )
+
+        started = time.perf_counter()
+        users, activities = Counter(), Counter()
+        for source, target, user_id in moves:
+            route = f'{source} -> {target}'
+            users[route] += 1
+            if options['dry_run']:
+                activities[route] += Activity.objects.using(source).filter(user_id=user_id).count()
+            else:
+                activities[route] += self.move_user(user_id, source, target, options['batch_size'])
+
+        self.stdout.write(json.dumps({
+            'shards': shards,
+            'dry_run': options['dry_run'],
+            'users_moved': sum(users.values()),
+            'activities_moved': sum(activities.values()),
+            'routes': {route: {'users': users[route], 'activities': activities[route]} for route in sorted(users)},
+            'seconds': round(time.perf_counter() - started, 2),
+        }, indent=2))
+
+    def move_user(self, user_id, source, target, batch_size):
+        """Copy one user's activities to ``target``, rebuild their rollups there, then delete the originals"""
+        copied = 0
+        with transaction.atomic(using=target):
+            # Rows copied by an interrupted run are already there
+            existing = set(Activity.objects.using(target).filter(user_id=user_id).values_list('pk', flat=True))
+            rows = Activity.objects.using(source).filter(user_id=user_id).order_by('pk')
+            for activity in rows.iterator(chunk_size=batch_size):
+                if activity.pk not in existing:
+                    # raw: keep created_at and updated_at as they are, like loaddata
+                    activity.save_base(raw=True, force_insert=True, using=target)
+                    copied += 1
+            ActivityDailyRollup.objects.db_manager(target).rebuild(user_ids=[user_id], batch_size=batch_size)
+            bump_activity_version([user_id], target)
+        with transaction.atomic(using=source):
+            Activity.objects.using(source).filter(user_id=user_id).delete()
+            ActivityDailyRollup.objects.using(source).filter(user_id=user_id).delete()
+        return copied
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from activities.models import ActivityDailyRollup, User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ActivityDailyRollup table from raw Activity rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', metavar='USERNAME',
+            help='Only rebuild rollups for this user (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rollup rows inserted per query (default: 1000)'
+        )
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+
+        user_ids = None
+        if options['usernames']:
+            users = User.objects.using(options['database']).filter(username__in=options['usernames'])
+            user_ids = list(users.values_list('id', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                found = set(users.values_list('username', flat=True))
+                missing = ', '.join(sorted(set(options['usernames']) - found))
+                raise CommandError(f'Unknown user(s): {missing}')
+
+        created = ActivityDailyRollup.objects.db_manager(options['database']).rebuild(
+            user_ids=user_ids, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily rollup rows'))
@@ -0,0 +1,58 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from activities.benchmarking import SEED_PASSWORD, SEED_USERNAME_PREFIX, seed_users
+from activities.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Create N users with M synthetic activities each for benchmarking. '
+        'Activity types, durations, distances, calories and dates follow '
+        'realistic distributions drawn from --seed, so the same arguments '
+        'always produce the same dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to create (default: 10)')
+        parser.add_argument('--activities', type=int, default=1000, help='Activities per user (default: 1000)')
+        parser.add_argument('--days', type=int, default=365, help='Spread activities over this many days (default: 365)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument(
+            '--prefix', default=SEED_USERNAME_PREFIX,
+            help=f'Usernames are <prefix>-0, <prefix>-1, ... (default: {SEED_USERNAME_PREFIX})'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete users created by an earlier run with the same prefix first'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['activities'] < 0 or options['days'] < 1:
+            raise CommandError('--users and --days must be positive and --activities must not be negative')
+
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}-')
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                existing.delete()
+            elif existing.exists():
+                raise CommandError(f'Users named {prefix}-* already exist; pass --clear to replace them')
+            users = seed_users(
+                options['users'], options['activities'], seed=options['seed'], days=options['days'], prefix=prefix
+            )
+        elapsed = time.perf_counter() - started
+
+        total = len(users) * options['activities']
+        self.stdout.write(json.dumps({
+            'users': len(users),
+            'activities_per_user': options['activities'],
+            'activities': total,
+            'usernames': f'{prefix}-0 .. {prefix}-{len(users) - 1}',
+            'password': SEED_PASSWORD,
+            'seed': options['seed'],
+            'seconds': round(elapsed, 2),
+            'activities_per_second': round(total / elapsed) if elapsed else None,
+        }, indent=2))
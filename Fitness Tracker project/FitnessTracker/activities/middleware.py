@@ -0,0 +1,251 @@
+import cProfile
+import json
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from .authentication import auth_cache, web_user_cache_key
+from .profiling import consume, profile_report, profiling_requested, staff_user
+from .prometheus import observe_request
+from .routers import ReadRouting, current_routing, replica_aliases
+from .timing import RequestTiming, current_timing, server_timing_header
+
+slow_request_logger = logging.getLogger('activities.slow_requests')
+
+
+def get_cached_user(request):
+    """
+    The session's user, served from the shared cache when possible.
+
+    A cached user is only returned if the session still names the same user
+    and backend and its auth hash matches, so a password change logs other
+    sessions out exactly as django.contrib.auth.get_user would. Anything else
+    falls back to get_user(), whose result is cached for the next request.
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is not None and session.get(auth.BACKEND_SESSION_KEY) in settings.AUTHENTICATION_BACKENDS:
+        user = auth_cache().get(web_user_cache_key(user_id))
+        if (
+            user is not None
+            and user.is_active
+            and constant_time_compare(session.get(auth.HASH_SESSION_KEY, ''), user.get_session_auth_hash())
+        ):
+            return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        auth_cache().set(web_user_cache_key(user.pk), user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that reads ``request.user`` through the cache.
+
+    Cached users are dropped whenever the user row or the user's activities
+    change and on logout (see invalidate_cached_user). Without WEB_CACHED_USER,
+    which needs a cache shared by all workers, the user is loaded from the
+    database on every request instead.
+    """
+
+    def process_request(self, request):
+        if not getattr(settings, 'WEB_CACHED_USER', False):
+            return super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+class ServerTimingMiddleware:
+    """
+    Time each request and report it in a ``Server-Timing`` header.
+
+    Records SQL query count and time (through a database execute wrapper
+    installed on every connection), view time, response render time (DRF
+    renderers and TemplateResponse) and template render time. Requests
+    slower than SLOW_REQUEST_MS are written as one JSON line to the
+    ``activities.slow_requests`` logger when SLOW_REQUEST_LOG is set, and
+    every request is recorded in the Prometheus metrics when
+    PROMETHEUS_METRICS is on.
+
+    Should be first in MIDDLEWARE so the total and the SQL count cover
+    the other middleware too. It is removed when both SERVER_TIMING and
+    PROMETHEUS_METRICS are False.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.server_timing = getattr(settings, 'SERVER_TIMING', True)
+        self.prometheus_metrics = getattr(settings, 'PROMETHEUS_METRICS', True)
+        if not (self.server_timing or self.prometheus_metrics):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.log_slow_requests = bool(getattr(settings, 'SLOW_REQUEST_LOG', None))
+        if iscoroutinefunction(get_response):
+            # The handler awaits view and template response middleware in async mode
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.view_started = time.perf_counter()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.__class__.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def process_template_response(self, request, response):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.view_ended = timing.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda response: setattr(timing, 'render_ended', time.perf_counter()))
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        return self.__class__.process_template_response(self, request, response)
+
+    def finish(self, request, response, timing):
+        ended = time.perf_counter()
+        if timing.view_started is not None and timing.view_ended is None:
+            timing.view_ended = ended
+        summary = timing.summary(ended)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing_header(summary)
+        if self.prometheus_metrics:
+            observe_request(request, response, summary)
+        if self.log_slow_requests and summary['total_ms'] >= self.slow_request_ms:
+            resolver_match = getattr(request, 'resolver_match', None)
+            slow_request_logger.info(json.dumps({
+                'time': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.path,
+                'url_name': resolver_match.view_name if resolver_match else None,
+                'status': response.status_code,
+                **summary,
+            }))
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Profile a single request on demand and return the profile instead of
+    the response.
+
+    A staff user, authenticated by session or API token, sends
+    ``X-Profile: 1`` or ``?_profile=1``; the rest of the request runs under
+    cProfile (including a streaming response's generator) and the reply is
+    a plain-text summary of the hottest functions, see profile_report().
+    Any other request only pays for a header and query string lookup. Must
+    come after the authentication middleware. Set REQUEST_PROFILING to
+    False to remove it.
+
+    Under ASGI only the event loop thread is profiled, so work an async
+    view hands to worker threads shows up as waiting.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not profiling_requested(request) or staff_user(request) is None:
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+            content_length = consume(response)
+        finally:
+            profiler.disable()
+        return profile_report(
+            request, response, profiler, time.perf_counter() - started, content_length, current_timing.get()
+        )
+
+    async def __acall__(self, request):
+        if not profiling_requested(request) or await sync_to_async(staff_user)(request) is None:
+            return await self.get_response(request)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+            content_length = await sync_to_async(consume)(response) if response.streaming else consume(response)
+        finally:
+            profiler.disable()
+        return await sync_to_async(profile_report)(
+            request, response, profiler, time.perf_counter() - started, content_length, current_timing.get()
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let PrimaryReplicaRouter send this request's reads to the replicas.
+
+    Reads outside a request stay on the primary. Should come right after
+    ServerTimingMiddleware so the other middleware's reads are routed too.
+    It is removed when DATABASE_REPLICAS is empty.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_routing.set(ReadRouting(request))
+        try:
+            return self.get_response(request)
+        finally:
+            current_routing.reset(token)
+
+    async def __acall__(self, request):
+        token = current_routing.set(ReadRouting(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            current_routing.reset(token)
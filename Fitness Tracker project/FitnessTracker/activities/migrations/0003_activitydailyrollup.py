@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Activity = apps.get_model('activities', 'Activity')
+    ActivityDailyRollup = apps.get_model('activities', 'ActivityDailyRollup')
+    db_alias = schema_editor.connection.alias
+    rows = Activity.objects.using(db_alias).order_by().annotate(day=TruncDate('date')).values(
+        'user_id', 'day', 'activity_type'
+    ).annotate(
+        total_duration=Sum('duration'),
+        total_distance=Sum('distance'),
+        total_calories_burned=Sum('calories_burned'),
+        activity_count=Count('id'),
+    )
+    ActivityDailyRollup.objects.using(db_alias).bulk_create(
+        [ActivityDailyRollup(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0002_activity_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(choices=[('running', 'Running'), ('cycling', 'Cycling'), ('weightlifting', 'Weightlifting'), ('swimming', 'Swimming'), ('walking', 'Walking'), ('yoga', 'Yoga'), ('other', 'Other')], max_length=20)),
+                ('total_duration', models.BigIntegerField(default=0)),
+                ('total_distance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_calories_burned', models.BigIntegerField(default=0)),
+                ('activity_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='activitydailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'activity_type'), name='unique_daily_rollup'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
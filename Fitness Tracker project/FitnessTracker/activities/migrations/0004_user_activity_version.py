@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_activitydailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='activities_modified_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='activity_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from activities.sharding import is_shard
+
+
+class AlterFieldOutsideShards(migrations.AlterField):
+    """
+    AlterField that leaves the databases in ACTIVITY_SHARDS (other than the
+    primary) alone: their users table is empty, so the user columns there
+    keep no foreign key constraint.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_shard(schema_editor.connection.alias):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not is_shard(schema_editor.connection.alias):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0005_activity_sharding'),
+    ]
+
+    operations = [
+        AlterFieldOutsideShards(
+            model_name='activity',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL),
+        ),
+        AlterFieldOutsideShards(
+            model_name='activitydailyrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,19 +1,178 @@
-from django.db import models
+from django.db import models, router, transaction, IntegrityError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from .sharding import ShardedQuerySetMixin, assign_activity_ids, group_by_shard, is_shard, shard_aliases
+
+
+def day_start(day):
+    """Return the aware datetime at which ``day`` begins in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def activity_day(value):
+    """Return the calendar day an activity timestamp falls on (matches ``TruncDate``)"""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localdate(value)
+
+
+def bump_activity_version(user_ids, using=None):
+    """
+    Record that the activities of ``user_ids`` changed.
+
+    Increments User.activity_version and stamps activities_modified_at, which
+    conditional GETs on the activity APIs are keyed on. Call it inside the
+    transaction that writes the activities.
+    """
+    from .authentication import invalidate_cached_user
+
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids and is_shard(using):
+        # Users live on the primary: bump them once the shard commits, so no
+        # reader can cache the old rows under the new version
+        transaction.on_commit(lambda: bump_activity_version(user_ids), using=using)
+    elif user_ids:
+        User.objects.db_manager(using).filter(pk__in=user_ids).update(
+            activity_version=F('activity_version') + 1,
+            activities_modified_at=timezone.now(),
+        )
+        # Cached authentication must not keep serving the old version
+        for user_id in user_ids:
+            invalidate_cached_user(user_id, using)
+
+
+class ActivityQuerySet(ShardedQuerySetMixin, models.QuerySet):
+    """QuerySet with index-friendly helpers for Activity"""
+
+    def in_date_range(self, start_date=None, end_date=None):
+        """
+        Filter to activities on or between two calendar days (inclusive).
+
+        Uses a half-open range on the raw ``date`` column instead of a
+        ``date__date`` lookup, so the (user, date) indexes stay usable.
+        """
+        queryset = self
+        if start_date:
+            queryset = queryset.filter(date__gte=day_start(start_date))
+        if end_date:
+            queryset = queryset.filter(date__lt=day_start(end_date + timedelta(days=1)))
+        return queryset
+
+    def rollup_deltas(self, sign=1):
+        """Daily rollup deltas for every activity in this queryset (one grouped query)"""
+        rows = self.order_by().annotate(day=TruncDate('date')).values(
+            'user_id', 'day', 'activity_type'
+        ).annotate(
+            duration=Sum('duration'),
+            distance=Sum('distance'),
+            calories=Sum('calories_burned'),
+            count=Count('id'),
+        )
+        deltas = RollupDeltas()
+        for row in rows:
+            deltas.add(
+                (row['user_id'], row['day'], row['activity_type']),
+                row['duration'], row['distance'], row['calories'], row['count'], sign
+            )
+        return deltas
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        assign_activity_ids(objs)
+        if self._db is None and shard_aliases():
+            for alias, shard_objs in group_by_shard(objs).items():
+                self.using(alias).bulk_create(shard_objs, *args, **kwargs)
+            return objs
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            created = super().bulk_create(objs, *args, **kwargs)
+            deltas = RollupDeltas().add_activities(created)
+            ActivityDailyRollup.objects.db_manager(using).apply_deltas(deltas)
+            bump_activity_version(deltas.user_ids(), using)
+        for activity in created:
+            activity._rollup_state = activity.rollup_snapshot()
+        return created
+
+    def update(self, **kwargs):
+        using = self._db or router.db_for_write(self.model, **self._hints)
+        if not {name.removesuffix('_id') for name in kwargs} & set(Activity.ROLLUP_FIELDS):
+            with transaction.atomic(using=using):
+                user_ids = set(self.using(using).order_by().values_list('user_id', flat=True).distinct())
+                updated = super().update(**kwargs)
+                bump_activity_version(user_ids, using)
+            return updated
+        with transaction.atomic(using=using):
+            # Pin the rows first: the update may move them out of this queryset's filters
+            rows = self.model.objects.using(using).filter(pk__in=list(self.values_list('pk', flat=True)))
+            deltas = rows.rollup_deltas(sign=-1)
+            updated = super().update(**kwargs)
+            for key, totals in rows.rollup_deltas().items():
+                deltas.add(key, *totals)
+            ActivityDailyRollup.objects.db_manager(using).apply_deltas(deltas)
+            bump_activity_version(deltas.user_ids(), using)
+        return updated
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        # Rollups are maintained by update(), which bulk_update() runs per batch
+        objs = list(objs)
+        if self._db is None and shard_aliases():
+            return sum(
+                self.using(alias).bulk_update(shard_objs, fields, *args, **kwargs)
+                for alias, shard_objs in group_by_shard(objs).items()
+            )
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        for obj in objs:
+            obj._rollup_state = None
+        return updated
+
+    def delete(self):
+        using = self._db or router.db_for_write(self.model, **self._hints)
+        with transaction.atomic(using=using):
+            deltas = self.using(using).rollup_deltas(sign=-1)
+            result = super().delete()
+            ActivityDailyRollup.objects.db_manager(using).apply_deltas(deltas)
+            bump_activity_version(deltas.user_ids(), using)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class User(AbstractUser):
     """Custom User model with additional fields"""
     email = models.EmailField(unique=True)
-    
+    # Bumped whenever any of the user's activities change (see bump_activity_version)
+    activity_version = models.PositiveBigIntegerField(default=0, editable=False)
+    activities_modified_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        from rest_framework.authtoken.models import Token
+        from .authentication import invalidate_cached_user
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # set_password() leaves the raw password in _password until saved
+        password_changed = self._password is not None and not self._state.adding
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if password_changed:
+                # Force API clients to log in again with the new password
+                Token.objects.using(using).filter(user=self).delete()
+        invalidate_cached_user(self.pk, using)
+
 
 class Activity(models.Model):
     """Model for fitness activities"""
@@ -26,7 +185,10 @@ class Activity(models.Model):
         ('yoga', 'Yoga'),
         ('other', 'Other'),
     ]
-    
+    # Fields whose values feed ActivityDailyRollup
+    ROLLUP_FIELDS = ('user', 'date', 'activity_type', 'duration', 'distance', 'calories_burned')
+
+    # Shard databases keep no constraint on it, as the users stay on the primary (see migration 0006)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPES)
     duration = models.IntegerField(
@@ -34,8 +196,8 @@ class Activity(models.Model):
         help_text="Duration in minutes"
     )
     distance = models.DecimalField(
-        max_digits=6, 
-        decimal_places=2, 
+        max_digits=6,
+        decimal_places=2,
         validators=[MinValueValidator(0)],
         help_text="Distance in km or miles"
     )
@@ -47,13 +209,19 @@ class Activity(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ActivityQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
         verbose_name_plural = "Activities"
+        indexes = [
+            models.Index(fields=['user', '-date'], name='activity_user_date_idx'),
+            models.Index(fields=['user', 'activity_type', '-date'], name='activity_user_type_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.activity_type} on {self.date.strftime('%Y-%m-%d')}"
-    
+
     def clean(self):
         from django.core.exceptions import ValidationError
         if self.duration and (self.duration < 1 or self.duration > 1440):
@@ -61,4 +229,227 @@ class Activity(models.Model):
         if self.distance and self.distance < 0:
             raise ValidationError('Distance cannot be negative.')
         if self.calories_burned and self.calories_burned < 0:
-            raise ValidationError('Calories burned cannot be negative.')
\ No newline at end of file
+            raise ValidationError('Calories burned cannot be negative.')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the rollups currently hold for this row, unless some
+        # of the fields were deferred (reading them would cost a query each)
+        if not set(cls.ROLLUP_FIELDS) & instance.get_deferred_fields():
+            instance._rollup_state = instance.rollup_snapshot()
+        return instance
+
+    def rollup_snapshot(self):
+        """The (key, totals) this activity contributes to ActivityDailyRollup"""
+        opts = self._meta
+        date = opts.get_field('date').to_python(self.date)
+        distance = opts.get_field('distance').to_python(self.distance)
+        return (
+            (self.user_id, activity_day(date), self.activity_type),
+            (int(self.duration), distance.quantize(Decimal('0.01')), int(self.calories_burned)),
+        )
+
+    def _stored_rollup_snapshot(self, using):
+        row = Activity.objects.using(using).filter(pk=self.pk).values(
+            'user_id', 'date', 'activity_type', 'duration', 'distance', 'calories_burned'
+        ).first()
+        if row is None:
+            return None
+        return Activity(**row).rollup_snapshot()
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.pk is None and shard_aliases():
+            assign_activity_ids([self])
+            # The id is new, so there is no row to try an UPDATE on first
+            if not args and kwargs.get('update_fields') is None:
+                kwargs['force_insert'] = True
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {
+            name for name in update_fields if name.removesuffix('_id') in self.ROLLUP_FIELDS
+        }:
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                bump_activity_version([self.user_id], using)
+            return
+
+        with transaction.atomic(using=using):
+            previous = getattr(self, '_rollup_state', None)
+            if previous is None and not self._state.adding and self.pk is not None:
+                previous = self._stored_rollup_snapshot(using)
+            super().save(*args, **kwargs)
+            current = self.rollup_snapshot()
+            if update_fields is not None and previous is not None:
+                # Only the listed fields reached the database
+                current = self._stored_rollup_snapshot(using)
+
+            deltas = RollupDeltas()
+            if previous is not None:
+                deltas.add_snapshot(previous, sign=-1)
+            deltas.add_snapshot(current)
+            ActivityDailyRollup.objects.db_manager(using).apply_deltas(deltas)
+            bump_activity_version([self.user_id, previous and previous[0][0]], using)
+        self._rollup_state = current
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            previous = getattr(self, '_rollup_state', None) or self._stored_rollup_snapshot(using)
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                deltas = RollupDeltas()
+                deltas.add_snapshot(previous, sign=-1)
+                ActivityDailyRollup.objects.db_manager(using).apply_deltas(deltas)
+            bump_activity_version([self.user_id, previous and previous[0][0]], using)
+        self._rollup_state = None
+        return result
+
+
+class RollupDeltas(defaultdict):
+    """Accumulates per-(user_id, day, activity_type) changes to the daily rollups"""
+
+    def __init__(self):
+        super().__init__(lambda: [0, Decimal('0.00'), 0, 0])
+
+    def add(self, key, duration, distance, calories, count, sign=1):
+        totals = self[key]
+        totals[0] += sign * (duration or 0)
+        totals[1] += sign * (distance or 0)
+        totals[2] += sign * (calories or 0)
+        totals[3] += sign * count
+
+    def add_snapshot(self, snapshot, sign=1):
+        key, (duration, distance, calories) = snapshot
+        self.add(key, duration, distance, calories, 1, sign)
+
+    def add_activities(self, activities, sign=1):
+        for activity in activities:
+            self.add_snapshot(activity.rollup_snapshot(), sign)
+        return self
+
+    def user_ids(self):
+        return {user_id for user_id, _, _ in self}
+
+
+class ActivityDailyRollupQuerySet(ShardedQuerySetMixin, models.QuerySet):
+    """Reads and incremental maintenance for ActivityDailyRollup"""
+
+    def in_date_range(self, start_date=None, end_date=None):
+        queryset = self
+        if start_date:
+            queryset = queryset.filter(day__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(day__lte=end_date)
+        return queryset
+
+    def totals(self):
+        """Summed totals over the selected rollup rows, with zeros instead of None"""
+        totals = self.aggregate(
+            total_duration=Sum('total_duration'),
+            total_distance=Sum('total_distance'),
+            total_calories_burned=Sum('total_calories_burned'),
+            activity_count=Sum('activity_count'),
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+    def distribution(self):
+        """Activity count per type, most frequent first"""
+        return self.order_by().values('activity_type').annotate(
+            count=Sum('activity_count')
+        ).order_by('-count')
+
+    def apply_deltas(self, deltas):
+        """
+        Apply accumulated RollupDeltas with one UPDATE per touched row.
+
+        Rows are only ever created for positive counts, and rows that drop
+        to zero activities are removed.
+        """
+        for (user_id, day, activity_type), (duration, distance, calories, count) in deltas.items():
+            if not (duration or distance or calories or count):
+                continue
+            rows = self.filter(user_id=user_id, day=day, activity_type=activity_type)
+            increments = {
+                'total_duration': F('total_duration') + duration,
+                'total_distance': F('total_distance') + distance,
+                'total_calories_burned': F('total_calories_burned') + calories,
+                'activity_count': F('activity_count') + count,
+            }
+            if rows.update(**increments):
+                if count < 0:
+                    rows.filter(activity_count__lte=0).delete()
+                continue
+            if count <= 0:
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(
+                        user_id=user_id, day=day, activity_type=activity_type,
+                        total_duration=duration, total_distance=distance,
+                        total_calories_burned=calories, activity_count=count,
+                    )
+            except IntegrityError:
+                # A concurrent transaction created the row first
+                rows.update(**increments)
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """Recompute rollups from the Activity table in bulk; returns the row count"""
+        activities = Activity.objects.using(self.db)
+        rollups = self
+        if user_ids is not None:
+            activities = activities.filter(user_id__in=user_ids)
+            rollups = rollups.filter(user_id__in=user_ids)
+
+        rows = activities.order_by().annotate(day=TruncDate('date')).values(
+            'user_id', 'day', 'activity_type'
+        ).annotate(
+            total_duration=Sum('duration'),
+            total_distance=Sum('distance'),
+            total_calories_burned=Sum('calories_burned'),
+            activity_count=Count('id'),
+        )
+
+        created = 0
+        with transaction.atomic(using=self.db):
+            rollups.delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(ActivityDailyRollup(**row))
+                if len(batch) >= batch_size:
+                    created += len(self.bulk_create(batch))
+                    batch = []
+            if batch:
+                created += len(self.bulk_create(batch))
+        return created
+
+
+class ActivityDailyRollup(models.Model):
+    """Per-user daily totals for each activity type, kept in step with Activity"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    activity_type = models.CharField(max_length=20, choices=Activity.ACTIVITY_TYPES)
+    total_duration = models.BigIntegerField(default=0)
+    total_distance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_calories_burned = models.BigIntegerField(default=0)
+    activity_count = models.IntegerField(default=0)
+
+    objects = ActivityDailyRollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'activity_type'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.activity_type} on {self.day}"
+
+
+class IdSequence(models.Model):
+    """Next unreserved id of a table whose rows are spread over shards (see sharding.IdBlocks)"""
+    name = models.CharField(max_length=100, primary_key=True)
+    next_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.next_id}"
@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from django.db.backends.base.base import NO_DB_ALIAS
+from .timing import current_timing
+
+POOL_DEFAULTS = {'max_size': 10, 'timeout': 10.0}
+POOL_EVENTS = ('created', 'reused', 'expired', 'check_failures', 'waits', 'timeouts')
+
+# {alias: ConnectionPool} of this process; see pool_for()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def ping(connection):
+    """Whether a raw DB-API connection still answers a query"""
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of raw DB-API connections to one database,
+    shared by the threads of one process.
+
+    Idle connections are handed out newest first, so under light load the
+    same few stay warm and the rest age out. A connection older than
+    ``max_age`` seconds is closed instead of reused, and with
+    ``check=True`` an idle connection has to answer a ping before it is
+    handed out. When ``max_size`` connections are open and none is idle,
+    acquire() waits up to ``timeout`` seconds for one to come back.
+    """
+
+    def __init__(self, name, max_size=10, timeout=10.0, max_age=None, check=True):
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check = check
+        self.idle = deque()
+        # id(connection) -> when it was opened, for every connection this pool owns
+        self.opened = {}
+        # Connections being opened, counted against max_size
+        self.connecting = 0
+        self.condition = threading.Condition()
+        self.events = Counter()
+        self.wait_seconds = 0.0
+
+    @property
+    def size(self):
+        return len(self.opened) + self.connecting
+
+    def expired(self, connection):
+        return self.max_age is not None and time.monotonic() - self.opened[id(connection)] >= self.max_age
+
+    def forget(self, connection):
+        """Stop counting ``connection``; the caller closes it. Call with the condition held."""
+        del self.opened[id(connection)]
+        self.condition.notify()
+
+    def acquire(self, connect):
+        """
+        (connection, reused): a connection from the pool, or a new one from
+        ``connect()`` if there is room
+        """
+        started = time.monotonic()
+        waited = False
+        while True:
+            stale = []
+            connection = None
+            with self.condition:
+                while True:
+                    while self.idle:
+                        connection = self.idle.pop()
+                        if not self.expired(connection):
+                            break
+                        self.events['expired'] += 1
+                        self.forget(connection)
+                        stale.append(connection)
+                        connection = None
+                    if connection is not None or self.size < self.max_size:
+                        break
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.events['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection to {self.name} came free within {self.timeout}s '
+                            f'({self.max_size} in use)'
+                        )
+                    if not waited:
+                        self.events['waits'] += 1
+                        waited = True
+                    self.condition.wait(remaining)
+                if connection is None:
+                    self.connecting += 1
+                if waited:
+                    self.wait_seconds += time.monotonic() - started
+            for old in stale:
+                close_quietly(old)
+
+            if connection is None:
+                return self.open(connect), False
+            if self.check and not ping(connection):
+                with self.condition:
+                    self.events['check_failures'] += 1
+                    self.forget(connection)
+                close_quietly(connection)
+                continue
+            with self.condition:
+                self.events['reused'] += 1
+            return connection, True
+
+    def open(self, connect):
+        try:
+            connection = connect()
+        except BaseException:
+            with self.condition:
+                self.connecting -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.connecting -= 1
+            self.opened[id(connection)] = time.monotonic()
+            self.events['created'] += 1
+        return connection
+
+    def release(self, connection):
+        """Hand ``connection`` back; it is closed instead once it is too old"""
+        with self.condition:
+            if id(connection) not in self.opened:
+                # Opened before this process forked, or already discarded: not ours to close
+                return
+            if not self.expired(connection):
+                self.idle.append(connection)
+                self.condition.notify()
+                return
+            self.events['expired'] += 1
+            self.forget(connection)
+        close_quietly(connection)
+
+    def discard(self, connection):
+        """Close a connection that is no longer usable"""
+        with self.condition:
+            if id(connection) not in self.opened:
+                return
+            self.forget(connection)
+        close_quietly(connection)
+
+    def close(self):
+        """Close every idle connection; connections in use are closed or pooled when they come back"""
+        with self.condition:
+            idle = list(self.idle)
+            self.idle.clear()
+            for connection in idle:
+                self.forget(connection)
+        for connection in idle:
+            close_quietly(connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'open': len(self.opened),
+                'idle': len(self.idle),
+                'in_use': len(self.opened) - len(self.idle),
+                **{event: self.events[event] for event in POOL_EVENTS},
+                'wait_seconds': round(self.wait_seconds, 6),
+            }
+
+
+def pool_for(alias, settings_dict):
+    """
+    The process's pool for a database alias, or None when its OPTIONS have
+    no ``pool``. A pool is replaced when the alias is pointed at another
+    database, as the test runner does.
+    """
+    options = settings_dict['OPTIONS'].get('pool')
+    if not options or alias == NO_DB_ALIAS:
+        return None
+    options = {**POOL_DEFAULTS, **(options if isinstance(options, dict) else {})}
+    name = str(settings_dict['NAME'])
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.name != name:
+            if pool is not None:
+                pool.close()
+            pool = _pools[alias] = ConnectionPool(
+                name, max_size=options['max_size'], timeout=options['timeout'],
+                max_age=settings_dict['CONN_MAX_AGE'], check=settings_dict['CONN_HEALTH_CHECKS'],
+            )
+        return pool
+
+
+def pool_stats():
+    """{alias: stats} for the pools of this process"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in sorted(pools.items())}
+
+
+def close_pools():
+    """Close the idle connections of every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def _forget_pools():
+    # A forked child must not use, or close, the connections of its parent:
+    # both processes would talk over the same sockets
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pools)
+
+
+class PooledConnectionMixin:
+    """
+    Database wrapper mixin for the backends in activities.backends.
+
+    Records the time spent connecting in the current request's timing, and
+    with ``'OPTIONS': {'pool': {'max_size': ..., 'timeout': ...}}`` (or
+    ``True`` for the defaults) takes connections from the process's
+    ConnectionPool instead of opening them. A pooled connection goes back at
+    the end of every request whatever CONN_MAX_AGE is; CONN_MAX_AGE then
+    limits how long the pool keeps it, and CONN_HEALTH_CHECKS makes the pool
+    ping it before lending it out again.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not an argument of the driver's connect()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool(self):
+        return pool_for(self.alias, self.settings_dict)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            timing = current_timing.get()
+            if timing is not None:
+                timing.connects.append(time.perf_counter() - started)
+        if self.pool is not None:
+            # Hand it back to the pool at the end of the request
+            self.close_at = time.monotonic()
+
+    # Whether the current connection came from the pool, already set up by an
+    # earlier connect(); connection_created handlers can skip its setup
+    reused_connection = False
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            self.reused_connection = False
+            return super().get_new_connection(conn_params)
+        try:
+            connection, self.reused_connection = pool.acquire(
+                lambda: super(PooledConnectionMixin, self).get_new_connection(conn_params)
+            )
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection = self.connection
+        try:
+            # Leave no transaction open for the next borrower
+            connection.rollback()
+        except Exception:
+            pool.discard(connection)
+        else:
+            pool.release(connection)
@@ -0,0 +1,78 @@
+import io
+import os
+import pstats
+import time
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions
+from .authentication import CachedTokenAuthentication
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+SORT_PARAM = '_profile_sort'
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls')
+
+
+def profiling_requested(request):
+    """
+    Whether the request asks to be profiled.
+
+    Looks at the raw header and query string first so ordinary requests
+    never parse their query string here.
+    """
+    if request.META.get(PROFILE_HEADER) == '1':
+        return True
+    return f'{PROFILE_PARAM}=' in request.META.get('QUERY_STRING', '') and request.GET.get(PROFILE_PARAM) == '1'
+
+
+def staff_user(request):
+    """The staff user behind the request's session or API token, or None"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            result = CachedTokenAuthentication().authenticate(request)
+        except exceptions.AuthenticationFailed:
+            return None
+        user = result[0] if result else None
+    return user if user is not None and user.is_active and user.is_staff else None
+
+
+def consume(response):
+    """Run a streaming response's generator to completion so its work is profiled"""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def profile_report(request, response, profiler, seconds, content_length, timing=None):
+    """
+    Plain-text report replacing the profiled response.
+
+    Lists the functions with the highest cost by ``?_profile_sort=``
+    (cumulative by default). When PROFILE_DIR is set the raw stats are
+    also saved there for snakeviz or pstats, and the file name is returned
+    in an ``X-Profile-File`` header.
+    """
+    sort = request.GET.get(SORT_PARAM, 'cumulative')
+    if sort not in SORT_KEYS:
+        sort = 'cumulative'
+    resolver_match = getattr(request, 'resolver_match', None)
+    url_name = resolver_match.view_name if resolver_match else 'unresolved'
+
+    out = io.StringIO()
+    out.write(f'{request.method} {request.get_full_path()} ({url_name})\n')
+    out.write(f'status {response.status_code}, {content_length} bytes, {seconds * 1000:.2f} ms')
+    if timing is not None:
+        out.write(f', {len(timing.queries)} queries in {sum(timing.queries) * 1000:.2f} ms')
+    out.write('\n\n')
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(getattr(settings, 'PROFILE_LIMIT', 40))
+
+    report = HttpResponse(out.getvalue(), content_type='text/plain; charset=utf-8')
+    profile_dir = getattr(settings, 'PROFILE_DIR', None)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        filename = f'{url_name.replace(":", "-")}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof'
+        profiler.dump_stats(os.path.join(profile_dir, filename))
+        report['X-Profile-File'] = filename
+    return report
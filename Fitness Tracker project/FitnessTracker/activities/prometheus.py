@@ -0,0 +1,131 @@
+import os
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from .caching import STATS_EVENTS, cache_stats
+from .pooling import POOL_EVENTS, pool_stats
+
+# prometheus_client switches every metric below to files in this directory
+# when it is set, so all gunicorn workers' samples can be summed at scrape time
+MULTIPROCESS_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_LATENCY = Histogram(
+    'fitness_http_request_duration_seconds',
+    'Time spent handling a request, by URL name',
+    ['view', 'method'],
+)
+REQUESTS = Counter(
+    'fitness_http_requests',
+    'Requests handled, by URL name and response status',
+    ['view', 'method', 'status'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'fitness_http_request_db_queries',
+    'SQL queries run per request, by URL name',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, float('inf')),
+)
+REQUEST_DB_CONNECT = Histogram(
+    'fitness_http_request_db_connect_seconds',
+    'Time spent opening database connections or taking them from the pool per request, by URL name',
+    ['view'],
+    buckets=(0, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, float('inf')),
+)
+
+
+def observe_request(request, response, summary):
+    """Record one finished request from its RequestTiming summary"""
+    resolver_match = getattr(request, 'resolver_match', None)
+    # Unmatched paths (404s, static files) share one label to bound cardinality
+    view = resolver_match.view_name if resolver_match else 'unresolved'
+    REQUEST_LATENCY.labels(view, request.method).observe(summary['total_ms'] / 1000)
+    REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+    REQUEST_DB_QUERIES.labels(view).observe(summary['db_queries'])
+    REQUEST_DB_CONNECT.labels(view).observe(summary['db_connect_ms'] / 1000)
+
+
+class ResultCacheCollector:
+    """
+    Exports the activity result cache counters at scrape time.
+
+    The counters are kept in the cache itself (see caching.cache_stats), so
+    with a shared backend they already cover every worker.
+    """
+
+    def collect(self):
+        stats = cache_stats()
+        lookups = CounterMetricFamily(
+            'fitness_result_cache_lookups',
+            'Activity result cache lookups, by endpoint and result',
+            labels=['endpoint', 'result'],
+        )
+        ratio = GaugeMetricFamily(
+            'fitness_result_cache_hit_ratio',
+            'Share of activity result cache lookups that were hits',
+            labels=['endpoint'],
+        )
+        for endpoint, counts in stats['endpoints'].items():
+            for event in STATS_EVENTS:
+                lookups.add_metric([endpoint, event], counts[event])
+            if counts['hit_ratio'] is not None:
+                ratio.add_metric([endpoint], counts['hit_ratio'])
+        yield lookups
+        yield ratio
+
+
+class ConnectionPoolCollector:
+    """
+    Exports the database connection pools of this process at scrape time.
+
+    Pools are per process, so under gunicorn these are the numbers of the
+    worker that answered the scrape.
+    """
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            'fitness_db_pool_connections',
+            'Connections held by the pool, by database alias and state',
+            labels=['database', 'state'],
+        )
+        events = CounterMetricFamily(
+            'fitness_db_pool_events',
+            'Pool checkouts and closes, by database alias and event',
+            labels=['database', 'event'],
+        )
+        wait = CounterMetricFamily(
+            'fitness_db_pool_wait_seconds',
+            'Time requests spent waiting for a free pooled connection, by database alias',
+            labels=['database'],
+        )
+        for alias, stats in pool_stats().items():
+            for state in ('idle', 'in_use'):
+                connections.add_metric([alias, state], stats[state])
+            for event in POOL_EVENTS:
+                events.add_metric([alias, event], stats[event])
+            wait.add_metric([alias], stats['wait_seconds'])
+        yield connections
+        yield events
+        yield wait
+
+
+result_cache_registry = CollectorRegistry()
+result_cache_registry.register(ResultCacheCollector())
+
+connection_pool_registry = CollectorRegistry()
+connection_pool_registry.register(ConnectionPoolCollector())
+
+
+def request_metrics_registry():
+    """This process's registry, or one merging all workers in multiprocess mode"""
+    if MULTIPROCESS_ENV not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    return b''.join(
+        generate_latest(registry)
+        for registry in (request_metrics_registry(), result_cache_registry, connection_pool_registry)
+    )
@@ -0,0 +1,101 @@
+import random
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+# Routing state of the request being handled in the current context, if any
+current_routing = ContextVar('current_routing', default=None)
+
+# Who the user is and when they last wrote is always read from the primary:
+# a lagging replica would hand out stale activity versions, which the
+# conditional GETs and the result cache are keyed on
+PRIMARY_ONLY_APPS = {'admin', 'auth', 'authtoken', 'contenttypes', 'sessions'}
+PRIMARY_ONLY_MODELS = {'activities.user'}
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def wrote_recently(user):
+    """Whether ``user`` changed their activities within REPLICA_STICKY_SECONDS"""
+    # Read from the primary: request.user may come from a cache that a write
+    # made through another worker has not reached
+    modified = (
+        get_user_model()._base_manager.using(DEFAULT_DB_ALIAS)
+        .filter(pk=user.pk).values_list('activities_modified_at', flat=True).first()
+    )
+    if modified is None:
+        return False
+    return modified > timezone.now() - timedelta(seconds=getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+class ReadRouting:
+    """
+    Whether the current request may read from a replica.
+
+    A request is pinned to the primary once it writes anything, and from
+    the start when its user wrote activities in the last
+    REPLICA_STICKY_SECONDS, so a newly added activity always shows up. The
+    user is looked at on the first routed read, after DRF has
+    authenticated the request.
+    """
+
+    __slots__ = ('request', 'pinned')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.pinned = None
+
+    def use_primary(self):
+        if self.pinned is None:
+            user = getattr(self.request, 'user', None)
+            if user is None or not user.is_authenticated:
+                # Not authenticated yet, or anonymous: decide again on the next read
+                return False
+            self.pinned = wrote_recently(user)
+        return self.pinned
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to the DATABASE_REPLICAS aliases and writes to the primary.
+
+    Only reads made while handling a request (see ReplicaRoutingMiddleware)
+    go to a replica, picked at random for each query; management commands,
+    reads inside a transaction on the primary, and reads of the user, token
+    and session tables always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        routing = current_routing.get()
+        if not replicas or routing is None:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_ONLY_APPS or model._meta.label_lower in PRIMARY_ONLY_MODELS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or routing.use_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in replica_aliases():
+            return False
+        return None
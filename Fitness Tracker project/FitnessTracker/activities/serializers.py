@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
+from .exports import format_datetime
 from .models import User, Activity
+from .sharding import shard_aliases
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -60,11 +63,102 @@ class ActivitySerializer(serializers.ModelSerializer):
         return value
 
 
+def parse_activity_fields(value):
+    """
+    Parse a ``?fields=`` value into a tuple of ActivitySerializer field names.
+
+    An empty value selects every field. Unknown names raise ValueError.
+    """
+    all_fields = ActivitySerializer.Meta.fields
+    if not value:
+        return tuple(all_fields)
+    requested = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in all_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(all_fields)}")
+    # Keep the serializer's field order and drop repeats
+    return tuple(name for name in all_fields if name in requested)
+
+
+def activity_value_columns(fields):
+    """
+    Columns to pass to ``values()`` for ``fields``.
+
+    ``id`` and ``date`` are always fetched because cursor pagination needs
+    them, and ``user`` is read as ``user__username`` through the join, or
+    as ``user_id`` when the activities are on a shard without the users.
+    """
+    columns = {'id', 'date', *fields}
+    user_column = 'user_id' if shard_aliases() else 'user__username'
+    return [(user_column if name == 'user' else name) for name in ActivitySerializer.Meta.fields if name in columns]
+
+
+def serialize_activity_values(rows, fields):
+    """
+    Encode ``values()`` rows exactly like ActivitySerializer would.
+
+    This is the read-only fast path: no model instances, no per-field
+    serializer calls, and the username comes from the query rather than one
+    lookup per row.
+    """
+    tz = timezone.get_current_timezone()
+    username = lambda row: row['user__username']
+    if 'user' in fields and shard_aliases():
+        rows = list(rows)
+        usernames = dict(User.objects.filter(pk__in={row['user_id'] for row in rows}).values_list('pk', 'username'))
+        username = lambda row: usernames[row['user_id']]
+    converters = {
+        'user': username,
+        'distance': lambda row: str(row['distance']),
+        'date': lambda row: format_datetime(row['date'], tz),
+        'created_at': lambda row: format_datetime(row['created_at'], tz),
+        'updated_at': lambda row: format_datetime(row['updated_at'], tz),
+    }
+    getters = [(name, converters.get(name, lambda row, name=name: row[name])) for name in fields]
+    return [{name: getter(row) for name, getter in getters} for row in rows]
+
+
+class ActivityBulkCreateSerializer(serializers.ListSerializer):
+    """
+    Validates a list of activities and inserts them with bulk_create.
+
+    Per-item errors are kept in ``item_errors`` (keyed by list index). With
+    ``partial_success`` in the context, invalid items are skipped instead of
+    failing the whole list, and ``valid_indexes`` maps created rows back to
+    their position in the request.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': [f'Expected a list of items but got type "{type(data).__name__}".']
+            })
+
+        self.item_errors = {}
+        self.valid_indexes = []
+        validated = []
+        for index, item in enumerate(data):
+            try:
+                validated.append(self.child.run_validation(item))
+                self.valid_indexes.append(index)
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+
+        if self.item_errors and not self.context.get('partial_success'):
+            raise serializers.ValidationError([self.item_errors.get(index, {}) for index in range(len(data))])
+        return validated
+
+    def create(self, validated_data):
+        activities = [Activity(**attrs) for attrs in validated_data]
+        return Activity.objects.bulk_create(activities, batch_size=self.context.get('batch_size'))
+
+
 class ActivityCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating activities"""
     class Meta:
         model = Activity
         fields = ['activity_type', 'duration', 'distance', 'calories_burned', 'date']
+        list_serializer_class = ActivityBulkCreateSerializer
 
     def create(self, validated_data):
         # The user will be set in the view
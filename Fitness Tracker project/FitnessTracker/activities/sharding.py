@@ -0,0 +1,209 @@
+import hashlib
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max
+
+# Models whose rows live on the shard of their user
+SHARDED_MODELS = {'activities.activity', 'activities.activitydailyrollup'}
+
+# filter()/create() keywords that pin a queryset to a single user
+USER_LOOKUPS = (
+    'user', 'user_id', 'user__pk', 'user__id', 'user__exact', 'user_id__exact', 'user__pk__exact', 'user__id__exact',
+)
+
+ACTIVITY_ID_SEQUENCE = 'activities.activity'
+
+
+def shard_aliases():
+    return getattr(settings, 'ACTIVITY_SHARDS', [])
+
+
+def jump_hash(key, buckets):
+    """
+    Jump consistent hash (Lamping and Veach): a bucket in range(buckets)
+    for the 64-bit ``key``. Going from N to N + 1 buckets only moves
+    1/(N + 1) of the keys, all of them to the new bucket.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for_user(user_id, shards=None):
+    """The database alias holding ``user_id``'s activities and rollups"""
+    shards = shard_aliases() if shards is None else shards
+    key = int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), 'big')
+    return shards[jump_hash(key, len(shards))]
+
+
+def user_id_of(value):
+    """The user id behind a User, a lazy request.user or a raw id; None for anything else"""
+    value = getattr(value, 'pk', value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def scoped_user_id(lookups):
+    """The single user a filter()/create() call is limited to, or None"""
+    for name in USER_LOOKUPS:
+        if name in lookups:
+            return user_id_of(lookups[name])
+    return None
+
+
+def group_by_shard(objs):
+    """{alias: [objs]} for model instances with a ``user_id``, keeping their order"""
+    groups = defaultdict(list)
+    for obj in objs:
+        groups[shard_for_user(obj.user_id)].append(obj)
+    return groups
+
+
+def is_shard(using):
+    """Whether ``using`` is a shard other than the primary, which holds the users"""
+    return using is not None and using != DEFAULT_DB_ALIAS and using in shard_aliases()
+
+
+class ShardedQuerySetMixin:
+    """
+    Route querysets of a sharded model to their user's shard.
+
+    ``filter(user=...)`` and ``create(user=...)`` pick the shard
+    themselves, so the usual per-user queries need no changes. Querysets
+    without a user and without ``using()`` fall through to the routers,
+    which send them to the primary.
+    """
+
+    def _filter_or_exclude(self, negate, args, kwargs):
+        clone = super()._filter_or_exclude(negate, args, kwargs)
+        if not negate and clone._db is None and shard_aliases():
+            user_id = scoped_user_id(kwargs)
+            if user_id is not None:
+                clone._db = shard_for_user(user_id)
+        return clone
+
+    def create(self, **kwargs):
+        if self._db is None and shard_aliases():
+            user_id = scoped_user_id(kwargs)
+            if user_id is not None:
+                return self.using(shard_for_user(user_id)).create(**kwargs)
+        return super().create(**kwargs)
+
+
+class ShardRouter:
+    """
+    Send reads and writes of sharded models to the shard of their user.
+
+    Only instance hints (saves, deletes, related managers) identify the
+    user here; querysets are routed by ShardedQuerySetMixin. Every other
+    decision is left to the next router.
+    """
+
+    def shard_for_hints(self, model, hints):
+        if not shard_aliases() or model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        user_id = instance.pk if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower() else instance.user_id
+        return shard_for_user(user_id) if user_id is not None else None
+
+    def db_for_read(self, model, **hints):
+        return self.shard_for_hints(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard_for_hints(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Activities and rollups point at users on the primary
+        if {obj1._meta.label_lower, obj2._meta.label_lower} & SHARDED_MODELS:
+            databases = {DEFAULT_DB_ALIAS, *shard_aliases()}
+            if obj1._state.db in databases and obj2._state.db in databases:
+                return True
+        return None
+
+
+class IdBlocks:
+    """
+    Globally unique ids for a sharded table, handed out from blocks of
+    ``block_size`` reserved in the primary's IdSequence row.
+
+    Each shard's own auto-increment would repeat the other shards' ids,
+    and rows must keep their id when rebalance_shards moves them. The first
+    block starts above the highest id on any database, so rows written
+    before sharding was enabled keep theirs too.
+    """
+
+    def __init__(self, name, model_label):
+        self.name = name
+        self.model_label = model_label
+        self.next = self.end = 0
+        self.lock = threading.Lock()
+
+    def take(self, count):
+        ids = []
+        with self.lock:
+            while len(ids) < count:
+                if self.next >= self.end:
+                    block_size = max(getattr(settings, 'ACTIVITY_ID_BLOCK_SIZE', 100), count - len(ids))
+                    self.next, self.end = self.reserve(block_size)
+                taken = min(self.end - self.next, count - len(ids))
+                ids.extend(range(self.next, self.next + taken))
+                self.next += taken
+        return ids
+
+    def reserve(self, size):
+        from django.apps import apps
+        from .models import IdSequence
+
+        sequences = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            sequence = sequences.select_for_update().filter(name=self.name).first()
+            if sequence is None:
+                model = apps.get_model(self.model_label)
+                highest = max(
+                    (model._base_manager.using(alias).aggregate(highest=Max('pk'))['highest'] or 0)
+                    for alias in {DEFAULT_DB_ALIAS, *shard_aliases()}
+                )
+                try:
+                    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                        sequences.create(name=self.name, next_id=highest + 1)
+                except IntegrityError:
+                    # Another process created it first
+                    pass
+                sequence = sequences.select_for_update().get(name=self.name)
+            sequences.filter(name=self.name).update(next_id=F('next_id') + size)
+        return sequence.next_id, sequence.next_id + size
+
+    def reset(self):
+        with self.lock:
+            self.next = self.end = 0
+
+
+activity_ids = IdBlocks(ACTIVITY_ID_SEQUENCE, 'activities.Activity')
+
+
+def assign_activity_ids(activities):
+    """Give unsaved activities ids from activity_ids when sharding is on"""
+    if not shard_aliases():
+        return
+    new = [activity for activity in activities if activity.pk is None]
+    for activity, activity_id in zip(new, activity_ids.take(len(new))):
+        activity.pk = activity_id
+
+
+def delete_user_rows(sender, instance, using, **kwargs):
+    """post_delete handler for User: the database cascade cannot reach other shards"""
+    from .models import Activity, ActivityDailyRollup
+
+    for alias in shard_aliases():
+        if alias != using:
+            Activity.objects.using(alias).filter(user_id=instance.pk).delete()
+            ActivityDailyRollup.objects.using(alias).filter(user_id=instance.pk).delete()
@@ -0,0 +1,123 @@
+import os
+import random
+import time
+from django.conf import settings
+from django.db import OperationalError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# Statements a pending transaction runs in autocommit mode; anything else starts it
+READ_STATEMENTS = ('SELECT', 'EXPLAIN')
+
+# Longest sleep between two attempts to take a WriteLock
+LOCK_POLL_INTERVAL = 0.005
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    connection_created handler: apply settings.SQLITE_PRAGMAS to new SQLite
+    connections.
+
+    journal_mode=wal lets readers carry on while a transaction writes,
+    busy_timeout makes a writer wait for the lock instead of failing at once,
+    synchronous=normal only syncs the WAL at checkpoints (safe in WAL mode),
+    and mmap_size and cache_size keep hot pages in memory.
+    """
+    if connection.vendor != 'sqlite' or getattr(connection, 'reused_connection', False):
+        # A connection from the pool (see activities.pooling) keeps its pragmas
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        # Pragmas take no bound parameters; only plain names and numbers are accepted
+        if not (isinstance(value, int) or str(value).isidentifier()):
+            raise ValueError(f'Invalid value for PRAGMA {name}: {value!r}')
+        connection.connection.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def is_read(sql):
+    return sql.lstrip()[:7].upper().startswith(READ_STATEMENTS)
+
+
+def begin(connection, mode):
+    """
+    Start a transaction with ``BEGIN <mode>``, retrying with exponential
+    backoff and jitter while the database is locked.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a transaction never
+    has to upgrade a read lock halfway through, which SQLite fails
+    immediately instead of waiting on busy_timeout. Retrying is safe because
+    nothing has run in the transaction yet.
+    """
+    retries = getattr(settings, 'SQLITE_BEGIN_RETRIES', 0)
+    backoff = getattr(settings, 'SQLITE_BEGIN_BACKOFF', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            connection.cursor().execute(f'BEGIN {mode}')
+            return
+        except OperationalError as e:
+            if attempt == retries or not is_lock_error(e):
+                raise
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+class WriteLock:
+    """
+    An exclusive lock on ``<database>-writelock`` held for the length of a
+    write transaction, so writers from every thread and process queue on it.
+
+    SQLite's busy handler polls for its lock with sleeps of up to 100 ms,
+    which under contention leaves the lock idle while waiters sleep; a
+    waiter here polls every few milliseconds, and like the busy handler
+    gives up with "database is locked" after a timeout. Each connection
+    opens its own file, so threads in one process exclude each other too.
+    The lock goes away when its holder's process dies.
+    """
+
+    def __init__(self, database):
+        self.path = f'{database}-writelock'
+        self.fd = None
+        self.held = False
+
+    @classmethod
+    def for_database(cls, database, in_memory):
+        """A lock for a database file, or None where it cannot be used"""
+        if fcntl is None or in_memory:
+            return None
+        return cls(database)
+
+    def acquire(self, timeout):
+        """Take the lock, waiting up to ``timeout`` seconds for its holder to let go"""
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + timeout
+        interval = LOCK_POLL_INTERVAL / 8
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise OperationalError('database is locked')
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, LOCK_POLL_INTERVAL)
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self.release()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import ActivityDailyRollup
+from .trends import TOTAL_FIELDS, next_bucket
+
+
+def month_starts(months, today=None):
+    """First day of each of the last ``months`` calendar months, oldest first"""
+    start = (today or timezone.localdate()).replace(day=1)
+    starts = [start]
+    for _ in range(months - 1):
+        start = (start - timedelta(days=1)).replace(day=1)
+        starts.append(start)
+    starts.reverse()
+    return starts
+
+
+def _average(total, count, places=1):
+    if not count:
+        return 0
+    return round(Decimal(total) / count, places)
+
+
+def user_stats(user, start_date=None, end_date=None, months=0, distribution=True, today=None):
+    """
+    Summary statistics for one user, read from the daily rollups.
+
+    Returns a dict with ``totals``, per-activity ``averages``, the per-type
+    ``distribution`` (most frequent first) and a ``monthly`` series for the
+    last ``months`` calendar months. Totals, averages and the monthly series
+    come from one conditional-aggregation query; the distribution costs one
+    grouped query and is skipped when ``distribution`` is False.
+    """
+    rollups = ActivityDailyRollup.objects.filter(user=user).in_date_range(start_date, end_date)
+
+    aggregates = {f'all_{field}': Sum(field) for field in TOTAL_FIELDS}
+    starts = month_starts(months, today) if months else []
+    for index, start in enumerate(starts):
+        in_month = Q(day__gte=start, day__lt=next_bucket(start, 'month'))
+        for field in TOTAL_FIELDS:
+            aggregates[f'month{index}_{field}'] = Sum(field, filter=in_month)
+
+    row = rollups.aggregate(**aggregates)
+    totals = {field: row[f'all_{field}'] or 0 for field in TOTAL_FIELDS}
+    count = totals['activity_count']
+
+    stats = {
+        'totals': totals,
+        'averages': {
+            'duration': _average(totals['total_duration'], count),
+            'distance': _average(totals['total_distance'], count, places=2),
+            'calories_burned': _average(totals['total_calories_burned'], count),
+        },
+        'monthly': [
+            {
+                'month': start.strftime('%B %Y'),
+                'month_start': start.strftime('%Y-%m-%d'),
+                **{field: row[f'month{index}_{field}'] or 0 for field in TOTAL_FIELDS},
+            }
+            for index, start in enumerate(starts)
+        ],
+        'distribution': [],
+    }
+    if distribution:
+        stats['distribution'] = list(rollups.distribution())
+    return stats
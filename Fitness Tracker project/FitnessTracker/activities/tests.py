@@ -1,11 +1,42 @@
-from django.test import TestCase
+from django.conf import settings
+from django.test import AsyncClient, Client, LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import OperationalError, connection, connections, transaction
+from django.core.cache import cache
+from django.utils import timezone
+from django.core.management import CommandError, call_command
+from decimal import Decimal
+from io import StringIO
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+import csv
+import json
+import os
+import pstats
+import shutil
+import sqlite3
+import threading
+import time
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
-from .models import Activity
-from datetime import datetime, timedelta
+from .backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+from .caching import cache_stats
+from .models import Activity, ActivityDailyRollup, IdSequence
+from .pooling import ConnectionPool, PoolTimeout, close_pools, pool_stats
+from .routers import PrimaryReplicaRouter, ReadRouting, current_routing
+from .stats import month_starts, user_stats
+from .serializers import ActivitySerializer
+from .sharding import activity_ids, shard_for_user
+from .sqlite import fcntl
+from .timing import RequestTiming, current_timing, parse_server_timing, server_timing_header
+from . import trends
+from .views import ActivityImportView
+from datetime import date, datetime, timedelta
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
+from prometheus_client.parser import text_string_to_metric_families
 
 User = get_user_model()
 
@@ -308,3 +339,2032 @@ class ValidationTest(APITestCase):
         }
         response = self.client.post(self.activities_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'Query plan checks cover SQLite and Postgres only')
+class ActivityQueryPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be sequentially scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_date_range_uses_user_date_index(self):
+        queryset = Activity.objects.filter(user=self.user).in_date_range(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertUsesIndex(queryset, 'activity_user_date_idx')
+
+    def test_type_and_date_range_uses_user_type_date_index(self):
+        queryset = Activity.objects.filter(user=self.user, activity_type='running').in_date_range(
+            date(2025, 1, 1), date(2025, 1, 31)
+        )
+        self.assertUsesIndex(queryset, 'activity_user_type_date_idx')
+
+    def test_in_date_range_is_inclusive_of_end_day(self):
+        Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=30,
+            distance=5.2,
+            calories_burned=320,
+            date=timezone.make_aware(datetime(2025, 1, 31, 23, 30))
+        )
+        queryset = Activity.objects.filter(user=self.user)
+        self.assertEqual(queryset.in_date_range(date(2025, 1, 31), date(2025, 1, 31)).count(), 1)
+        self.assertEqual(queryset.in_date_range(end_date=date(2025, 1, 30)).count(), 0)
+
+
+class ActivityDailyRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.day = timezone.make_aware(datetime(2025, 3, 10, 8, 0))
+
+    def create_activity(self, **overrides):
+        data = {
+            'user': self.user,
+            'activity_type': 'running',
+            'duration': 30,
+            'distance': Decimal('5.20'),
+            'calories_burned': 320,
+            'date': self.day,
+        }
+        data.update(overrides)
+        return Activity.objects.create(**data)
+
+    def rollup_rows(self):
+        return list(ActivityDailyRollup.objects.order_by('day', 'activity_type').values_list(
+            'day', 'activity_type', 'activity_count', 'total_duration', 'total_distance', 'total_calories_burned'
+        ))
+
+    def test_create_adds_to_rollup(self):
+        self.create_activity()
+        self.create_activity(duration=45, distance=Decimal('7.00'), calories_burned=400)
+        self.assertEqual(self.rollup_rows(), [
+            (date(2025, 3, 10), 'running', 2, 75, Decimal('12.20'), 720),
+        ])
+
+    def test_update_moves_between_type_and_day(self):
+        activity = self.create_activity()
+        self.create_activity(duration=20)
+
+        activity = Activity.objects.get(pk=activity.pk)
+        activity.activity_type = 'cycling'
+        activity.date = self.day + timedelta(days=1)
+        activity.duration = 60
+        activity.save()
+
+        self.assertEqual(self.rollup_rows(), [
+            (date(2025, 3, 10), 'running', 1, 20, Decimal('5.20'), 320),
+            (date(2025, 3, 11), 'cycling', 1, 60, Decimal('5.20'), 320),
+        ])
+
+    def test_delete_removes_empty_rollup(self):
+        activity = self.create_activity()
+        other = self.create_activity(activity_type='yoga')
+        activity.delete()
+        self.assertEqual(self.rollup_rows(), [
+            (date(2025, 3, 10), 'yoga', 1, 30, Decimal('5.20'), 320),
+        ])
+        Activity.objects.filter(pk=other.pk).delete()
+        self.assertEqual(self.rollup_rows(), [])
+
+    def test_rebuild_command_matches_incremental_rollups(self):
+        for offset in range(5):
+            self.create_activity(date=self.day + timedelta(days=offset % 2), duration=10 + offset)
+        self.create_activity(activity_type='swimming')
+        expected = self.rollup_rows()
+
+        ActivityDailyRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt 3 daily rollup rows', out.getvalue())
+        self.assertEqual(self.rollup_rows(), expected)
+
+
+class ActivityTrendsAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.trends_url = reverse('activity-trends')
+
+        for day, activity_type, duration in [
+            (date(2025, 1, 6), 'running', 30),
+            (date(2025, 1, 8), 'cycling', 45),
+            (date(2025, 3, 3), 'running', 20),
+        ]:
+            Activity.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                duration=duration,
+                distance=5,
+                calories_burned=300,
+                date=timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            )
+
+    def test_weekly_trends_fill_empty_weeks(self):
+        response = self.client.get(self.trends_url, {'start_date': '2025-01-06', 'end_date': '2025-01-26'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(bucket['period_start'], bucket['total_duration']) for bucket in response.data['trends']],
+            [('2025-01-06', 75), ('2025-01-13', 0), ('2025-01-20', 0)]
+        )
+        self.assertEqual(response.data['weekly_trends'][0]['week_start'], '2025-01-06')
+
+    def test_monthly_trends_grouped_by_type_use_one_query(self):
+        params = {
+            'granularity': 'month',
+            'group_by': 'activity_type',
+            'start_date': '2025-01-01',
+            'end_date': '2025-03-31',
+        }
+        # Token authentication plus the single trends query
+        with self.assertNumQueries(2):
+            response = self.client.get(self.trends_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        buckets = response.data['trends']
+        self.assertEqual([bucket['period_start'] for bucket in buckets], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        self.assertEqual(buckets[0]['activity_types']['cycling']['total_duration'], 45)
+        self.assertEqual(buckets[0]['activity_types']['running']['activity_count'], 1)
+        self.assertEqual(buckets[1]['activity_types']['running']['activity_count'], 0)
+        self.assertEqual(buckets[2]['total_duration'], 20)
+        self.assertNotIn('weekly_trends', response.data)
+
+    def test_invalid_granularity(self):
+        response = self.client.get(self.trends_url, {'granularity': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bucket_count_matches_bucket_starts(self):
+        for granularity in trends.GRANULARITIES:
+            for start, end in [
+                (date(2024, 12, 30), date(2025, 1, 5)), (date(2025, 1, 6), date(2025, 1, 6)),
+                (date(2023, 11, 15), date(2025, 3, 2)), (date(9999, 1, 1), date(9999, 12, 31)),
+            ]:
+                self.assertEqual(
+                    trends.bucket_count(start, end, granularity), len(trends.bucket_starts(start, end, granularity))
+                )
+
+    def test_wide_ranges_are_rejected_without_building_buckets(self):
+        with patch('activities.trends.bucket_starts', side_effect=AssertionError) as bucket_starts:
+            response = self.client.get(
+                self.trends_url, {'granularity': 'day', 'start_date': '0001-01-01', 'end_date': '9999-12-31'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        bucket_starts.assert_not_called()
+
+    def test_ranges_at_the_ends_of_the_calendar(self):
+        for granularity in trends.GRANULARITIES:
+            response = self.client.get(
+                self.trends_url, {'granularity': granularity, 'start_date': '9999-12-01', 'end_date': '9999-12-31'}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['trends'][-1]['total_duration'], 0)
+        response = self.client.get(self.trends_url, {'end_date': '0001-01-31'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class UserStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def add_history(self, days, start=date(2024, 11, 15)):
+        for offset in range(days):
+            Activity.objects.create(
+                user=self.user,
+                activity_type=['running', 'cycling', 'yoga'][offset % 3],
+                duration=30,
+                distance=Decimal('5.00'),
+                calories_burned=300,
+                date=timezone.make_aware(datetime.combine(start + timedelta(days=offset), datetime.min.time()))
+            )
+
+    def test_month_starts_are_calendar_months(self):
+        self.assertEqual(month_starts(6, today=date(2025, 3, 31)), [
+            date(2024, 10, 1), date(2024, 11, 1), date(2024, 12, 1),
+            date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1),
+        ])
+
+    def test_user_stats_totals_averages_and_months(self):
+        self.add_history(60)
+        with self.assertNumQueries(2):
+            summary = user_stats(self.user, months=3, today=date(2025, 1, 10))
+        self.assertEqual(summary['totals']['activity_count'], 60)
+        self.assertEqual(summary['totals']['total_duration'], 1800)
+        self.assertEqual(summary['averages']['duration'], Decimal('30.0'))
+        self.assertEqual(summary['averages']['distance'], Decimal('5.00'))
+        self.assertEqual(
+            [(month['month'], month['activity_count']) for month in summary['monthly']],
+            [('November 2024', 16), ('December 2024', 31), ('January 2025', 13)]
+        )
+        self.assertEqual({item['activity_type'] for item in summary['distribution']}, {'running', 'cycling', 'yoga'})
+
+    def assertPageQueriesIndependentOfHistory(self, fetch, expected_queries):
+        for days, start in [(3, date(2024, 11, 15)), (90, date(2023, 1, 1))]:
+            self.add_history(days, start=start)
+            with self.assertNumQueries(expected_queries):
+                self.assertEqual(fetch().status_code, 200)
+
+    def test_dashboard_query_count(self):
+        self.client.force_login(self.user)
+        # Session, user, stats aggregate, distribution, recent activities
+        self.assertPageQueriesIndependentOfHistory(lambda: self.client.get(reverse('dashboard')), 5)
+
+    def test_profile_query_count(self):
+        self.client.force_login(self.user)
+        # Session, user, stats aggregate, distribution
+        self.assertPageQueriesIndependentOfHistory(lambda: self.client.get(reverse('profile')), 4)
+
+    def test_metrics_query_count(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Token authentication, stats aggregate
+        self.assertPageQueriesIndependentOfHistory(
+            lambda: client.get(reverse('activity-metrics'), {'start_date': '2020-01-01'}), 2
+        )
+
+
+class ActivityCursorPaginationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.activities_url = reverse('activity-list-create')
+
+        # Pairs of activities share a timestamp so the id tie-breaker matters
+        base = timezone.make_aware(datetime(2025, 1, 1, 8, 0))
+        self.activities = [
+            Activity.objects.create(
+                user=self.user,
+                activity_type='running',
+                duration=30,
+                distance=5,
+                calories_burned=300,
+                date=base + timedelta(days=index // 2)
+            )
+            for index in range(7)
+        ]
+        self.expected_ids = [
+            activity.id for activity in sorted(self.activities, key=lambda a: (a.date, a.id), reverse=True)
+        ]
+
+    def walk(self, url, params=None):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+            pages += 1
+        return ids, pages
+
+    def test_cursor_walk_returns_every_row_once(self):
+        ids, pages = self.walk(self.activities_url, {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_page_has_no_count_query_unless_requested(self):
+        params = {'pagination': 'cursor', 'page_size': 3}
+        # Token authentication plus the page query
+        with self.assertNumQueries(2):
+            response = self.client.get(self.activities_url, params)
+        self.assertNotIn('count', response.data)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], self.expected_ids[3:6])
+
+        response = self.client.get(self.activities_url, {**params, 'include_total': 'true'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_previous_link_returns_earlier_page(self):
+        first = self.client.get(self.activities_url, {'pagination': 'cursor', 'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+
+    def test_history_supports_cursor_pagination(self):
+        ids, _ = self.walk(reverse('activity-history'), {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(ids, self.expected_ids)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.activities_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get(self.activities_url, {'page_size': 5})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class ActivityBulkCreateAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.bulk_url = reverse('activity-bulk')
+
+    def item(self, **overrides):
+        data = {
+            'activity_type': 'running',
+            'duration': 30,
+            'distance': 5.2,
+            'calories_burned': 320,
+            'date': '2025-02-01T08:00:00Z'
+        }
+        data.update(overrides)
+        return data
+
+    def test_bulk_create_all_items(self):
+        items = [self.item(duration=10 + index) for index in range(5)]
+        response = self.client.post(f'{self.bulk_url}?batch_size=2', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual([result['index'] for result in response.data['results']], [0, 1, 2, 3, 4])
+        self.assertEqual(Activity.objects.filter(user=self.user).count(), 5)
+
+        rollup = ActivityDailyRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.activity_count, rollup.total_duration), (5, 60))
+
+    def test_atomic_mode_rejects_whole_list(self):
+        items = [self.item(), self.item(duration=-5), self.item(activity_type='invalid_type')]
+        response = self.client.post(self.bulk_url, {'activities': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['index'] for result in response.data['results']], [1, 2])
+        self.assertIn('activity_type', response.data['results'][1]['errors'])
+        self.assertEqual(Activity.objects.count(), 0)
+
+    def test_partial_mode_saves_valid_items(self):
+        items = [self.item(), self.item(distance=-1), self.item(activity_type='yoga')]
+        response = self.client.post(self.bulk_url, {'activities': items, 'mode': 'partial'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertIn('distance', response.data['results'][1]['errors'])
+        self.assertEqual(
+            sorted(Activity.objects.values_list('activity_type', flat=True)),
+            ['running', 'yoga']
+        )
+
+    def test_rejects_non_list_and_oversized_payloads(self):
+        response = self.client.post(self.bulk_url, self.item(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.bulk_url, [self.item()] * 1001, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityBulkUpdateDeleteAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            email='other@example.com',
+            password='otherpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.bulk_url = reverse('activity-bulk')
+
+        self.activities = [
+            self.create_activity(self.user, 'running', date(2025, 1, day)) for day in (1, 2, 3)
+        ]
+        self.other_activity = self.create_activity(self.other_user, 'running', date(2025, 1, 1))
+
+    def create_activity(self, user, activity_type, day):
+        return Activity.objects.create(
+            user=user,
+            activity_type=activity_type,
+            duration=30,
+            distance=5,
+            calories_burned=300,
+            date=timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        )
+
+    def test_update_by_ids_enforces_ownership(self):
+        ids = [self.activities[0].id, self.other_activity.id]
+        response = self.client.patch(
+            self.bulk_url, {'ids': ids, 'changes': {'activity_type': 'cycling'}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 1, 'ids': [self.activities[0].id]})
+        self.other_activity.refresh_from_db()
+        self.assertEqual(self.other_activity.activity_type, 'running')
+        self.assertEqual(
+            ActivityDailyRollup.objects.get(user=self.user, day=date(2025, 1, 1)).activity_type, 'cycling'
+        )
+
+    def test_update_by_filters(self):
+        response = self.client.patch(
+            self.bulk_url,
+            {'filters': {'start_date': '2025-01-02'}, 'changes': {'duration': 45}},
+            format='json'
+        )
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(
+            sorted(Activity.objects.filter(user=self.user).values_list('duration', flat=True)), [30, 45, 45]
+        )
+        self.assertEqual(ActivityDailyRollup.objects.filter(user=self.user).totals()['total_duration'], 120)
+
+    def test_update_items_with_bulk_update(self):
+        items = [
+            {'id': self.activities[0].id, 'duration': 50},
+            {'id': self.activities[1].id, 'date': '2025-01-03T12:00:00Z'},
+            {'id': self.other_activity.id, 'duration': 10},
+        ]
+        response = self.client.patch(self.bulk_url, {'activities': items, 'mode': 'partial'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        self.assertEqual(
+            ActivityDailyRollup.objects.get(user=self.user, day=date(2025, 1, 3)).activity_count, 2
+        )
+        self.assertFalse(ActivityDailyRollup.objects.filter(user=self.user, day=date(2025, 1, 2)).exists())
+
+        response = self.client.patch(self.bulk_url, {'activities': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_items_rejects_ids_that_are_not_integers(self):
+        first = Activity.objects.order_by('pk').first()
+        items = [
+            {'id': [self.activities[0].id], 'duration': 11},
+            {'id': {'pk': self.activities[0].id}, 'duration': 12},
+            {'id': True, 'duration': 13},
+            {'id': self.activities[1].id, 'duration': 14},
+        ]
+        response = self.client.patch(self.bulk_url, {'activities': items, 'mode': 'partial'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['ids'], [self.activities[1].id])
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 2])
+        self.assertTrue(all('id' in error['errors'] for error in response.data['errors']))
+        first.refresh_from_db()
+        self.assertEqual(first.duration, 30)
+
+        response = self.client.patch(self.bulk_url, {'activities': items[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['failed'], 3)
+
+    def test_delete_by_ids_and_filters(self):
+        response = self.client.delete(
+            self.bulk_url, {'ids': [self.activities[0].id, self.other_activity.id]}, format='json'
+        )
+        self.assertEqual(response.data, {'deleted': 1, 'ids': [self.activities[0].id]})
+        self.assertTrue(Activity.objects.filter(pk=self.other_activity.pk).exists())
+
+        response = self.client.delete(f'{self.bulk_url}?end_date=2025-01-02')
+        self.assertEqual(response.data['ids'], [self.activities[1].id])
+        self.assertEqual(list(Activity.objects.filter(user=self.user)), [self.activities[2]])
+        self.assertEqual(ActivityDailyRollup.objects.filter(user=self.user).count(), 1)
+
+    def test_delete_requires_a_selection(self):
+        response = self.client.delete(self.bulk_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(f'{self.bulk_url}?activity_type=invalid_type')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Activity.objects.count(), 4)
+
+
+class ActivityExportAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.export_url = reverse('activity-export')
+        for day, activity_type in [(1, 'running'), (2, 'cycling'), (3, 'yoga')]:
+            Activity.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                duration=30,
+                distance=Decimal('5.20'),
+                calories_burned=320,
+                date=timezone.make_aware(datetime(2025, 1, day, 8, 0))
+            )
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export(self):
+        response = self.client.get(self.export_url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.content(response))))
+        self.assertEqual([row['activity_type'] for row in rows], ['yoga', 'cycling', 'running'])
+        self.assertEqual(rows[0]['distance'], '5.20')
+        self.assertEqual(rows[0]['date'], '2025-01-03T08:00:00Z')
+
+    def test_ndjson_export_matches_api_schema_and_filters(self):
+        response = self.client.get(self.export_url, {'format': 'ndjson', 'activity_type': 'cycling'})
+        lines = self.content(response).splitlines()
+        self.assertEqual(len(lines), 1)
+        exported = json.loads(lines[0])
+        detail = self.client.get(reverse('activity-detail', kwargs={'pk': exported['id']})).data
+        for field, value in exported.items():
+            self.assertEqual(value, detail[field])
+
+    def test_invalid_format_and_filter(self):
+        response = self.client.get(self.export_url, {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.export_url, {'start_date': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityImportAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.import_url = reverse('activity-import')
+        Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=30,
+            distance=Decimal('5.00'),
+            calories_burned=300,
+            date=timezone.make_aware(datetime(2025, 1, 1, 8, 0))
+        )
+
+    def test_csv_upload_skips_duplicates_and_reports_rejections(self):
+        upload = StringIO(
+            'activity_type,duration,distance,calories_burned,date\n'
+            'running,30,5.00,300,2025-01-01T08:00:00Z\n'
+            'cycling,60,20.00,500,2025-01-02T08:00:00Z\n'
+            'cycling,60,20.00,500,2025-01-02T08:00:00Z\n'
+            'swimming,-5,1.00,100,2025-01-03T08:00:00Z\n'
+        )
+        upload.name = 'activities.csv'
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['rows'], 4)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['duplicates'], 2)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['rejected_rows'][0]['line'], 5)
+        self.assertIn('duration', response.data['rejected_rows'][0]['errors'])
+        self.assertEqual(Activity.objects.filter(user=self.user).count(), 2)
+
+    def test_ndjson_body_in_small_chunks(self):
+        lines = [
+            json.dumps({'activity_type': 'yoga', 'duration': 20 + day, 'distance': '0.00',
+                        'calories_burned': 90, 'date': f'2025-02-{day:02d}T07:00:00Z'})
+            for day in range(1, 6)
+        ]
+        lines.insert(2, '{not json')
+        body = '\n'.join(lines) + '\n'
+        with patch.object(ActivityImportView, 'chunk_size', 2):
+            response = self.client.post(self.import_url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertEqual(response.data['rejected_rows'][0]['line'], 3)
+        rollup = ActivityDailyRollup.objects.get(user=self.user, day=date(2025, 2, 3))
+        self.assertEqual(rollup.total_duration, 23)
+
+    def test_rows_without_a_date_default_to_now(self):
+        upload = StringIO('activity_type,duration,distance,calories_burned\nwalking,25,2.00,120\n')
+        upload.name = 'activities.csv'
+        response = self.client.post(self.import_url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+
+        body = json.dumps({'activity_type': 'yoga', 'duration': 40, 'distance': '0.00', 'calories_burned': 90})
+        response = self.client.post(self.import_url, body + '\n', content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 1)
+        imported = Activity.objects.filter(user=self.user, activity_type__in=['walking', 'yoga'])
+        self.assertEqual(imported.filter(date__gte=timezone.now() - timedelta(minutes=1)).count(), 2)
+
+    def test_export_roundtrip_is_idempotent(self):
+        exported = b''.join(self.client.get(reverse('activity-export'), {'format': 'csv'}).streaming_content)
+        response = self.client.post(self.import_url, exported, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['duplicates'], 1)
+
+    def test_unknown_format(self):
+        response = self.client.post(self.import_url, 'a,b\n1,2\n', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_management_command(self):
+        with NamedTemporaryFile('w', suffix='.ndjson') as source:
+            source.write(json.dumps({'activity_type': 'walking', 'duration': 45, 'distance': '3.00',
+                                     'calories_burned': 150, 'date': '2025-03-01T09:00:00Z'}) + '\n')
+            source.flush()
+            out = StringIO()
+            call_command('import_activities', 'testuser', source.name, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['created'], 1)
+        self.assertTrue(Activity.objects.filter(user=self.user, activity_type='walking').exists())
+
+
+class ActivityFastListAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for day in range(1, 6):
+            Activity.objects.create(
+                user=self.user,
+                activity_type='running' if day % 2 else 'cycling',
+                duration=20 + day,
+                distance=Decimal('4.50'),
+                calories_burned=200 + day,
+                date=timezone.make_aware(datetime(2025, 1, day, 8, 0))
+            )
+
+    def test_list_matches_model_serializer(self):
+        response = self.client.get(reverse('activity-list-create'))
+        expected = ActivitySerializer(Activity.objects.filter(user=self.user), many=True).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+    def test_sparse_fieldset_with_cursor_pagination(self):
+        url = reverse('activity-history')
+        response = self.client.get(url, {'fields': 'duration,id', 'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'duration'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['duration'] for row in response.data['results']], [23, 22])
+
+    def test_history_filters_apply(self):
+        response = self.client.get(reverse('activity-history'), {'activity_type': 'cycling', 'fields': 'activity_type'})
+        self.assertEqual(response.data['results'], [{'activity_type': 'cycling'}] * 2)
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('activity-list-create'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data['error'])
+
+
+class ConditionalGetAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.activity = Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=30,
+            distance=Decimal('5.00'),
+            calories_burned=300,
+            date=timezone.now() - timedelta(days=1)
+        )
+
+    def test_unchanged_requests_get_304_without_recomputing(self):
+        for url in [
+            reverse('activity-list-create') + '?page_size=5',
+            reverse('activity-history'),
+            reverse('activity-detail', kwargs={'pk': self.activity.pk}),
+            reverse('activity-metrics'),
+            reverse('activity-trends'),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(response['ETag'].startswith('W/'))
+            self.assertIn('Last-Modified', response)
+            # A 304 costs only the token lookup
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+
+    def test_writes_change_the_etag(self):
+        url = reverse('activity-list-create')
+        etag = self.client.get(url)['ETag']
+        self.client.patch(reverse('activity-detail', kwargs={'pk': self.activity.pk}), {'duration': 45}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        Activity.objects.filter(pk=self.activity.pk).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_query_and_user(self):
+        url = reverse('activity-history')
+        etag = self.client.get(url, {'activity_type': 'running'})['ETag']
+        response = self.client.get(url, {'activity_type': 'cycling'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=other).key}')
+        response = self.client.get(url, {'activity_type': 'running'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        url = reverse('activity-list-create')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class ActivityResultCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.create_activity(30)
+
+    def create_activity(self, duration):
+        return Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=duration,
+            distance=Decimal('5.00'),
+            calories_burned=300,
+            date=timezone.now() - timedelta(days=1)
+        )
+
+    def test_repeat_requests_are_served_from_cache(self):
+        for name in ('activity-metrics', 'activity-trends'):
+            first = self.client.get(reverse(name))
+            # Only authentication touches the database on a hit
+            with self.assertNumQueries(1):
+                second = self.client.get(reverse(name))
+            self.assertEqual(first.json(), second.json())
+        stats = cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+        self.assertEqual(stats['endpoints']['metrics']['hit_ratio'], 0.5)
+
+    def test_activity_writes_invalidate(self):
+        url = reverse('activity-metrics')
+        self.assertEqual(self.client.get(url).data['total_duration'], 30)
+        activity = self.create_activity(15)
+        self.assertEqual(self.client.get(url).data['total_duration'], 45)
+        activity.delete()
+        self.assertEqual(self.client.get(url).data['total_duration'], 30)
+        self.assertEqual(cache_stats()['misses'], 3)
+
+    def test_parameters_are_part_of_the_key(self):
+        url = reverse('activity-trends')
+        self.client.get(url, {'granularity': 'day'})
+        self.client.get(url, {'granularity': 'month'})
+        self.assertEqual(cache_stats()['endpoints']['trends']['misses'], 2)
+
+    def test_file_based_backend(self):
+        with TemporaryDirectory() as location:
+            caches_setting = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}
+            with override_settings(CACHES=caches_setting):
+                self.client.get(reverse('activity-metrics'))
+                self.client.get(reverse('activity-metrics'))
+                self.assertEqual(cache_stats()['hits'], 1)
+
+    def test_stats_endpoint_is_staff_only(self):
+        url = reverse('activity-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('endpoints', response.data)
+
+
+@override_settings(AUTH_TOKEN_TTL=timedelta(days=1))
+@override_settings(AUTH_CACHED_USER=True)
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.profile_url = reverse('user-profile')
+
+    def test_warm_requests_skip_auth_queries(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.profile_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.data['username'], 'testuser')
+
+    def test_user_changes_are_seen(self):
+        self.client.get(self.profile_url)
+        self.user.email = 'changed@example.com'
+        self.user.save()
+        self.assertEqual(self.client.get(self.profile_url).data['email'], 'changed@example.com')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_token(self):
+        self.client.get(self.profile_url)
+        self.user.set_password('newpass456!')
+        self.user.save()
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.profile_url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_is_rejected_and_login_issues_a_new_one(self):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(days=2))
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['detail'], 'Token has expired.')
+
+        self.client.credentials()
+        response = self.client.post(
+            reverse('user-login'), {'username': 'testuser', 'password': 'testpass123'}, format='json'
+        )
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertIsNotNone(response.data['expires_at'])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_200_OK)
+
+    def test_rotate(self):
+        response = self.client.post(reverse('token-rotate'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+        self.assertEqual(self.client.get(self.profile_url).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-a'},
+    'worker-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-b'},
+})
+class PerWorkerCacheTest(APITestCase):
+    """Two local memory caches stand in for the caches of two gunicorn workers"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def worker_b(self):
+        return override_settings(AUTH_CACHE_ALIAS='worker-b', SESSION_CACHE_ALIAS='worker-b')
+
+    @skipIf(settings.SHARED_CACHE, 'REDIS_URL or CACHE_DIR configures a shared cache')
+    def test_user_caching_is_off_without_a_shared_cache(self):
+        self.assertFalse(settings.AUTH_CACHED_USER)
+        self.assertFalse(settings.WEB_CACHED_USER)
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_logout_on_one_worker_ends_the_session_on_the_other(self):
+        client = Client()
+        client.force_login(self.user)
+        with self.worker_b():
+            self.assertEqual(client.get(reverse('dashboard')).status_code, 200)
+        session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+        client.get(reverse('logout'))
+        self.assertEqual(client.get(reverse('dashboard')).status_code, 302)
+        # A copy of the old cookie, say in another tab
+        client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        with self.worker_b():
+            self.assertEqual(client.get(reverse('dashboard')).status_code, 302)
+
+    def test_rotated_token_is_rejected_by_every_worker(self):
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, status.HTTP_200_OK)
+        with self.worker_b():
+            self.assertEqual(self.client.post(reverse('token-rotate')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_write_on_one_worker_changes_the_etag_on_the_other(self):
+        etag = self.client.get(reverse('activity-metrics'))['ETag']
+        with self.worker_b():
+            response = self.client.post(reverse('activity-list-create'), {
+                'activity_type': 'running', 'duration': 30, 'distance': '5.00', 'calories_burned': 300,
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse('activity-metrics'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_duration'], 30)
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    WEB_SESSION_MODE='cached_db', SESSION_ENGINE='django.contrib.sessions.backends.cached_db', WEB_CACHED_USER=True,
+)
+class CachedWebSessionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_login(self.user)
+        self.client.get(reverse('dashboard'))
+
+    def test_warm_page_reads_neither_session_nor_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('FROM "activities_user"', tables)
+
+    def test_profile_changes_are_seen(self):
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('dashboard')).wsgi_request.user.first_name, 'Changed')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.user.set_password('newpass456!')
+        self.user.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_logout_clears_cached_user(self):
+        self.client.get(reverse('logout'))
+        self.assertIsNone(cache.get(f'web-user:{self.user.pk}'))
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 302)
+
+    @override_settings(WEB_SESSION_MODE='signed_cookies', SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(reverse('dashboard')).status_code, 200)
+        self.assertNotIn('django_session', ' '.join(query['sql'] for query in queries))
+
+
+class DashboardAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for days_ago, activity_type in [(0, 'running'), (0, 'cycling'), (40, 'running')]:
+            Activity.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                duration=30,
+                distance=Decimal('5.00'),
+                calories_burned=300,
+                date=timezone.now() - timedelta(days=days_ago)
+            )
+        self.url = reverse('api-dashboard')
+
+    def test_dashboard_contents(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['totals']['activity_count'], 3)
+        self.assertEqual(data['totals']['total_duration'], 90)
+        self.assertEqual(data['totals']['total_calories_burned'], 900)
+        self.assertEqual(data['distribution'], [
+            {'activity_type': 'running', 'count': 2},
+            {'activity_type': 'cycling', 'count': 1},
+        ])
+        self.assertEqual(len(data['recent_activities']), 3)
+        self.assertEqual(len(data['week']['trends']), 7)
+        today = str(timezone.localdate())
+        self.assertEqual(
+            sum(day['activity_count'] for day in data['week']['trends'] if day['period_start'] == today), 2
+        )
+
+    def test_matches_async_dashboard(self):
+        with override_settings(ASYNC_PARALLEL_QUERIES=False):
+            expected = self.client.get(reverse('async-dashboard')).json()
+        self.assertEqual(self.client.get(self.url).json(), expected)
+
+    def test_query_count_is_independent_of_history(self):
+        # The token lookup plus the dashboard's own queries
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        Activity.objects.bulk_create([
+            Activity(user=self.user, activity_type='yoga', duration=10, distance=Decimal('0.00'), calories_burned=50)
+            for _ in range(50)
+        ])
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['totals']['activity_count'], 53)
+
+    def test_cached_and_conditional(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(first.json(), second.json())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_session_authentication(self):
+        client = Client()
+        self.assertEqual(client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        client.force_login(self.user)
+        self.assertEqual(client.get(self.url).json()['totals']['activity_count'], 3)
+
+
+class AsyncSummaryAPITest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        for days_ago, activity_type in [(0, 'running'), (1, 'cycling'), (40, 'running')]:
+            Activity.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                duration=30,
+                distance=Decimal('5.00'),
+                calories_burned=300,
+                date=timezone.now() - timedelta(days=days_ago)
+            )
+
+    def test_metrics_and_trends_match_sync_views(self):
+        for sync_name, async_name, params in [
+            ('activity-metrics', 'async-activity-metrics', {}),
+            ('activity-metrics', 'async-activity-metrics', {'start_date': '2020-01-01'}),
+            ('activity-trends', 'async-activity-trends', {'granularity': 'month', 'group_by': 'activity_type'}),
+        ]:
+            expected = self.client.get(reverse(sync_name), params, **self.auth).json()
+            response = self.client.get(reverse(async_name), params, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+
+    def test_trends_validation(self):
+        response = self.client.get(reverse('async-activity-trends'), {'granularity': 'hour'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ASYNC_PARALLEL_QUERIES=False)
+    def test_dashboard(self):
+        data = self.client.get(reverse('async-dashboard'), **self.auth).json()
+        self.assertEqual(data['totals']['activity_count'], 3)
+        self.assertEqual(data['distribution'][0], {'activity_type': 'running', 'count': 2})
+        self.assertEqual(len(data['recent_activities']), 3)
+        self.assertEqual(len(data['week']['trends']), 7)
+
+    @override_settings(ASYNC_PARALLEL_QUERIES=False)
+    def test_conditional_requests_and_result_cache_like_sync_views(self):
+        etags = {}
+        for name in ('async-activity-metrics', 'async-activity-trends', 'async-dashboard'):
+            response = self.client.get(reverse(name), **self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            etags[name] = response['ETag']
+            response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etags[name], **self.auth)
+            self.assertEqual(response.status_code, 304)
+        # The sync dashboard is served from the entry the async one cached
+        self.client.get(reverse('api-dashboard'), **self.auth)
+        self.assertEqual(cache_stats()['endpoints']['dashboard'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+        Activity.objects.create(
+            user=self.user, activity_type='yoga', duration=20, distance=0, calories_burned=80, date=timezone.now()
+        )
+        response = self.client.get(reverse('async-dashboard'), HTTP_IF_NONE_MATCH=etags['async-dashboard'], **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['activity_count'], 4)
+
+    def test_requires_token_and_get(self):
+        self.assertEqual(self.client.get(reverse('async-dashboard')).status_code, 401)
+        response = self.client.get(reverse('async-dashboard'), HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.post(reverse('async-dashboard'), **self.auth).status_code, 405)
+
+
+class AsyncParallelQueriesTest(TransactionTestCase):
+    def test_dashboard_queries_run_on_worker_connections(self):
+        user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        token = Token.objects.create(user=user)
+        Activity.objects.create(
+            user=user, activity_type='yoga', duration=45, distance=Decimal('0.00'), calories_burned=120
+        )
+        expected = self.client.get(reverse('async-dashboard'), HTTP_AUTHORIZATION=f'Token {token.key}').json()
+        with override_settings(ASYNC_PARALLEL_QUERIES=False):
+            sequential = self.client.get(reverse('async-dashboard'), HTTP_AUTHORIZATION=f'Token {token.key}').json()
+        self.assertEqual(expected, sequential)
+        self.assertEqual(expected['totals']['total_duration'], 45)
+
+
+class ServerTimingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=30,
+            distance=Decimal('5.00'),
+            calories_burned=300,
+            date=timezone.now() - timedelta(days=1)
+        )
+
+    def server_timing(self, response):
+        """Parse a Server-Timing header into {name: {'dur': ..., 'desc': ...}}"""
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_api_response_reports_sql_view_and_render(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('activity-metrics'))
+        metrics = self.server_timing(response)
+        self.assertEqual(metrics['db']['desc'], f'"{len(queries)} queries"')
+        self.assertIn('view', metrics)
+        self.assertIn('render', metrics)
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['view']['dur']))
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_template_time_is_reported(self):
+        response = Client().get(reverse('login'))
+        self.assertIn('tpl', self.server_timing(response))
+
+    def test_async_view_counts_queries(self):
+        response = self.client.get(reverse('async-activity-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(self.server_timing(response)['db']['desc'], '"0 queries"')
+
+    @override_settings(SLOW_REQUEST_LOG='slow.jsonl', SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('activities.slow_requests') as logs:
+            self.client.get(reverse('activity-metrics'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['url_name'], 'activity-metrics')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['db_queries'], 0)
+
+    @override_settings(SLOW_REQUEST_MS=60000)
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs('activities.slow_requests'):
+            self.client.get(reverse('activity-metrics'))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('activity-metrics')))
+
+
+@override_settings(PROMETHEUS_METRICS_TOKEN='scrape-secret')
+class PrometheusMetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def scrape(self):
+        response = Client().get(reverse('prometheus-metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+
+    def test_request_metrics_by_url_name(self):
+        before = self.scrape()
+        for _ in range(2):
+            self.client.get(reverse('activity-metrics'))
+        self.client.get('/api/no-such-endpoint/')
+        after = self.scrape()
+
+        def increase(name, **labels):
+            key = (name, tuple(sorted(labels.items())))
+            return after.get(key, 0) - before.get(key, 0)
+
+        self.assertEqual(increase(
+            'fitness_http_requests_total', view='activity-metrics', method='GET', status='200'
+        ), 2)
+        self.assertEqual(increase(
+            'fitness_http_request_duration_seconds_count', view='activity-metrics', method='GET'
+        ), 2)
+        self.assertEqual(increase(
+            'fitness_http_request_db_queries_bucket', view='activity-metrics', le='+Inf'
+        ), 2)
+        self.assertEqual(increase(
+            'fitness_http_requests_total', view='unresolved', method='GET', status='404'
+        ), 1)
+
+    def test_result_cache_counters(self):
+        self.client.get(reverse('activity-metrics'))
+        self.client.get(reverse('activity-metrics'))
+        samples = self.scrape()
+        self.assertEqual(samples[('fitness_result_cache_lookups_total', (('endpoint', 'metrics'), ('result', 'hits')))], 1)
+        self.assertEqual(samples[('fitness_result_cache_hit_ratio', (('endpoint', 'metrics'),))], 0.5)
+        self.assertNotIn(('fitness_result_cache_hit_ratio', (('endpoint', 'trends'),)), samples)
+
+    def test_token(self):
+        self.assertEqual(Client().get(reverse('prometheus-metrics')).status_code, 401)
+        response = Client().get(reverse('prometheus-metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+        self.scrape()
+
+    @override_settings(PROMETHEUS_METRICS_TOKEN=None)
+    def test_closed_without_a_token_unless_debugging(self):
+        self.assertEqual(Client().get(reverse('prometheus-metrics')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(Client().get(reverse('prometheus-metrics')).status_code, 200)
+
+    @override_settings(PROMETHEUS_METRICS=False, SERVER_TIMING=False)
+    def test_can_be_disabled(self):
+        self.assertEqual(Client().get(reverse('prometheus-metrics')).status_code, 404)
+
+
+class RequestProfilingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        Activity.objects.create(
+            user=self.user,
+            activity_type='running',
+            duration=30,
+            distance=Decimal('5.00'),
+            calories_burned=300,
+            date=timezone.now() - timedelta(days=1)
+        )
+
+    def assertProfiled(self, response, url_name):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn(f'({url_name})', report)
+        self.assertIn('function calls', report)
+        return report
+
+    def test_staff_token_header(self):
+        report = self.assertProfiled(self.client.get(reverse('activity-metrics'), HTTP_X_PROFILE='1'), 'activity-metrics')
+        self.assertIn('queries in', report)
+
+    def test_staff_session_query_parameter(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertProfiled(client.get(reverse('api-dashboard'), {'_profile': '1'}), 'api-dashboard')
+
+    def test_streaming_response_is_consumed(self):
+        response = self.client.get(reverse('activity-export'), {'_profile': '1', '_profile_sort': 'tottime'})
+        report = self.assertProfiled(response, 'activity-export')
+        self.assertIn('Ordered by: internal time', report)
+        self.assertNotIn(' 0 bytes', report.splitlines()[1])
+
+    def test_other_users_get_the_normal_response(self):
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('activity-metrics'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.data['total_duration'], 30)
+        response = APIClient().get(reverse('activity-metrics'), {'_profile': '1'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = APIClient().get(reverse('activity-metrics'), HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saves_profile_file(self):
+        with TemporaryDirectory() as profile_dir, override_settings(PROFILE_DIR=profile_dir):
+            response = self.client.get(reverse('activity-metrics'), HTTP_X_PROFILE='1')
+            path = os.path.join(profile_dir, response['X-Profile-File'])
+            self.assertTrue(path.endswith('.prof'))
+            pstats.Stats(path)
+
+    async def test_async_view(self):
+        response = await AsyncClient().get(
+            reverse('async-activity-metrics'), headers={'Authorization': f'Token {self.token.key}', 'X-Profile': '1'}
+        )
+        self.assertProfiled(response, 'async-activity-metrics')
+
+
+class SeedAndBenchmarkCommandTest(TestCase):
+    def seed(self, *args):
+        out = StringIO()
+        call_command('seed_activities', '--users', '2', '--activities', '50', *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def seeded_rows(self):
+        return list(
+            Activity.objects.filter(user__username__startswith='seed-user-')
+            .order_by('user__username', 'date', 'id')
+            .values_list('user__username', 'activity_type', 'duration', 'distance', 'calories_burned')
+        )
+
+    def test_seed_is_reproducible_and_keeps_rollups(self):
+        report = self.seed()
+        self.assertEqual(report['activities'], 100)
+        first = self.seeded_rows()
+        self.assertEqual(len(first), 100)
+        self.assertLessEqual({row[1] for row in first}, {value for value, _ in Activity.ACTIVITY_TYPES})
+        # Strength and yoga sessions have no distance
+        self.assertTrue(all(row[3] == 0 for row in first if row[1] in ('weightlifting', 'yoga')))
+
+        user = User.objects.get(username='seed-user-0')
+        self.assertEqual(user_stats(user)['totals']['activity_count'], Activity.objects.filter(user=user).count())
+
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed('--clear')
+        self.assertEqual(self.seeded_rows(), first)
+        self.seed('--clear', '--seed', '1')
+        self.assertNotEqual(self.seeded_rows(), first)
+
+    def test_benchmark_api(self):
+        self.seed()
+        out = StringIO()
+        call_command(
+            'benchmark_api', '--requests', '2',
+            '--endpoint', 'activity-metrics', '--endpoint', 'activity-export', '--endpoint', 'activity-detail',
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['failed'], [])
+        self.assertEqual(
+            set(report['results']),
+            {'GET activity-metrics', 'GET activity-export', 'GET activity-detail',
+             'PATCH activity-detail', 'DELETE activity-detail'}
+        )
+        result = report['results']['GET activity-metrics']
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(result['queries_per_request'], 2)
+        self.assertIn('p99_ms', result)
+        # Writes are rolled back
+        self.assertEqual(Activity.objects.filter(user__username='seed-user-0').count(), 50)
+        self.assertFalse(User.objects.get(username='seed-user-0').is_staff)
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', '--username', 'nobody', stdout=StringIO())
+
+
+class LoadTestCommandTest(LiveServerTestCase):
+    def test_mixed_workload_against_running_server(self):
+        call_command('seed_activities', '--users', '2', '--activities', '20', stdout=StringIO())
+        out = StringIO()
+        # One simulated user: the live server shares one in-memory SQLite connection between its threads
+        call_command(
+            'load_test', '--url', self.live_server_url, '--duration', '1', '--warmup', '0',
+            '--concurrency', '1', '--mix', 'list=1,create=1,metrics=1,dashboard=1', stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertGreater(report['requests'], 0)
+        self.assertEqual(report['error_rate'], 0)
+        self.assertIn('login', report['operations'])
+        self.assertIn('p99_ms', report['latency'])
+        self.assertEqual(report['db']['lock_errors'], 0)
+        self.assertEqual(report['db']['lock_wait_ms_total'], 0)
+        # Activities created by the run are removed again
+        self.assertEqual(Activity.objects.count(), 40)
+        self.assertEqual(report['users'], 1)
+
+    def test_mix_validation(self):
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--mix', 'list=1,upload=2', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--mix', 'list=0', stdout=StringIO())
+
+
+@override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+class SQLiteProductionModeTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def make_wrapper(self, transaction_mode='IMMEDIATE'):
+        wrapper = SQLiteWrapper({
+            **connection.settings_dict, 'NAME': self.path, 'OPTIONS': {'transaction_mode': transaction_mode},
+        }, alias='sqlite-production-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            return cursor.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        wrapper = self.make_wrapper()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -32000)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_pragmas_off_outside_production_mode(self):
+        self.assertEqual(self.pragma(self.make_wrapper(), 'journal_mode'), 'delete')
+
+    @skipUnless(fcntl, 'the write lock needs fcntl')
+    def test_transactions_begin_immediate_under_the_write_lock_at_the_first_write(self):
+        wrapper = self.make_wrapper()
+        other = os.open(f'{self.path}-writelock', os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, other)
+        statements = []
+        with wrapper.execute_wrapper(lambda execute, sql, *args: statements.append(sql) or execute(sql, *args)):
+            wrapper._start_transaction_under_autocommit()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                # Reading takes no lock
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(other, fcntl.LOCK_UN)
+                cursor.execute('CREATE TABLE t (x integer)')
+            # Another writer has to wait until the transaction ends
+            with self.assertRaises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            wrapper.commit()
+        self.assertEqual(statements, ['SELECT 1', 'BEGIN IMMEDIATE', 'CREATE TABLE t (x integer)'])
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def test_read_only_transactions_do_not_begin(self):
+        wrapper = self.make_wrapper()
+        statements = []
+        with wrapper.execute_wrapper(lambda execute, sql, *args: statements.append(sql) or execute(sql, *args)):
+            wrapper._start_transaction_under_autocommit()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.commit()
+        self.assertEqual(statements, ['SELECT 1'])
+        self.assertFalse(wrapper.connection.in_transaction)
+
+    def test_savepoints_taken_before_the_first_write_are_created_with_it(self):
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x integer)')
+        wrapper._start_transaction_under_autocommit()
+        wrapper._savepoint('s1')
+        wrapper._savepoint('s2')
+        wrapper._savepoint_commit('s2')
+        with wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+            wrapper._savepoint_rollback('s1')
+            cursor.execute('INSERT INTO t VALUES (2)')
+        wrapper.commit()
+        with wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute('SELECT x FROM t').fetchall(), [(2,)])
+
+    @skipUnless(fcntl, 'the write lock needs fcntl')
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 50})
+    def test_waiting_for_the_write_lock_times_out(self):
+        wrapper = self.make_wrapper()
+        other = os.open(f'{self.path}-writelock', os.O_RDWR | os.O_CREAT)
+        self.addCleanup(os.close, other)
+        fcntl.flock(other, fcntl.LOCK_EX)
+        wrapper._start_transaction_under_autocommit()
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                with wrapper.cursor() as cursor:
+                    cursor.execute('CREATE TABLE t (x integer)')
+        finally:
+            current_timing.reset(token)
+        # The wait shows up in Server-Timing, apart from the write statements
+        self.assertGreaterEqual(timing.lock_waits[0], 0.05)
+        header = parse_server_timing(server_timing_header(timing.summary(time.perf_counter())))
+        self.assertGreaterEqual(header['dblock']['dur'], 50)
+        self.assertEqual(header['dblock']['desc'], '1 waits')
+        self.assertEqual(header['dblockerr']['desc'], '1 lock errors')
+        self.assertNotIn('dbw', header)
+        self.assertFalse(wrapper.write_lock.held)
+        # The next write tries again once the holder lets go
+        fcntl.flock(other, fcntl.LOCK_UN)
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x integer)')
+        self.assertTrue(wrapper.write_lock.held)
+        wrapper.rollback()
+        self.assertFalse(wrapper.write_lock.held)
+
+    def test_deferred_mode_takes_no_write_lock(self):
+        wrapper = self.make_wrapper('DEFERRED')
+        self.assertIsNone(wrapper.write_lock)
+
+    @override_settings(SQLITE_BEGIN_RETRIES=5, SQLITE_BEGIN_BACKOFF=0.01)
+    def test_begin_retries_while_another_process_writes(self):
+        wrapper = self.make_wrapper()
+        self.pragma(wrapper, 'journal_mode')
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 0')
+        other = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.addCleanup(other.close)
+        other.execute('BEGIN IMMEDIATE')
+        release = threading.Timer(0.05, lambda: other.execute('COMMIT'))
+        release.start()
+        self.addCleanup(release.join)
+
+        attempts = []
+        with wrapper.execute_wrapper(lambda execute, sql, *args: attempts.append(sql) or execute(sql, *args)):
+            wrapper._start_transaction_under_autocommit()
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE t (x integer)')
+            wrapper.rollback()
+        self.assertGreater(attempts.count('BEGIN IMMEDIATE'), 1)
+
+    @override_settings(SQLITE_BEGIN_RETRIES=1, SQLITE_BEGIN_BACKOFF=0.01)
+    def test_begin_gives_up_after_retries(self):
+        wrapper = self.make_wrapper()
+        self.pragma(wrapper, 'journal_mode')
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout = 0')
+        other = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(other.close)
+        other.execute('BEGIN IMMEDIATE')
+
+        wrapper._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE t (x integer)')
+        # The write lock is released again
+        if fcntl:
+            self.assertFalse(wrapper.write_lock.held)
+        other.execute('ROLLBACK')
+        wrapper.rollback()
+
+    def test_contention_benchmark(self):
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite_writes', '--writers', '2', '--readers', '1', '--duration', '0.5',
+            '--activities', '5', stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['results']['default']['journal_mode'], 'delete')
+        self.assertEqual(report['results']['production']['journal_mode'], 'wal')
+        for result in report['results'].values():
+            self.assertGreater(result['writes'], 0)
+            self.assertEqual(result['write_errors'], 0)
+        self.assertIn('write_throughput_ratio', report)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=60)
+class ReadReplicaRoutingTest(TransactionTestCase):
+    """A second SQLite file stands in for the replica, refreshed by sync_replica()"""
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_path = os.path.join(directory.name, 'replica.sqlite3')
+        connections.settings['replica1'] = {
+            **connection.settings_dict, 'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': self.replica_path, 'OPTIONS': {},
+        }
+        self.addCleanup(self.remove_replica)
+
+        self.user = User.objects.create_user(username='replicauser', password='testpass123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        for duration in (30, 45):
+            Activity.objects.create(
+                user=self.user, activity_type='running', duration=duration, distance=5, calories_burned=300,
+                date=timezone.now(),
+            )
+
+    def remove_replica(self):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+
+    def sync_replica(self):
+        connections['replica1'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connection.connection.backup(replica)
+        replica.close()
+
+    def listed(self):
+        response = self.client.get(reverse('activity-list-create'))
+        self.assertEqual(response.status_code, 200)
+        return len(response.data['results'])
+
+    def test_router_decisions(self):
+        router = PrimaryReplicaRouter()
+        # Outside a request everything uses the primary
+        self.assertEqual(router.db_for_read(Activity), 'default')
+        token = current_routing.set(ReadRouting())
+        try:
+            self.assertEqual(router.db_for_read(Activity), 'replica1')
+            self.assertEqual(router.db_for_read(ActivityDailyRollup), 'replica1')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_read(Token), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Activity), 'default')
+            self.assertEqual(router.db_for_write(Activity), 'default')
+            # Pinned to the primary for the rest of the request
+            self.assertEqual(router.db_for_read(Activity), 'default')
+        finally:
+            current_routing.reset(token)
+        self.assertFalse(router.allow_migrate('replica1', 'activities'))
+        self.assertIsNone(router.allow_migrate('default', 'activities'))
+
+    def test_stickiness_ignores_a_stale_request_user(self):
+        User.objects.filter(pk=self.user.pk).update(activities_modified_at=timezone.now() - timedelta(hours=1))
+        cached = User.objects.get(pk=self.user.pk)
+        # Another worker writes; the cached user still has the old timestamp
+        User.objects.filter(pk=self.user.pk).update(activities_modified_at=timezone.now())
+        request = RequestFactory().get('/')
+        request.user = cached
+        self.assertTrue(ReadRouting(request).use_primary())
+
+    def test_reads_use_replica_until_the_user_writes(self):
+        # The user last wrote long ago, and the replica is missing one activity
+        User.objects.filter(pk=self.user.pk).update(activities_modified_at=timezone.now() - timedelta(hours=1))
+        self.sync_replica()
+        with sqlite3.connect(self.replica_path) as replica:
+            replica.execute('DELETE FROM activities_activity WHERE duration = 45')
+        self.assertEqual(self.listed(), 1)
+
+        response = self.client.post(reverse('activity-list-create'), {
+            'activity_type': 'cycling', 'duration': 60, 'distance': '20.00', 'calories_burned': 500,
+            'date': timezone.now().isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Within the sticky window the new activity is read from the primary
+        self.assertEqual(self.listed(), 3)
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.listed(), 1)
+
+        self.sync_replica()
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.listed(), 3)
+
+
+@override_settings(
+    ACTIVITY_SHARDS=['shard1', 'shard2'],
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class ActivityShardingTest(TestCase):
+    """Two copies of an SQLite file migrated as a shard act as the shards"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.template_dir = TemporaryDirectory()
+        cls.template = os.path.join(cls.template_dir.name, 'template.sqlite3')
+        connections.settings['shard1'] = {**connection.settings_dict, 'NAME': cls.template}
+        try:
+            with override_settings(ACTIVITY_SHARDS=['shard1']):
+                call_command('migrate', database='shard1', verbosity=0)
+        finally:
+            connections['shard1'].close()
+            del connections['shard1']
+            del connections.settings['shard1']
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.template_dir.cleanup()
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for alias in ('shard1', 'shard2'):
+            path = os.path.join(directory.name, f'{alias}.sqlite3')
+            shutil.copyfile(self.template, path)
+            connections.settings[alias] = {**connection.settings_dict, 'NAME': path}
+            self.addCleanup(self.remove_alias, alias)
+        activity_ids.reset()
+        self.addCleanup(activity_ids.reset)
+
+        # One user on each shard
+        self.users = {}
+        index = 0
+        while len(self.users) < 2:
+            user = User.objects.create_user(
+                username=f'sharded{index}', email=f'sharded{index}@example.com', password='testpass123'
+            )
+            self.users.setdefault(shard_for_user(user.pk), user)
+            index += 1
+
+    def remove_alias(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def activity(self, user, **fields):
+        return Activity(**{
+            'user': user, 'activity_type': 'running', 'duration': 30, 'distance': Decimal('5.00'),
+            'calories_burned': 300, 'date': timezone.now(), **fields,
+        })
+
+    def test_jump_hash_only_moves_users_to_the_new_shard(self):
+        before = {user_id: shard_for_user(user_id, ['a', 'b']) for user_id in range(1, 1001)}
+        after = {user_id: shard_for_user(user_id, ['a', 'b', 'c']) for user_id in range(1, 1001)}
+        moved = [user_id for user_id in before if before[user_id] != after[user_id]]
+        self.assertTrue(all(after[user_id] == 'c' for user_id in moved))
+        self.assertTrue(250 < len(moved) < 420)
+        self.assertEqual(set(before.values()), {'a', 'b'})
+
+    def test_activities_and_rollups_live_on_the_users_shard(self):
+        user = self.users['shard1']
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(reverse('activity-list-create'), {
+            'activity_type': 'cycling', 'duration': 60, 'distance': '20.00', 'calories_burned': 500,
+            'date': timezone.now().isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(Activity.objects.using('shard1').filter(user_id=user.pk).count(), 1)
+        self.assertEqual(ActivityDailyRollup.objects.using('shard1').filter(user_id=user.pk).count(), 1)
+        self.assertFalse(Activity._base_manager.using('shard2').exists())
+        self.assertFalse(Activity._base_manager.using('default').exists())
+        user.refresh_from_db()
+        self.assertEqual(user.activity_version, 1)
+
+        response = client.get(reverse('activity-list-create'))
+        self.assertEqual([row['user'] for row in response.data['results']], [user.username])
+        response = client.get(reverse('activity-metrics'))
+        self.assertEqual(response.data['total_duration'], 60)
+        response = client.get(reverse('activity-detail', args=[Activity.objects.filter(user=user).get().pk]))
+        self.assertEqual(response.data['user'], user.username)
+
+    def test_only_the_primary_keeps_the_user_foreign_keys(self):
+        def user_foreign_keys(alias):
+            with connections[alias].cursor() as cursor:
+                return [
+                    table
+                    for table in ('activities_activity', 'activities_activitydailyrollup')
+                    for constraint in connections[alias].introspection.get_constraints(cursor, table).values()
+                    if constraint['foreign_key'] and constraint['columns'] == ['user_id']
+                ]
+
+        self.assertEqual(user_foreign_keys('default'), ['activities_activity', 'activities_activitydailyrollup'])
+        self.assertEqual(user_foreign_keys('shard1'), [])
+
+    def test_ids_are_unique_across_shards(self):
+        first = self.activity(self.users['shard1'])
+        first.save()
+        second = Activity.objects.create(**{
+            'user': self.users['shard2'], 'activity_type': 'yoga', 'duration': 50, 'distance': 0,
+            'calories_burned': 150,
+        })
+        created = Activity.objects.bulk_create([self.activity(user) for user in self.users.values()])
+        ids = [first.pk, second.pk, *(activity.pk for activity in created)]
+        self.assertEqual(len(set(ids)), 4)
+        self.assertEqual(IdSequence.objects.get().next_id, ids[0] + 100)
+        self.assertEqual(Activity.objects.using('shard1').count(), 2)
+        self.assertEqual(Activity.objects.using('shard2').count(), 2)
+
+    def test_bulk_update_and_delete_per_shard(self):
+        activities = Activity.objects.bulk_create([self.activity(user) for user in self.users.values()])
+        for activity in activities:
+            activity.duration = 90
+        self.assertEqual(Activity.objects.bulk_update(activities, ['duration']), 2)
+        for alias, user in self.users.items():
+            self.assertEqual(ActivityDailyRollup.objects.filter(user=user).totals()['total_duration'], 90)
+
+        user = self.users['shard2']
+        user.delete()
+        self.assertFalse(Activity.objects.using('shard2').exists())
+        self.assertFalse(ActivityDailyRollup.objects.using('shard2').exists())
+        self.assertTrue(Activity.objects.using('shard1').exists())
+
+    def test_rebalance_moves_rows_off_the_primary(self):
+        with override_settings(ACTIVITY_SHARDS=[]):
+            created = Activity.objects.bulk_create(
+                [self.activity(user, duration=duration) for user in self.users.values() for duration in (20, 40)]
+            )
+        created_at = {activity.pk: activity.created_at for activity in created}
+
+        out = StringIO()
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['activities_moved'], 4)
+        self.assertEqual(Activity._base_manager.using('default').count(), 4)
+
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['routes'], {
+            'default -> shard1': {'users': 1, 'activities': 2},
+            'default -> shard2': {'users': 1, 'activities': 2},
+        })
+        self.assertFalse(Activity._base_manager.using('default').exists())
+        self.assertFalse(ActivityDailyRollup._base_manager.using('default').exists())
+        for alias, user in self.users.items():
+            moved = Activity.objects.filter(user=user)
+            self.assertEqual({activity.created_at for activity in moved}, {created_at[activity.pk] for activity in moved})
+            self.assertEqual(ActivityDailyRollup.objects.filter(user=user).totals()['total_duration'], 60)
+
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['users_moved'], 0)
+        # New ids start above the moved ones
+        self.assertGreater(Activity.objects.create(**{
+            'user': self.users['shard1'], 'activity_type': 'yoga', 'duration': 50, 'distance': 0,
+            'calories_burned': 150,
+        }).pk, max(created_at))
+
+    def test_admin_reads_every_shard(self):
+        admin_user = User.objects.create_superuser('shardadmin', 'shardadmin@example.com', 'testpass123')
+        self.client.force_login(admin_user)
+        activities = {alias: self.activity(user, activity_type='swimming') for alias, user in self.users.items()}
+        for activity in activities.values():
+            activity.save()
+
+        changelist = reverse('admin:activities_activity_changelist')
+        response = self.client.get(changelist)
+        self.assertContains(response, reverse('admin:activities_activity_change', args=[activities['shard1'].pk]))
+        self.assertNotContains(response, reverse('admin:activities_activity_change', args=[activities['shard2'].pk]))
+        self.assertContains(response, 'Only the rows on shard1 are listed, one of 2 shards.')
+        response = self.client.get(changelist, {'shard': 'shard2', 'q': self.users['shard2'].username})
+        self.assertContains(response, reverse('admin:activities_activity_change', args=[activities['shard2'].pk]))
+
+        response = self.client.get(reverse('admin:activities_activity_change', args=[activities['shard2'].pk]))
+        self.assertContains(response, self.users['shard2'].username)
+        response = self.client.get(reverse('admin:activities_activitydailyrollup_changelist'), {'shard': 'shard2'})
+        self.assertEqual(response.status_code, 200)
+        # Rollups are read-only
+        response = self.client.get(reverse('admin:activities_activitydailyrollup_add'))
+        self.assertEqual(response.status_code, 403)
+
+
+class ConnectionPoolTest(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def test_reuses_connections_up_to_max_size(self):
+        pool = ConnectionPool(self.path, max_size=1, timeout=0.05)
+        self.addCleanup(pool.close)
+        first, reused = pool.acquire(self.connect)
+        self.assertFalse(reused)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+
+        pool.release(first)
+        self.assertEqual(pool.acquire(self.connect), (first, True))
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['in_use'], stats['idle']), (1, 1, 0))
+        self.assertEqual((stats['created'], stats['reused'], stats['waits'], stats['timeouts']), (1, 1, 1, 1))
+
+    def test_waiter_gets_the_released_connection(self):
+        pool = ConnectionPool(self.path, max_size=1, timeout=5)
+        self.addCleanup(pool.close)
+        first, _ = pool.acquire(self.connect)
+        release = threading.Timer(0.05, pool.release, [first])
+        release.start()
+        self.addCleanup(release.join)
+        self.assertEqual(pool.acquire(self.connect), (first, True))
+        self.assertGreater(pool.stats()['wait_seconds'], 0)
+
+    def test_old_and_broken_connections_are_replaced(self):
+        pool = ConnectionPool(self.path, max_size=2, max_age=0)
+        old, _ = pool.acquire(self.connect)
+        pool.release(old)
+        self.assertEqual(pool.stats()['expired'], 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            old.execute('SELECT 1')
+
+        pool = ConnectionPool(self.path, max_size=2)
+        self.addCleanup(pool.close)
+        broken, _ = pool.acquire(self.connect)
+        pool.release(broken)
+        broken.close()
+        fresh, reused = pool.acquire(self.connect)
+        self.assertIsNot(fresh, broken)
+        self.assertFalse(reused)
+        self.assertEqual(pool.stats()['check_failures'], 1)
+
+    def test_connections_opened_elsewhere_are_left_alone(self):
+        pool = ConnectionPool(self.path)
+        other = self.connect()
+        self.addCleanup(other.close)
+        pool.release(other)
+        self.assertEqual(pool.stats()['idle'], 0)
+        other.execute('SELECT 1')
+
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+    def test_wrapper_borrows_from_the_pool_and_times_connects(self):
+        settings_dict = {
+            **connection.settings_dict, 'NAME': self.path, 'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'pool': {'max_size': 2}},
+        }
+        self.addCleanup(close_pools)
+        wrappers = [SQLiteWrapper(dict(settings_dict), alias='pool-test') for _ in range(2)]
+        for wrapper in wrappers:
+            self.addCleanup(wrapper.close)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            with wrappers[0].cursor() as cursor:
+                cursor.execute('CREATE TABLE t (id integer)')
+            raw = wrappers[0].connection
+            wrappers[0].close()
+            self.assertEqual(pool_stats()['pool-test']['idle'], 1)
+            with wrappers[1].cursor() as cursor:
+                self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        finally:
+            current_timing.reset(token)
+        self.assertIs(wrappers[1].connection, raw)
+        self.assertTrue(wrappers[1].reused_connection)
+        # The pool, not CONN_MAX_AGE, decides when a pooled connection closes
+        self.assertLessEqual(wrappers[1].close_at, time.monotonic())
+        self.assertEqual(len(timing.connects), 2)
+        header = parse_server_timing(server_timing_header(timing.summary(time.perf_counter())))
+        self.assertEqual(header['dbconn']['desc'], '2 connects')
+
+    @override_settings(PROMETHEUS_METRICS_TOKEN='scrape-secret')
+    def test_pool_metrics(self):
+        pool = ConnectionPool(self.path)
+        self.addCleanup(pool.close)
+        with patch('activities.prometheus.pool_stats', return_value={'default': pool.stats()}):
+            response = Client().get(reverse('prometheus-metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        samples = {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+        self.assertEqual(samples[('fitness_db_pool_connections', (('database', 'default'), ('state', 'idle')))], 0)
+        self.assertEqual(samples[('fitness_db_pool_events_total', (('database', 'default'), ('event', 'timeouts')))], 0)
+
+    def test_connection_benchmark(self):
+        out = StringIO()
+        call_command('benchmark_connections', '--threads', '2', '--requests', '5', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['results']), {'per-request', 'persistent', 'pool'})
+        for result in report['results'].values():
+            self.assertEqual(result['requests'], 10)
+            self.assertIn('p99_ms', result)
+        self.assertIn('connect_overhead_ms_per_request', report)
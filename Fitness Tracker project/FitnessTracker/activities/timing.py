@@ -0,0 +1,158 @@
+import time
+from contextvars import ContextVar
+from django.db import OperationalError
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# Timing of the request being handled in the current context, if any
+current_timing = ContextVar('current_timing', default=None)
+
+# Statements that need the database write lock. On SQLite a write only takes
+# more than a fraction of a millisecond when it waits for that lock.
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN IMMEDIATE')
+
+
+class RequestTiming:
+    """
+    Where one request spent its time.
+
+    Durations are collected as lists of seconds and only summed when the
+    response is finished; list.append is atomic, so queries run from worker
+    threads (see views_async.gather_queries) can record into the same
+    object without a lock.
+    """
+
+    __slots__ = (
+        'started', 'view_started', 'view_ended', 'render_started', 'render_ended',
+        'queries', 'writes', 'lock_waits', 'lock_errors', 'connects', 'templates',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_ended = None
+        self.render_started = None
+        self.render_ended = None
+        self.queries = []
+        self.writes = []
+        # Time spent waiting for the SQLite write lock (see activities.sqlite.WriteLock)
+        self.lock_waits = []
+        self.lock_errors = []
+        # Time spent opening connections, or taking them from a pool
+        self.connects = []
+        self.templates = []
+
+    def summary(self, ended):
+        """Milliseconds per phase; phases overlap (view includes its SQL and templates)"""
+        def ms(seconds):
+            return round(seconds * 1000, 2)
+
+        summary = {
+            'total_ms': ms(ended - self.started),
+            'db_ms': ms(sum(self.queries)),
+            'db_queries': len(self.queries),
+            'db_write_ms': ms(sum(self.writes)),
+            'db_writes': len(self.writes),
+            'db_lock_wait_ms': ms(sum(self.lock_waits)),
+            'db_lock_waits': len(self.lock_waits),
+            'db_lock_errors': len(self.lock_errors),
+            'db_connect_ms': ms(sum(self.connects)),
+            'db_connects': len(self.connects),
+            'view_ms': None,
+            'render_ms': None,
+            'template_ms': ms(sum(self.templates)) if self.templates else None,
+        }
+        if self.view_started is not None:
+            summary['view_ms'] = ms((self.view_ended or ended) - self.view_started)
+        if self.render_started is not None:
+            summary['render_ms'] = ms((self.render_ended or ended) - self.render_started)
+        return summary
+
+
+def server_timing_header(summary):
+    """Format a summary() as a Server-Timing header value"""
+    metrics = [f'db;dur={summary["db_ms"]};desc="{summary["db_queries"]} queries"']
+    if summary['db_writes']:
+        metrics.append(f'dbw;dur={summary["db_write_ms"]};desc="{summary["db_writes"]} writes"')
+    if summary['db_lock_waits']:
+        metrics.append(f'dblock;dur={summary["db_lock_wait_ms"]};desc="{summary["db_lock_waits"]} waits"')
+    if summary['db_lock_errors']:
+        metrics.append(f'dblockerr;desc="{summary["db_lock_errors"]} lock errors"')
+    if summary['db_connects']:
+        metrics.append(f'dbconn;dur={summary["db_connect_ms"]};desc="{summary["db_connects"]} connects"')
+    for name, key in (('view', 'view_ms'), ('render', 'render_ms'), ('tpl', 'template_ms')):
+        if summary[key] is not None:
+            metrics.append(f'{name};dur={summary[key]}')
+    metrics.append(f'total;dur={summary["total_ms"]}')
+    return ', '.join(metrics)
+
+
+def parse_server_timing(value):
+    """Parse a Server-Timing header into {name: {'dur': float or None, 'desc': str or None}}"""
+    metrics = {}
+    for metric in filter(None, (part.strip() for part in value.split(','))):
+        name, *params = metric.split(';')
+        params = dict(param.split('=', 1) for param in params if '=' in param)
+        metrics[name] = {
+            'dur': float(params['dur']) if 'dur' in params else None,
+            'desc': params['desc'].strip('"') if 'desc' in params else None,
+        }
+    return metrics
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that adds each query's duration to the current
+    request, counting writes and "database is locked" errors separately
+    """
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as e:
+        if 'locked' in str(e):
+            timing.lock_errors.append(sql)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        timing.queries.append(duration)
+        if sql.lstrip()[:15].upper().startswith(WRITE_STATEMENTS):
+            timing.writes.append(duration)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created handler: time every query run on the new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = current_timing.get()
+        if timing is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.templates.append(time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, recording template render time per request.
+
+    Only top-level renders are timed; includes and extends render inside
+    them and are not counted twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+from .models import Activity, ActivityDailyRollup
+
+# Supported bucket sizes and the database function that truncates a day to them
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+GROUP_BY_FIELDS = ('activity_type',)
+MAX_BUCKETS = 1000
+
+TOTAL_FIELDS = ('total_duration', 'total_distance', 'total_calories_burned', 'activity_count')
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing ``day`` (weeks start on Monday, like TruncWeek)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    """First day of the bucket following the one starting at ``start``"""
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if granularity == 'year':
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def bucket_starts(start_date, end_date, granularity):
+    """Every bucket start between two days (inclusive)"""
+    starts = []
+    current = bucket_start(start_date, granularity)
+    while current <= end_date:
+        starts.append(current)
+        try:
+            current = next_bucket(current, granularity)
+        except (OverflowError, ValueError):
+            # The bucket holding date.max has no successor
+            break
+    return starts
+
+
+def bucket_count(start_date, end_date, granularity):
+    """len(bucket_starts(...)), without building the list"""
+    first, last = bucket_start(start_date, granularity), bucket_start(end_date, granularity)
+    if granularity == 'week':
+        return (last - first).days // 7 + 1
+    if granularity == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    if granularity == 'year':
+        return last.year - first.year + 1
+    return (last - first).days + 1
+
+
+def empty_totals():
+    return {field: 0 for field in TOTAL_FIELDS}
+
+
+def activity_trends(user, start_date, end_date, granularity='week', group_by=None):
+    """
+    Activity totals per time bucket between two days, in a single GROUP BY query.
+
+    Buckets with no activity are filled with zeros. With ``group_by='activity_type'``
+    every bucket also carries an ``activity_types`` mapping with the totals per type.
+    """
+    group_fields = [group_by] if group_by else []
+    rows = ActivityDailyRollup.objects.filter(user=user).in_date_range(start_date, end_date).annotate(
+        period=GRANULARITIES[granularity]('day')
+    ).values('period', *group_fields).annotate(
+        **{field: Sum(field) for field in TOTAL_FIELDS}
+    ).order_by('period')
+
+    buckets = {}
+    for start in bucket_starts(start_date, end_date, granularity):
+        bucket = {'period_start': start.strftime('%Y-%m-%d'), **empty_totals()}
+        if group_by:
+            bucket['activity_types'] = {value: empty_totals() for value, _ in Activity.ACTIVITY_TYPES}
+        buckets[start] = bucket
+
+    for row in rows:
+        bucket = buckets[row['period']]
+        for field in TOTAL_FIELDS:
+            bucket[field] += row[field] or 0
+            if group_by:
+                bucket['activity_types'][row[group_by]][field] = row[field] or 0
+
+    return list(buckets.values())
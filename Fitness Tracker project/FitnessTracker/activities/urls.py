@@ -3,26 +3,44 @@ from django.urls import path
 from .views import (
     UserRegistrationView,
     CustomAuthToken,
+    TokenRotateView,
     UserProfileView,
     ActivityListCreateView,
     ActivityDetailView,
     ActivityHistoryView,
+    ActivityBulkView,
+    ActivityExportView,
+    ActivityImportView,
     activity_metrics,
     activity_trends,
+    activity_cache_stats,
+    dashboard,
 )
+from .views_async import async_activity_metrics, async_activity_trends, async_dashboard
 
 urlpatterns = [
     # Authentication endpoints
     path('auth/register/', UserRegistrationView.as_view(), name='user-register'),
     path('auth/login/', CustomAuthToken.as_view(), name='user-login'),
+    path('auth/token/rotate/', TokenRotateView.as_view(), name='token-rotate'),
     path('auth/profile/', UserProfileView.as_view(), name='user-profile'),
     
     # Activity CRUD endpoints
     path('activities/', ActivityListCreateView.as_view(), name='activity-list-create'),
     path('activities/<int:pk>/', ActivityDetailView.as_view(), name='activity-detail'),
+    path('activities/bulk/', ActivityBulkView.as_view(), name='activity-bulk'),
     
     # Activity history and metrics
     path('activities/history/', ActivityHistoryView.as_view(), name='activity-history'),
+    path('activities/export/', ActivityExportView.as_view(), name='activity-export'),
+    path('activities/import/', ActivityImportView.as_view(), name='activity-import'),
     path('activities/metrics/', activity_metrics, name='activity-metrics'),
     path('activities/trends/', activity_trends, name='activity-trends'),
+    path('activities/cache-stats/', activity_cache_stats, name='activity-cache-stats'),
+    path('dashboard/', dashboard, name='api-dashboard'),
+    
+    # Async variants of the summary endpoints (best served over ASGI)
+    path('async/activities/metrics/', async_activity_metrics, name='async-activity-metrics'),
+    path('async/activities/trends/', async_activity_trends, name='async-activity-trends'),
+    path('async/dashboard/', async_dashboard, name='async-dashboard'),
 ]
@@ -1,21 +1,45 @@
-from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import generics, status, permissions, serializers
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Sum, Count
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.utils.dateparse import parse_date
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.utils.decorators import method_decorator
-from datetime import datetime, timedelta
+from datetime import timedelta
+import codecs
+import csv
+from prometheus_client import CONTENT_TYPE_LATEST
 from .models import User, Activity
+from .authentication import CachedTokenAuthentication, get_valid_token, rotate_token, token_expiry
+from .caching import cache_stats, cached_result
+from .conditional import conditional_activity_get
+from .dashboard import dashboard_summary
+from .exports import EXPORT_FORMATS, FormatParamContentNegotiation, stream_export
+from .imports import IMPORT_FORMATS, ActivityImporter, detect_format, iter_records
+from .pagination import ActivityPagination
+from .prometheus import render_metrics
+from .stats import user_stats
+from . import trends
 from .serializers import (
     UserRegistrationSerializer, 
     UserSerializer, 
     ActivitySerializer,
     ActivityCreateUpdateSerializer,
-    ActivitySummarySerializer
+    ActivitySummarySerializer,
+    activity_value_columns,
+    parse_activity_fields,
+    serialize_activity_values,
 )
 
 
@@ -31,7 +55,7 @@ class UserRegistrationView(generics.CreateAPIView):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             user = serializer.save()
-            token, created = Token.objects.get_or_create(user=user)
+            token = get_valid_token(user)
             return Response({
                 'user': UserSerializer(user).data,
                 'token': token.key
@@ -54,9 +78,10 @@ class CustomAuthToken(ObtainAuthToken):
             if username and password:
                 user = authenticate(username=username, password=password)
                 if user and user.is_active:
-                    token, created = Token.objects.get_or_create(user=user)
+                    token = get_valid_token(user)
                     return Response({
                         'token': token.key,
+                        'expires_at': token_expiry(token),
                         'user': UserSerializer(user).data
                     })
             
@@ -71,6 +96,15 @@ class CustomAuthToken(ObtainAuthToken):
             )
 
 
+class TokenRotateView(APIView):
+    """Replace the caller's API token with a new one; the old token stops working"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        token = rotate_token(request.user)
+        return Response({'token': token.key, 'expires_at': token_expiry(token)})
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """User profile view"""
     serializer_class = UserSerializer
@@ -80,9 +114,33 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class ActivityListCreateView(generics.ListCreateAPIView):
+class ActivityValuesListMixin:
+    """
+    Fast read path for activity lists.
+
+    Rows are fetched with ``values()`` and encoded by serialize_activity_values,
+    which produces the same output as ActivitySerializer without building model
+    instances. ``?fields=id,date,...`` limits the response to the named fields.
+    """
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            fields = parse_activity_fields(request.query_params.get('fields'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset()).values(*activity_value_columns(fields))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_activity_values(page, fields))
+        return Response(serialize_activity_values(queryset, fields))
+
+
+@method_decorator(conditional_activity_get(), name='get')
+class ActivityListCreateView(ActivityValuesListMixin, generics.ListCreateAPIView):
     """List and create activities for authenticated user"""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ActivityPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -99,6 +157,7 @@ class ActivityListCreateView(generics.ListCreateAPIView):
             raise serializers.ValidationError('Error creating activity. Please try again.')
 
 
+@method_decorator(conditional_activity_get(), name='get')
 class ActivityDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, and delete specific activity"""
     permission_classes = [permissions.IsAuthenticated]
@@ -112,85 +171,452 @@ class ActivityDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Activity.objects.filter(user=self.request.user)
 
 
-class ActivityHistoryView(generics.ListAPIView):
+HISTORY_FILTERS = ('start_date', 'end_date', 'activity_type')
+
+
+def is_activity_id(value):
+    """Whether a parsed JSON value can be an activity id (JSON true is a bool, not 1)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def filter_activity_history(queryset, params, strict=False):
+    """
+    Apply the history filters (start_date, end_date, activity_type) in ``params``.
+
+    Invalid values are ignored, unless ``strict`` is set, in which case a
+    ValueError naming the bad filter is raised instead.
+    """
+    dates = {}
+    for name in ('start_date', 'end_date'):
+        value = params.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None and strict:
+            raise ValueError(f'Invalid {name}')
+    queryset = queryset.in_date_range(dates['start_date'], dates['end_date'])
+    
+    activity_type = params.get('activity_type')
+    if activity_type and activity_type in dict(Activity.ACTIVITY_TYPES):
+        queryset = queryset.filter(activity_type=activity_type)
+    elif activity_type and strict:
+        raise ValueError('Invalid activity_type')
+    return queryset
+
+
+@method_decorator(conditional_activity_get(), name='get')
+class ActivityHistoryView(ActivityValuesListMixin, generics.ListAPIView):
     """View activity history with optional filters"""
     serializer_class = ActivitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ActivityPagination
     
     def get_queryset(self):
         queryset = Activity.objects.filter(user=self.request.user)
+        return filter_activity_history(queryset, self.request.query_params)
+
+
+class ActivityBulkView(generics.GenericAPIView):
+    """
+    Create, update or delete many activities in one request.
+
+    POST takes a list of activities, or an object with an ``activities`` list
+    plus options. ``mode`` is ``atomic`` (default: nothing is saved unless
+    every item is valid) or ``partial`` (valid items are saved, invalid ones
+    are reported). ``batch_size`` controls rows per INSERT/UPDATE.
+
+    PATCH takes either ``{"ids": [...] | "filters": {...}, "changes": {...}}``,
+    applied with one filtered UPDATE, or ``{"activities": [{"id": ..., ...}]}``,
+    applied with bulk_update. DELETE takes ``{"ids": [...]}``, ``{"filters": {...}}``
+    or the history filters as query parameters. Filters are the ones accepted
+    by the history endpoint. Only the requesting user's activities are touched.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ActivityCreateUpdateSerializer
+    batch_size = 500
+    max_batch_size = 1000
+    max_items = 1000
+    modes = ('atomic', 'partial')
+    
+    def get_queryset(self):
+        return Activity.objects.filter(user=self.request.user)
+    
+    def get_bulk_payload(self, request):
+        """Split the request into the item list and its options"""
+        options = request.query_params
+        items = request.data
+        if isinstance(items, dict):
+            options = {**options.dict(), **items}
+            items = items.get('activities')
+        return items, options
+    
+    def get_batch_size(self, options):
+        try:
+            batch_size = int(options.get('batch_size', self.batch_size))
+        except (TypeError, ValueError):
+            return None
+        if batch_size < 1:
+            return None
+        return min(batch_size, self.max_batch_size)
+    
+    def post(self, request, *args, **kwargs):
+        items, options = self.get_bulk_payload(request)
+        mode = options.get('mode', 'atomic')
+        batch_size = self.get_batch_size(options)
+        
+        if mode not in self.modes:
+            return Response(
+                {'error': f"mode must be one of: {', '.join(self.modes)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if batch_size is None:
+            return Response({'error': 'batch_size must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of activities'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {'error': f'At most {self.max_items} activities can be created per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer(
+            data=items,
+            many=True,
+            context={**self.get_serializer_context(), 'partial_success': mode == 'partial', 'batch_size': batch_size}
+        )
+        valid = serializer.is_valid()
+        failed = [
+            {'index': index, 'errors': errors}
+            for index, errors in sorted(getattr(serializer, 'item_errors', {}).items())
+        ]
+        
+        if not valid or not serializer.valid_indexes:
+            return Response(
+                {'mode': mode, 'created': 0, 'failed': len(failed), 'results': failed},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
-            # Filter by date range
-            start_date = self.request.query_params.get('start_date')
-            end_date = self.request.query_params.get('end_date')
-            
-            if start_date:
-                start_date = parse_date(start_date)
-                if start_date:
-                    queryset = queryset.filter(date__gte=start_date)
-            
-            if end_date:
-                end_date = parse_date(end_date)
-                if end_date:
-                    queryset = queryset.filter(date__lte=end_date)
-            
-            # Filter by activity type
-            activity_type = self.request.query_params.get('activity_type')
-            if activity_type and activity_type in dict(Activity.ACTIVITY_TYPES):
-                queryset = queryset.filter(activity_type=activity_type)
-        except Exception:
-            pass  # Return unfiltered queryset if filtering fails
+            activities = serializer.save(user=request.user)
+        except Exception as e:
+            return Response(
+                {'error': 'Error creating activities. Please try again.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        created = [
+            {'index': index, 'id': activity.pk}
+            for index, activity in zip(serializer.valid_indexes, activities)
+        ]
+        return Response(
+            {
+                'mode': mode,
+                'created': len(created),
+                'failed': len(failed),
+                'results': sorted(created + failed, key=lambda result: result['index']),
+            },
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+        )
+    
+    def get_selection(self, data):
+        """The user's activities picked by ``ids`` or ``filters``; raises ValueError if neither is usable"""
+        ids = data.get('ids')
+        filters = data.get('filters')
+        if ids is not None:
+            if filters:
+                raise ValueError('Pass either ids or filters, not both')
+            if (
+                not isinstance(ids, list) or not ids
+                or not all(is_activity_id(pk) for pk in ids)
+            ):
+                raise ValueError('ids must be a non-empty list of integers')
+            if len(ids) > self.max_items:
+                raise ValueError(f'At most {self.max_items} ids can be passed per request')
+            return self.get_queryset().filter(id__in=ids)
+        
+        if not isinstance(filters, dict) or not filters:
+            raise ValueError(f"Pass a list of ids or at least one filter: {', '.join(HISTORY_FILTERS)}")
+        unknown = set(filters) - set(HISTORY_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+        return filter_activity_history(self.get_queryset(), filters, strict=True)
+    
+    def patch(self, request, *args, **kwargs):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected an object'}, status=status.HTTP_400_BAD_REQUEST)
+        if 'activities' in request.data:
+            return self.update_items(request)
+        return self.update_selection(request)
+    
+    def update_selection(self, request):
+        """Apply the same changes to every selected activity with one UPDATE"""
+        try:
+            selection = self.get_selection(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        changes = request.data.get('changes')
+        if not isinstance(changes, dict) or not changes:
+            return Response({'error': 'changes must be a non-empty object'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=changes, partial=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        if not serializer.validated_data:
+            return Response({'error': 'changes has no updatable fields'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            ids = list(selection.values_list('id', flat=True))
+            updated = 0
+            if ids:
+                updated = self.get_queryset().filter(id__in=ids).update(
+                    **serializer.validated_data, updated_at=timezone.now()
+                )
+        return Response({'updated': updated, 'ids': ids})
+    
+    def update_items(self, request):
+        """Apply per-activity changes with bulk_update"""
+        items = request.data.get('activities')
+        mode = request.data.get('mode', 'atomic')
+        batch_size = self.get_batch_size(request.data)
+        if mode not in self.modes:
+            return Response(
+                {'error': f"mode must be one of: {', '.join(self.modes)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if batch_size is None:
+            return Response({'error': 'batch_size must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of activities'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {'error': f'At most {self.max_items} activities can be updated per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ids = [item.get('id') for item in items if isinstance(item, dict)]
+        instances = self.get_queryset().in_bulk([pk for pk in ids if is_activity_id(pk)])
+        changed, fields, failed = [], set(), []
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            if not is_activity_id(pk):
+                failed.append({'index': index, 'errors': {'id': ['A valid integer is required.']}})
+                continue
+            if pk not in instances:
+                failed.append({'index': index, 'errors': {'id': ['Activity not found.']}})
+                continue
+            serializer = self.get_serializer(instances[pk], data=item, partial=True)
+            if not serializer.is_valid():
+                failed.append({'index': index, 'errors': serializer.errors})
+                continue
+            for field, value in serializer.validated_data.items():
+                setattr(instances[pk], field, value)
+            fields.update(serializer.validated_data)
+            changed.append(instances[pk])
+        
+        if (failed and mode == 'atomic') or not changed:
+            return Response(
+                {'mode': mode, 'updated': 0, 'failed': len(failed), 'ids': [], 'errors': failed},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.now()
+        for activity in changed:
+            activity.updated_at = now
+        Activity.objects.bulk_update(changed, sorted(fields | {'updated_at'}), batch_size=batch_size)
+        return Response(
+            {
+                'mode': mode,
+                'updated': len(changed),
+                'failed': len(failed),
+                'ids': [activity.pk for activity in changed],
+                'errors': failed,
+            },
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK
+        )
+    
+    def delete(self, request, *args, **kwargs):
+        data = request.data if isinstance(request.data, dict) else {}
+        if 'ids' not in data and 'filters' not in data:
+            data = {'filters': {
+                name: value for name, value in request.query_params.items() if name in HISTORY_FILTERS
+            }}
+        try:
+            selection = self.get_selection(data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return queryset
+        with transaction.atomic():
+            ids = list(selection.values_list('id', flat=True))
+            if ids:
+                self.get_queryset().filter(id__in=ids).delete()
+        return Response({'deleted': len(ids), 'ids': ids})
+
+
+class ActivityExportView(APIView):
+    """
+    Stream the user's full activity history as CSV or NDJSON.
+
+    Accepts ``?format=csv|ndjson`` (default csv) and the history filters.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_negotiation_class = FormatParamContentNegotiation
+    chunk_size = 2000
+    
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            queryset = filter_activity_history(
+                Activity.objects.filter(user=request.user).order_by('-date', '-id'),
+                request.query_params,
+                strict=True
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(
+            stream_export(queryset, export_format, self.chunk_size),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        filename = f"activities-{request.user.username}-{timezone.localdate():%Y%m%d}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ActivityImportView(APIView):
+    """
+    Import activities from CSV or NDJSON, read and inserted in chunks.
+
+    Send the file as a multipart ``file`` field or as the raw request body
+    (``text/csv`` or ``application/x-ndjson``). ``?format=`` overrides format
+    detection. Rows duplicating an existing (date, activity_type, duration)
+    are skipped. The response reports counts, rejected rows and throughput.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    content_negotiation_class = FormatParamContentNegotiation
+    chunk_size = 1000
+    
+    def post(self, request, *args, **kwargs):
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'Missing file'}, status=status.HTTP_400_BAD_REQUEST)
+            source, filename = upload, upload.name
+        else:
+            if request.stream is None:
+                return Response({'error': 'Empty request body'}, status=status.HTTP_400_BAD_REQUEST)
+            source, filename = request.stream, ''
+        
+        import_format = request.query_params.get('format') or detect_format(request.content_type, filename)
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f"format must be one of: {', '.join(IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        importer = ActivityImporter(request.user, chunk_size=self.chunk_size)
+        try:
+            report = importer.run(iter_records(codecs.iterdecode(source, 'utf-8-sig'), import_format))
+        except (UnicodeDecodeError, csv.Error) as e:
+            report = importer.report()
+            report['error'] = f'Import stopped: {e}'
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+
+def metrics_date_range(params):
+    """The metrics date range from query parameters (default: the last 30 days); invalid dates are ignored"""
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=30)
+    
+    start_param = params.get('start_date')
+    end_param = params.get('end_date')
+    
+    if start_param:
+        parsed_start = parse_date(start_param)
+        if parsed_start:
+            start_date = parsed_start
+    if end_param:
+        parsed_end = parse_date(end_param)
+        if parsed_end:
+            end_date = parsed_end
+    return start_date, end_date
+
+
+def metrics_summary(user, start_date, end_date):
+    """Serialized metrics for a date range; the rollup sums are cached per data version"""
+    metrics = cached_result(
+        'metrics', user, {'start_date': start_date, 'end_date': end_date},
+        lambda: user_stats(user, start_date, end_date, distribution=False)['totals']
+    )
+    return ActivitySummarySerializer({**metrics, 'date_range': f"{start_date} to {end_date}"}).data
+
+
+def trends_options(params):
+    """
+    Parse the trends query parameters into (granularity, group_by, start_date, end_date).
+
+    Raises ValueError with a client-facing message for invalid input.
+    """
+    granularity = params.get('granularity', 'week')
+    group_by = params.get('group_by') or None
+    
+    if granularity not in trends.GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(trends.GRANULARITIES)}")
+    if group_by and group_by not in trends.GROUP_BY_FIELDS:
+        raise ValueError(f"group_by must be one of: {', '.join(trends.GROUP_BY_FIELDS)}")
+    
+    # Default to the last 12 weeks
+    try:
+        end_date = parse_date(params.get('end_date') or '') or timezone.localdate()
+        start_date = parse_date(params.get('start_date') or '') or end_date - timedelta(weeks=12)
+    except (ValueError, OverflowError):
+        raise ValueError('Invalid date')
+    if start_date > end_date:
+        raise ValueError('start_date must be on or before end_date')
+    if trends.bucket_count(start_date, end_date, granularity) > trends.MAX_BUCKETS:
+        raise ValueError(f'Date range is too large for {granularity} granularity')
+    return granularity, group_by, start_date, end_date
+
+
+def trends_summary(user, granularity, group_by, start_date, end_date):
+    """The trends response body; buckets are cached per data version"""
+    buckets = cached_result(
+        'trends', user,
+        {'start_date': start_date, 'end_date': end_date, 'granularity': granularity, 'group_by': group_by},
+        lambda: trends.activity_trends(user, start_date, end_date, granularity, group_by)
+    )
+    data = {
+        'granularity': granularity,
+        'group_by': group_by,
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'trends': buckets,
+    }
+    if granularity == 'week' and not group_by:
+        # Shape used before granularity support was added
+        data['weekly_trends'] = [
+            {**{field: bucket[field] for field in trends.TOTAL_FIELDS}, 'week_start': bucket['period_start']}
+            for bucket in buckets
+        ]
+    return data
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@conditional_activity_get(depends_on_today=True)
 def activity_metrics(request):
     """Get activity metrics/summary for the user"""
     try:
-        user = request.user
-        
         # Get date range from query params (default to last 30 days)
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
-        
-        start_param = request.query_params.get('start_date')
-        end_param = request.query_params.get('end_date')
-        
-        if start_param:
-            parsed_start = parse_date(start_param)
-            if parsed_start:
-                start_date = parsed_start
-        if end_param:
-            parsed_end = parse_date(end_param)
-            if parsed_end:
-                end_date = parsed_end
-        
-        # Get activities in date range
-        activities = Activity.objects.filter(
-            user=user,
-            date__date__gte=start_date,
-            date__date__lte=end_date
-        )
-        
-        # Calculate metrics
-        metrics = activities.aggregate(
-            total_duration=Sum('duration'),
-            total_distance=Sum('distance'),
-            total_calories_burned=Sum('calories_burned'),
-            activity_count=Count('id')
-        )
-        
-        # Handle None values
-        metrics['total_duration'] = metrics['total_duration'] or 0
-        metrics['total_distance'] = metrics['total_distance'] or 0
-        metrics['total_calories_burned'] = metrics['total_calories_burned'] or 0
-        metrics['date_range'] = f"{start_date} to {end_date}"
-        
-        serializer = ActivitySummarySerializer(metrics)
-        return Response(serializer.data)
+        start_date, end_date = metrics_date_range(request.query_params)
+        return Response(metrics_summary(request.user, start_date, end_date))
     except Exception as e:
         return Response(
             {'error': 'Error calculating metrics'},
@@ -200,51 +626,59 @@ def activity_metrics(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@conditional_activity_get(depends_on_today=True)
 def activity_trends(request):
-    """Get activity trends over time (optional feature)"""
+    """Get activity trends over time, bucketed by day, week, month or year"""
     try:
-        user = request.user
-        
-        # Get weekly trends for the last 12 weeks
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(weeks=12)
-        
-        activities = Activity.objects.filter(
-            user=user,
-            date__date__gte=start_date,
-            date__date__lte=end_date
-        )
-        
-        # Group by week and calculate totals
-        weekly_data = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            week_end = current_date + timedelta(days=6)
-            week_activities = activities.filter(
-                date__date__gte=current_date,
-                date__date__lte=week_end
-            )
-            
-            week_metrics = week_activities.aggregate(
-                total_duration=Sum('duration'),
-                total_distance=Sum('distance'),
-                total_calories_burned=Sum('calories_burned'),
-                activity_count=Count('id')
-            )
-            
-            # Handle None values
-            week_metrics['total_duration'] = week_metrics['total_duration'] or 0
-            week_metrics['total_distance'] = week_metrics['total_distance'] or 0
-            week_metrics['total_calories_burned'] = week_metrics['total_calories_burned'] or 0
-            week_metrics['week_start'] = current_date.strftime('%Y-%m-%d')
-            weekly_data.append(week_metrics)
-            
-            current_date += timedelta(days=7)
-        
-        return Response({'weekly_trends': weekly_data})
+        options = trends_options(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        return Response(trends_summary(request.user, *options))
     except Exception as e:
         return Response(
             {'error': 'Error calculating trends'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+@conditional_activity_get(depends_on_today=True)
+def dashboard(request):
+    """
+    Totals, per-type distribution, recent activities and the current week's
+    daily trend in one response. Also accepts the web UI's session.
+    """
+    today = timezone.localdate()
+    return Response(cached_result(
+        'dashboard', request.user, {'today': today}, lambda: dashboard_summary(request.user, today)
+    ))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def activity_cache_stats(request):
+    """Hit/miss counters of the metrics and trends result cache (staff only)"""
+    return Response(cache_stats())
+
+
+@require_GET
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint.
+
+    The scraper must send PROMETHEUS_METRICS_TOKEN as a bearer token. Without
+    a token the endpoint is only open with DEBUG on: the metrics expose
+    traffic, cache and pool internals.
+    """
+    if not getattr(settings, 'PROMETHEUS_METRICS', True):
+        raise Http404
+    token = getattr(settings, 'PROMETHEUS_METRICS_TOKEN', None)
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=403)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,120 @@
+"""
+Async (ASGI) variants of the summary endpoints.
+
+DRF views are synchronous, so these are plain Django async views that
+authenticate with CachedTokenAuthentication and render with DRF's JSON
+encoder, producing the same bodies as their synchronous counterparts. Like
+those they answer conditional requests (conditional_activity_get) and share
+their entries in the result cache.
+Serve them with an ASGI server (see FitnessTracker/asgi.py); under WSGI
+they still work but each request runs in its own event loop.
+"""
+import asyncio
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.utils.encoders import JSONEncoder
+from .authentication import CachedTokenAuthentication
+from .caching import acached_result
+from .conditional import conditional_activity_get
+from .dashboard import build_dashboard, dashboard_queries
+from .views import metrics_date_range, metrics_summary, trends_options, trends_summary
+
+
+def json_response(data, status=200, **kwargs):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False, **kwargs)
+
+
+def async_api_get(view):
+    """
+    Allow only GET/HEAD and authenticate like the API's token authentication
+    with IsAuthenticated. (Django's own view decorators are not async-aware
+    before 5.0.)
+    """
+    authentication = CachedTokenAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        try:
+            result = await sync_to_async(authentication.authenticate)(request)
+        except exceptions.AuthenticationFailed as e:
+            result, detail = None, str(e.detail)
+        else:
+            detail = exceptions.NotAuthenticated.default_detail
+        if result is None:
+            return json_response(
+                {'detail': str(detail)}, status=401,
+                headers={'WWW-Authenticate': authentication.authenticate_header(request)}
+            )
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _in_worker_connection(query):
+    """Run ``query`` on the worker thread's own connection, honouring CONN_MAX_AGE"""
+    def run():
+        close_old_connections()
+        try:
+            return query()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(queries):
+    """
+    Run independent zero-argument ORM callables concurrently.
+
+    Django's async ORM methods all hand off to the single thread-sensitive
+    executor, so gathering them would still run one query at a time. Each
+    callable therefore runs in its own worker thread, with its own database
+    connection. With ASYNC_PARALLEL_QUERIES off they run in sequence on the
+    request's connection instead.
+    """
+    if not getattr(settings, 'ASYNC_PARALLEL_QUERIES', True):
+        return [await sync_to_async(query)() for query in queries]
+    return await asyncio.gather(*(
+        sync_to_async(_in_worker_connection(query), thread_sensitive=False)() for query in queries
+    ))
+
+
+@async_api_get
+@conditional_activity_get(depends_on_today=True)
+async def async_activity_metrics(request):
+    """Async version of activity_metrics"""
+    start_date, end_date = metrics_date_range(request.GET)
+    data = await sync_to_async(metrics_summary)(request.user, start_date, end_date)
+    return json_response(data)
+
+
+@async_api_get
+@conditional_activity_get(depends_on_today=True)
+async def async_activity_trends(request):
+    """Async version of activity_trends"""
+    try:
+        options = trends_options(request.GET)
+    except ValueError as e:
+        return json_response({'error': str(e)}, status=400)
+    data = await sync_to_async(trends_summary)(request.user, *options)
+    return json_response(data)
+
+
+@async_api_get
+@conditional_activity_get(depends_on_today=True)
+async def async_dashboard(request):
+    """Async version of dashboard, with its queries run concurrently"""
+    today = timezone.localdate()
+
+    async def compute():
+        queries = dashboard_queries(request.user, today)
+        results = await gather_queries(list(queries.values()))
+        return build_dashboard(dict(zip(queries, results)))
+
+    return json_response(await acached_result('dashboard', request.user, {'today': today}, compute))
@@ -6,13 +6,13 @@ from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.cache import never_cache
 from .forms import CustomUserCreationForm
 from django.core.paginator import Paginator
-from django.db.models import Count, Avg, Sum
 from django.http import JsonResponse
 from .models import Activity, User
+from .stats import user_stats
 from .forms import ActivityForm
 import json
-from datetime import datetime, timedelta
-from django.utils import timezone
+from datetime import datetime
+from django.utils.dateparse import parse_date
 
 def landing_view(request):
     """Landing page for non-authenticated users"""
@@ -85,24 +85,19 @@ def logout_view(request):
 def dashboard_view(request):
     """User dashboard view"""
     try:
-        # Get user's activities
-        activities = Activity.objects.filter(user=request.user).order_by('-date')
-        
-        # Calculate statistics
+        # Calculate statistics and activity distribution
+        summary = user_stats(request.user)
+        totals = summary['totals']
         stats = {
-            'total_activities': activities.count(),
-            'total_duration': activities.aggregate(Sum('duration'))['duration__sum'] or 0,
-            'total_distance': activities.aggregate(Sum('distance'))['distance__sum'] or 0,
-            'total_calories': activities.aggregate(Sum('calories_burned'))['calories_burned__sum'] or 0,
+            'total_activities': totals['activity_count'],
+            'total_duration': totals['total_duration'],
+            'total_distance': totals['total_distance'],
+            'total_calories': totals['total_calories_burned'],
         }
+        activity_distribution = summary['distribution']
         
         # Get recent activities
-        recent_activities = activities[:5]
-        
-        # Get activity distribution
-        activity_distribution = activities.values('activity_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        recent_activities = Activity.objects.filter(user=request.user).order_by('-date')[:5]
         
         context = {
             'stats': stats,
@@ -134,12 +129,18 @@ def activities_view(request):
             activities = activities.filter(activity_type=activity_type)
         if start_date:
             try:
-                activities = activities.filter(date__date__gte=start_date)
+                parsed_start = parse_date(start_date)
+                if parsed_start is None:
+                    raise ValueError(start_date)
+                activities = activities.in_date_range(start_date=parsed_start)
             except ValueError:
                 messages.error(request, 'Invalid start date format.')
         if end_date:
             try:
-                activities = activities.filter(date__date__lte=end_date)
+                parsed_end = parse_date(end_date)
+                if parsed_end is None:
+                    raise ValueError(end_date)
+                activities = activities.in_date_range(end_date=parsed_end)
             except ValueError:
                 messages.error(request, 'Invalid end date format.')
         
@@ -189,47 +190,27 @@ def add_activity_view(request):
 def profile_view(request):
     """User profile view"""
     try:
-        activities = Activity.objects.filter(user=request.user).order_by('-date')
-        
-        # Calculate profile statistics
-        total_activities = activities.count()
-        total_duration = activities.aggregate(Sum('duration'))['duration__sum'] or 0
-        total_distance = activities.aggregate(Sum('distance'))['distance__sum'] or 0
-        total_calories = activities.aggregate(Sum('calories_burned'))['calories_burned__sum'] or 0
-        avg_duration = activities.aggregate(Avg('duration'))['duration__avg'] or 0
-        
-        # Get activity type distribution
-        activity_distribution = activities.values('activity_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        # Get monthly progress (last 6 months)
-        monthly_data = []
-        for i in range(6):
-            try:
-                month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30*i)
-                month_end = month_start.replace(day=28) + timedelta(days=4)
-                month_end = month_end.replace(day=1) - timedelta(days=1)
-                
-                month_activities = activities.filter(date__range=[month_start, month_end])
-                month_duration = month_activities.aggregate(Sum('duration'))['duration__sum'] or 0
-                
-                monthly_data.append({
-                    'month': month_start.strftime('%B %Y'),
-                    'duration': month_duration
-                })
-            except Exception:
-                continue
-        
-        monthly_data.reverse()
+        # Lifetime totals, distribution and the last 6 calendar months
+        summary = user_stats(request.user, months=6)
+        totals = summary['totals']
+        activity_distribution = summary['distribution']
+        monthly_data = [
+            {'month': month['month'], 'duration': month['total_duration']}
+            for month in summary['monthly']
+        ]
+        most_common_activity = None
+        if activity_distribution:
+            most_common_activity = dict(Activity.ACTIVITY_TYPES).get(activity_distribution[0]['activity_type'])
         
         context = {
             'user': request.user,
-            'total_activities': total_activities,
-            'total_duration': total_duration,
-            'total_distance': total_distance,
-            'total_calories': total_calories,
-            'avg_duration': round(avg_duration, 1) if avg_duration else 0,
+            'total_activities': totals['activity_count'],
+            'total_duration': totals['total_duration'],
+            'total_distance': totals['total_distance'],
+            'total_calories': totals['total_calories_burned'],
+            'avg_duration': summary['averages']['duration'],
+            'avg_distance': summary['averages']['distance'],
+            'most_common_activity': most_common_activity,
             'activity_distribution': activity_distribution,
             'monthly_data': monthly_data,
         }
@@ -242,6 +223,8 @@ def profile_view(request):
             'total_distance': 0,
             'total_calories': 0,
             'avg_duration': 0,
+            'avg_distance': 0,
+            'most_common_activity': None,
             'activity_distribution': [],
             'monthly_data': [],
         }
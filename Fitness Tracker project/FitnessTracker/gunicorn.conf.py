@@ -0,0 +1,34 @@
+# gunicorn reads this file from the working directory on startup
+import glob
+import os
+import sys
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    """Drop Prometheus samples left over from the previous run"""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for sample_file in glob.glob(os.path.join(path, '*.db')):
+            os.remove(sample_file)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def pre_fork(server, worker):
+    """With preload_app the master has loaded Django: workers must not inherit its connections"""
+    if server.cfg.preload_app and 'django.db' in sys.modules:
+        from django.db import connections
+        from activities.pooling import close_pools
+        connections.close_all()
+        close_pools()
+
+
+def worker_exit(server, worker):
+    """Close the worker's pooled database connections instead of dropping them"""
+    if 'activities.pooling' in sys.modules:
+        sys.modules['activities.pooling'].close_pools()
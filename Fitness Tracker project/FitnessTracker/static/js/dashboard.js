@@ -1,13 +1,17 @@
 // Dashboard page specific JavaScript
 
-// Load dashboard data from API
+let weeklyChart = null;
+
+// Load everything the dashboard shows from the combined API endpoint
 async function loadDashboardData() {
     try {
-        const response = await fetch('/api/activities/metrics/');
+        const response = await fetch('/api/dashboard/', { credentials: 'same-origin' });
         const data = await response.json();
         
-        // Update statistics
-        updateDashboardStats(data);
+        // Update statistics, recent activities and the weekly chart
+        updateDashboardStats(data.totals);
+        updateRecentActivitiesList(data.recent_activities || []);
+        createWeeklyChart(data.week ? data.week.trends : []);
         
     } catch (error) {
         console.error('Error loading dashboard data:', error);
@@ -34,21 +38,27 @@ function updateDashboardStats(data) {
         elements.totalDistance.textContent = (data.total_distance || 0) + 'km';
     }
     if (elements.totalCalories) {
-        elements.totalCalories.textContent = data.total_calories || 0;
+        elements.totalCalories.textContent = data.total_calories_burned || 0;
     }
 }
 
-// Create weekly progress chart
-function createWeeklyChart() {
+// Create or update the weekly progress chart from daily trend buckets
+function createWeeklyChart(days) {
     const ctx = document.getElementById('weeklyProgressChart');
     if (!ctx) return;
     
-    // Sample data - replace with real data from API
+    const durations = (days || []).map(day => day.total_duration);
+    if (weeklyChart) {
+        weeklyChart.data.datasets[0].data = durations;
+        weeklyChart.update();
+        return;
+    }
+    
     const weeklyData = {
         labels: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
         datasets: [{
             label: 'Duration (minutes)',
-            data: [30, 45, 0, 60, 30, 90, 45],
+            data: durations,
             backgroundColor: 'rgba(102, 126, 234, 0.2)',
             borderColor: 'rgba(102, 126, 234, 1)',
             borderWidth: 2,
@@ -56,7 +66,7 @@ function createWeeklyChart() {
         }]
     };
     
-    new Chart(ctx.getContext('2d'), {
+    weeklyChart = new Chart(ctx.getContext('2d'), {
         type: 'line',
         data: weeklyData,
         options: {
@@ -84,19 +94,6 @@ function createWeeklyChart() {
     });
 }
 
-// Load recent activities
-async function loadRecentActivities() {
-    try {
-        const response = await fetch('/api/activities/?page_size=5');
-        const data = await response.json();
-        
-        updateRecentActivitiesList(data.results || []);
-        
-    } catch (error) {
-        console.error('Error loading recent activities:', error);
-    }
-}
-
 // Update recent activities list
 function updateRecentActivitiesList(activities) {
     const container = document.getElementById('recentActivities');
@@ -138,8 +135,6 @@ function updateRecentActivitiesList(activities) {
 document.addEventListener('DOMContentLoaded', function() {
     // Load initial data
     loadDashboardData();
-    loadRecentActivities();
-    createWeeklyChart();
     
     // Refresh data every 5 minutes
     setInterval(loadDashboardData, 300000);
@@ -149,10 +144,7 @@ document.addEventListener('DOMContentLoaded', function() {
     if (refreshBtn) {
         refreshBtn.addEventListener('click', function() {
             const originalText = showLoading(this);
-            Promise.all([
-                loadDashboardData(),
-                loadRecentActivities()
-            ]).finally(() => {
+            loadDashboardData().finally(() => {
                 hideLoading(this, originalText);
             });
         });
@@ -190,7 +182,6 @@ window.Dashboard = {
     loadDashboardData,
     updateDashboardStats,
     createWeeklyChart,
-    loadRecentActivities,
     updateRecentActivitiesList,
     handleQuickAction
 };